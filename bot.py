@@ -1,4 +1,5 @@
 import logging
+import threading
 from functools import wraps
 from logging import getLogger
 from typing import Callable, Any
@@ -6,10 +7,12 @@ from typing import Callable, Any
 import telebot
 from telebot.types import Message
 
-from settings import telegram as tele
+from settings import settings, telegram as tele
+from sheets.backends import backend
 from utils.users import user_is_registered
 from views.commands import send_users_list, send_start_message
 from views.handlers.comminication import AnnouncementHandler
+from views.handlers.export import ExportHandler
 from views.handlers.kpi import KPIHandler
 from views.handlers.statistics import StatisticsHandler
 
@@ -67,6 +70,17 @@ def users_command_handler(message: Message) -> None:
     send_users_list(message)
 
 
+@tele.bot.message_handler(commands=['export'])
+@user_is_authorized
+def export_command_handler(message: Message) -> None:
+    """
+    /export command handler:
+    sends the KPI statistics of the chosen section and period as a CSV or JSONL file, admins only.
+    """
+
+    ExportHandler(sender_id=message.from_user.id).start_export(message)
+
+
 # Message actions
 
 @tele.bot.message_handler(regexp=r'мои показатели\S*')
@@ -98,4 +112,7 @@ def send_announcement(message: Message) -> None:
 
 
 if __name__ == '__main__':
+    # the worksheets are resolved in the background, the users' requests are served right away
+    threading.Thread(target=backend.warm_up, name='sheets-warm-up', daemon=True).start()
+    settings.start_reloading()
     tele.bot.infinity_polling(logger_level=logging.WARNING)
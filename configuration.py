@@ -0,0 +1,406 @@
+"""
+    The typed model of the configuration file: the sections, the employees and the other statistics sources.
+    It's built and validated once the file is loaded (see `load_configuration`), so a configuration error
+    stops the bot at the start instead of failing a conversation, and the handlers don't walk the raw JSON.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date
+from functools import wraps
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Optional, TypeVar
+from weakref import WeakKeyDictionary
+
+from errors import InvalidConfigurationError
+
+CELL_PATTERN = re.compile(r'^[A-Z]+\d+$')
+COLUMN_PATTERN = re.compile(r'^[A-Z]+$')
+WEEKDAYS = frozenset(range(7))
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class GoogleSheet:
+    __slots__ = ('table', 'sheet', 'start_row')
+
+    table: str
+    sheet: str
+    # the row of the configuration's start date, for the sheets with a row per day
+    start_row: Optional[int]
+
+
+@dataclass(frozen=True)
+class SectionItem:
+    __slots__ = ('key', 'name', 'column')
+
+    key: str
+    name: str
+    column: str
+
+
+@dataclass(frozen=True)
+class Section:
+    __slots__ = ('id', 'name', 'google', 'day_items')
+
+    id: str
+    name: str
+    google: GoogleSheet
+    # the section's total values per day
+    day_items: tuple[SectionItem, ...]
+
+
+@dataclass(frozen=True)
+class KPIItem:
+    __slots__ = ('key', 'name', 'section_id', 'column', 'question', 'schedule')
+
+    key: str
+    name: str
+    section_id: str
+    column: str
+    question: str
+    # the days of the week the item is reported on, Monday is 0
+    schedule: frozenset[int]
+
+
+@dataclass(frozen=True)
+class Disbonus:
+    __slots__ = ('key', 'name', 'column')
+
+    key: str
+    name: str
+    column: str
+
+
+@dataclass(frozen=True)
+class Employee:
+    __slots__ = ('id', 'firstname', 'lastname', 'admin', 'kpi', 'bonus_value_column', 'disbonuses')
+
+    id: int
+    firstname: str
+    lastname: str
+    admin: bool
+    kpi: Mapping[str, KPIItem]
+    # the column of the employee's bonus balance in the dis-bonuses sheet, None if the employee has no bonuses
+    bonus_value_column: Optional[str]
+    disbonuses: Mapping[str, Disbonus]
+
+    @property
+    def full_name(self) -> str:
+        return f'{self.firstname} {self.lastname}'
+
+
+@dataclass(frozen=True)
+class Fund:
+    __slots__ = ('key', 'name', 'admin_only', 'actual_cell', 'planned_cell')
+
+    key: str
+    name: str
+    admin_only: bool
+    actual_cell: str
+    planned_cell: str
+
+
+@dataclass(frozen=True)
+class KeyValuePeriod:
+    __slots__ = ('name', 'actual_cell', 'planned_cell')
+
+    name: str
+    actual_cell: str
+    planned_cell: Optional[str]
+
+
+@dataclass(frozen=True)
+class KeyValue:
+    __slots__ = ('key', 'name', 'periods')
+
+    key: str
+    name: str
+    periods: tuple[KeyValuePeriod, ...]
+
+
+@dataclass(frozen=True)
+class LeaderCandidate:
+    __slots__ = ('user_id', 'today_cell', 'yesterday_cell', 'column')
+
+    user_id: int
+    today_cell: str
+    yesterday_cell: str
+    # the column of the candidate's points per day, if the leader sheet keeps them (its `start_row` is set)
+    column: Optional[str]
+
+
+# compared by identity: every load of the file is a separate snapshot, see `derived_index`
+@dataclass(frozen=True, eq=False)
+class Configuration:
+    __slots__ = (
+        'start_date', 'sections', 'employees', 'admins', 'subscribers', 'disbonuses_sheet',
+        'funds_sheet', 'funds', 'key_values_sheet', 'key_values', 'leader_sheet', 'leader_candidates',
+        '__weakref__',
+    )
+
+    start_date: date
+    sections: Mapping[str, Section]
+    employees: Mapping[int, Employee]
+    admins: frozenset[int]
+    # the statistics subscribers in the configuration order
+    subscribers: tuple[int, ...]
+    disbonuses_sheet: GoogleSheet
+    funds_sheet: GoogleSheet
+    funds: tuple[Fund, ...]
+    key_values_sheet: GoogleSheet
+    key_values: tuple[KeyValue, ...]
+    leader_sheet: GoogleSheet
+    leader_candidates: tuple[LeaderCandidate, ...]
+
+
+def derived_index(build: Callable[[Configuration], T]) -> Callable[[Configuration], T]:
+    """
+    Caches the index built from the configuration snapshot: it's built once per snapshot,
+    and an index can't be out of sync with the snapshot it's requested for, even while the file is being reloaded.
+    """
+
+    indexes: WeakKeyDictionary = WeakKeyDictionary()
+
+    @wraps(build)
+    def wrapper(configuration: Configuration) -> T:
+        index = indexes.get(configuration)
+        if index is None:
+            index = indexes[configuration] = build(configuration)
+        return index
+
+    return wrapper
+
+
+def _get(data: Mapping[str, Any], key: str, path: str) -> Any:
+    try:
+        return data[key]
+    except (KeyError, TypeError):
+        raise InvalidConfigurationError(f'"{f"{path}." if path else ""}{key}" is missing')
+
+
+def _parse(parser: Callable[[Any], T], value: Any, path: str) -> T:
+    try:
+        return parser(value)
+    except (TypeError, ValueError):
+        raise InvalidConfigurationError(f'"{path}" has an invalid value: {value!r}')
+
+
+def _parse_label(pattern: re.Pattern, value: Any, path: str) -> str:
+    label = str(value).upper()
+    if not pattern.match(label):
+        raise InvalidConfigurationError(f'"{path}" is not a valid sheet label: {value!r}')
+    return label
+
+
+def _parse_user_id(value: Any, path: str) -> int:
+    return _parse(int, value, path)
+
+
+def _load_google_sheet(data: Mapping[str, Any], path: str, with_start_row: bool = False) -> GoogleSheet:
+    start_row = None
+    if with_start_row:
+        start_row = _parse(int, _get(data, 'start_row', path), f'{path}.start_row')
+    return GoogleSheet(
+        table=str(_get(data, 'table', path)),
+        sheet=str(_get(data, 'sheet', path)),
+        start_row=start_row,
+    )
+
+
+def _load_section_item(key: str, data: Mapping[str, Any], path: str) -> SectionItem:
+    return SectionItem(
+        key=key,
+        name=str(_get(data, 'name', path)),
+        column=_parse_label(COLUMN_PATTERN, _get(data, 'column', path), f'{path}.column'),
+    )
+
+
+def _load_section(section_id: str, data: Mapping[str, Any]) -> Section:
+    path = f'sections.{section_id}'
+    day_items_path = f'{path}.statistics.period.day'
+    day_items = _get(_get(_get(data, 'statistics', path), 'period', f'{path}.statistics'), 'day', day_items_path)
+
+    return Section(
+        id=section_id,
+        name=str(_get(data, 'name', path)),
+        google=_load_google_sheet(_get(data, 'google', path), f'{path}.google', with_start_row=True),
+        day_items=tuple(_load_section_item(key, item, f'{day_items_path}.{key}') for key, item in day_items.items()),
+    )
+
+
+def _load_employee(raw_user_id: str, data: Mapping[str, Any], sections: Mapping[str, Section]) -> Employee:
+    path = f'employees.{raw_user_id}'
+
+    kpi = {}
+    statistics = data.get('statistics')
+    for key, item in ((statistics or {}).get('kpi') or {}).items():
+        item_path = f'{path}.statistics.kpi.{key}'
+        section_id = _get(item, 'section', item_path)
+        if section_id not in sections:
+            raise InvalidConfigurationError(f'"{item_path}.section" refers to an unknown section: {section_id!r}')
+
+        schedule = frozenset(_parse(int, day, f'{item_path}.schedule') for day in _get(item, 'schedule', item_path))
+        if not schedule <= WEEKDAYS:
+            raise InvalidConfigurationError(f'"{item_path}.schedule" has invalid days: {sorted(schedule - WEEKDAYS)}')
+
+        kpi[key] = KPIItem(
+            key=key,
+            name=str(_get(item, 'name', item_path)),
+            section_id=section_id,
+            column=_parse_label(COLUMN_PATTERN, _get(item, 'column', item_path), f'{item_path}.column'),
+            question=str(_get(item, 'question', item_path)),
+            schedule=schedule,
+        )
+
+    bonus_value_column, disbonuses = None, {}
+    bonuses = data.get('bonuses')
+    if bonuses:
+        bonuses_path = f'{path}.bonuses'
+        bonus_value_column = _parse_label(
+            COLUMN_PATTERN,
+            _get(bonuses, 'bonus-value-column', bonuses_path),
+            f'{bonuses_path}.bonus-value-column',
+        )
+        for key, disbonus in (bonuses.get('dis-bonuses') or {}).items():
+            disbonus_path = f'{bonuses_path}.dis-bonuses.{key}'
+            disbonuses[key] = Disbonus(
+                key=key,
+                name=str(_get(disbonus, 'name', disbonus_path)),
+                column=_parse_label(COLUMN_PATTERN, _get(disbonus, 'column', disbonus_path), f'{disbonus_path}.column'),
+            )
+
+    return Employee(
+        id=_parse_user_id(raw_user_id, path),
+        firstname=str(_get(data, 'firstname', path)),
+        lastname=str(_get(data, 'lastname', path)),
+        admin=bool(data.get('admin')),
+        kpi=MappingProxyType(kpi),
+        bonus_value_column=bonus_value_column,
+        disbonuses=MappingProxyType(disbonuses),
+    )
+
+
+def _load_funds(data: Mapping[str, Any]) -> tuple[GoogleSheet, tuple[Fund, ...]]:
+    path = 'other.funds'
+    funds = []
+    for key, item in _get(data, 'items', path).items():
+        item_path = f'{path}.items.{key}'
+        statistics = _get(item, 'statistics', item_path)
+        cells = _get(statistics, 'cells', f'{item_path}.statistics')
+        cells_path = f'{item_path}.statistics.cells'
+        funds.append(Fund(
+            key=key,
+            name=str(_get(item, 'name', item_path)),
+            admin_only=bool(statistics.get('admin_only')),
+            actual_cell=_parse_label(CELL_PATTERN, _get(cells, 'actual', cells_path), f'{cells_path}.actual'),
+            planned_cell=_parse_label(CELL_PATTERN, _get(cells, 'planned', cells_path), f'{cells_path}.planned'),
+        ))
+
+    return _load_google_sheet(_get(data, 'google', path), f'{path}.google'), tuple(funds)
+
+
+def _load_key_values(data: Mapping[str, Any]) -> tuple[GoogleSheet, tuple[KeyValue, ...]]:
+    path = 'other.key-values'
+    key_values = []
+    for key, item in _get(data, 'items', path).items():
+        item_path = f'{path}.items.{key}'
+        periods_path = f'{item_path}.statistics.period'
+        periods = []
+        for period_key, period in _get(_get(item, 'statistics', item_path), 'period', periods_path).items():
+            cells_path = f'{periods_path}.{period_key}.cells'
+            cells = _get(period, 'cells', f'{periods_path}.{period_key}')
+            planned_cell = cells.get('planned')
+            if planned_cell:
+                planned_cell = _parse_label(CELL_PATTERN, planned_cell, f'{cells_path}.planned')
+            periods.append(KeyValuePeriod(
+                name=str(_get(period, 'name', f'{periods_path}.{period_key}')),
+                actual_cell=_parse_label(CELL_PATTERN, _get(cells, 'actual', cells_path), f'{cells_path}.actual'),
+                planned_cell=planned_cell or None,
+            ))
+        key_values.append(KeyValue(key=key, name=str(_get(item, 'name', item_path)), periods=tuple(periods)))
+
+    return _load_google_sheet(_get(data, 'google', path), f'{path}.google'), tuple(key_values)
+
+
+def _load_leader(
+        data: Mapping[str, Any],
+        employees: Mapping[int, Employee],
+) -> tuple[GoogleSheet, tuple[LeaderCandidate, ...]]:
+    path = 'other.leader'
+    google_data = _get(data, 'google', path)
+    # the points per day are optional: a row per day from `start_row` and a column per candidate
+    with_start_row = isinstance(google_data, Mapping) and 'start_row' in google_data
+    sheet = _load_google_sheet(google_data, f'{path}.google', with_start_row=with_start_row)
+
+    candidates = []
+    for raw_user_id, cells in _get(data, 'candidates', path).items():
+        candidate_path = f'{path}.candidates.{raw_user_id}'
+        user_id = _parse_user_id(raw_user_id, candidate_path)
+        if user_id not in employees:
+            raise InvalidConfigurationError(f'"{candidate_path}" is not an employee')
+
+        column = None
+        if sheet.start_row is not None:
+            column = _parse_label(COLUMN_PATTERN, _get(cells, 'column', candidate_path), f'{candidate_path}.column')
+
+        candidates.append(LeaderCandidate(
+            user_id=user_id,
+            today_cell=_parse_label(CELL_PATTERN, _get(cells, 'today', candidate_path), f'{candidate_path}.today'),
+            yesterday_cell=_parse_label(
+                CELL_PATTERN,
+                _get(cells, 'yesterday', candidate_path),
+                f'{candidate_path}.yesterday',
+            ),
+            column=column,
+        ))
+
+    return sheet, tuple(candidates)
+
+
+def load_configuration(config: Mapping[str, Any]) -> Configuration:
+    """Builds the model of the loaded configuration file, raises `InvalidConfigurationError` if it's invalid"""
+
+    sections = {
+        section_id: _load_section(section_id, section_data)
+        for section_id, section_data in _get(config, 'sections', '').items()
+    }
+
+    employees = {}
+    for raw_user_id, employee_data in _get(config, 'employees', '').items():
+        employee = _load_employee(raw_user_id, employee_data, sections)
+        if employee.id in employees:
+            raise InvalidConfigurationError(f'"employees.{raw_user_id}" is duplicated')
+        employees[employee.id] = employee
+
+    subscribers = []
+    subscriptions_path = 'subscriptions.statistics'
+    for raw_user_id in _get(_get(config, 'subscriptions', ''), 'statistics', 'subscriptions'):
+        user_id = _parse_user_id(raw_user_id, subscriptions_path)
+        if user_id not in employees:
+            raise InvalidConfigurationError(f'"{subscriptions_path}" refers to an unknown employee: {raw_user_id!r}')
+        subscribers.append(user_id)
+
+    other = _get(config, 'other', '')
+    funds_sheet, funds = _load_funds(_get(other, 'funds', 'other'))
+    key_values_sheet, key_values = _load_key_values(_get(other, 'key-values', 'other'))
+    leader_sheet, leader_candidates = _load_leader(_get(other, 'leader', 'other'), employees)
+
+    return Configuration(
+        start_date=_parse(date.fromisoformat, _get(config, 'start_date', ''), 'start_date'),
+        sections=MappingProxyType(sections),
+        employees=MappingProxyType(employees),
+        admins=frozenset(user_id for user_id, employee in employees.items() if employee.admin),
+        subscribers=tuple(dict.fromkeys(subscribers)),
+        disbonuses_sheet=_load_google_sheet(
+            _get(_get(config, 'google', ''), 'dis-bonuses', 'google'),
+            'google.dis-bonuses',
+            with_start_row=True,
+        ),
+        funds_sheet=funds_sheet,
+        funds=funds,
+        key_values_sheet=key_values_sheet,
+        key_values=key_values,
+        leader_sheet=leader_sheet,
+        leader_candidates=leader_candidates,
+    )
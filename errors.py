@@ -1,3 +1,4 @@
+from typing import Optional
 
 
 class InvalidConfigurationFileTypeError(BaseException):
@@ -6,7 +7,45 @@ class InvalidConfigurationFileTypeError(BaseException):
         super().__init__(message)
 
 
+class InvalidConfigurationError(BaseException):
+    def __init__(self, reason: str):
+        message = f'The configuration file is invalid: {reason}.'
+        super().__init__(message)
+
+
 class InvalidGoogleServiceFileTypeError(BaseException):
     def __init__(self):
         message = 'The google service file is either not in JSON format or invalid.'
         super().__init__(message)
+
+
+class InvalidSheetsBackendError(BaseException):
+    def __init__(self, backend_name: str):
+        message = f'The sheets backend "{backend_name}" is unknown, use either "google" or "memory".'
+        super().__init__(message)
+
+
+class LeaderHistoryNotConfiguredError(Exception):
+    def __init__(self):
+        message = 'The leader sheet keeps the points of today and yesterday only, its "start_row" is not configured.'
+        super().__init__(message)
+
+
+class SheetsBackendError(Exception):
+    """
+    A failure of the sheets backend call.
+
+    :status: - the HTTP status the failure corresponds to, it defines whether the call is retried (see `QuotaScheduler`)
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        self.status = status
+        super().__init__(message)
+
+
+class SheetsValuesUnavailableError(Exception):
+    """The values which could not be read and have no last known ones to serve instead"""
+
+    def __init__(self, table_id: str, sheet_id: str):
+        message = f'The values of the sheet "{sheet_id}" of the table "{table_id}" could not be read.'
+        super().__init__(message)
@@ -1,30 +1,175 @@
+import datetime
+import threading
+import time
 from json.decoder import JSONDecodeError
+from logging import getLogger
+from typing import Optional, Union
 
+import httplib2
 import pygsheets
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2.service_account import Credentials
 from pygsheets.client import Client
+from requests.adapters import HTTPAdapter
 
 from errors import InvalidGoogleServiceFileTypeError
 from settings import settings
 
+logger = getLogger(__name__)
+
+# the same scopes `pygsheets.authorize` requests by default
+GOOGLE_SCOPES = ('https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive')
+
+DEFAULT_POOL_SIZE = 10
+# seconds to establish a connection and to wait for an answer
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+# seconds before the access token expiration to refresh it at
+DEFAULT_TOKEN_REFRESH_MARGIN = 300
+# seconds to wait before the next attempt if the token could not be refreshed
+TOKEN_REFRESH_RETRY_DELAY = 30
+
+
+class SessionHttp:
+    """
+    `httplib2.Http` compatible facade of a `requests` session.
+    Lets the Google API client used by pygsheets send its requests through the pooled keep-alive connections.
+
+    :session: - a session to send the requests with
+    :timeout: - (connect, read) timeouts in seconds
+    """
+
+    def __init__(self, session: requests.Session, timeout: tuple[float, float]):
+        self.session = session
+        self.timeout = timeout
+
+    def request(
+            self,
+            uri: str,
+            method: str = 'GET',
+            body: Optional[Union[str, bytes]] = None,
+            headers: Optional[dict] = None,
+            **kwargs,
+    ) -> tuple[httplib2.Response, bytes]:
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+
+        # the content is already decompressed by requests
+        response_info = {key.lower(): value for key, value in response.headers.items()}
+        response_info.pop('content-encoding', None)
+        response_info['status'] = str(response.status_code)
+        return httplib2.Response(response_info), response.content
+
+    def close(self) -> None:
+        self.session.close()
+
 
 class GoogleManager:
     """
     Contains Google API settings and instances.
 
+    All the Sheets and Drive requests (the pygsheets client's ones and the direct ones made with `session`)
+    share one pool of keep-alive connections, so a request after an idle period doesn't pay for the TLS setup.
+    The access token is refreshed in the background before it expires (see `start_token_refresh`),
+    so a request never waits for the authentication round-trip.
+
     :service_account_file: - a path to the Google service account JSON file.
+    :pool_size: - the maximum number of the kept-alive connections
+    :timeout: - (connect, read) timeouts of the requests in seconds
+    :token_refresh_margin: - the number of seconds before the access token expiration to refresh it at
     """
 
-    def __init__(self, service_account_file: str):
+    def __init__(
+            self,
+            service_account_file: str,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+            token_refresh_margin: float = DEFAULT_TOKEN_REFRESH_MARGIN,
+    ):
         self.service_account_file = service_account_file
-        self.client = self.get_client()
+        self.timeout = timeout
+        self.token_refresh_margin = token_refresh_margin
+        self.credentials = self.get_credentials()
 
-    def get_client(self) -> Client:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        # a plain session for the requests authorized by their senders: pygsheets and the token refresh
+        self.transport = requests.Session()
+        self.transport.mount('https://', adapter)
+        # a session for the direct API requests
+        self.session = AuthorizedSession(self.credentials)
+        self.session.mount('https://', adapter)
+
+        self._client: Optional[Client] = None
+        self._client_lock = threading.Lock()
+        self._token_refresh_thread: Optional[threading.Thread] = None
+
+    @property
+    def client(self) -> Client:
+        """The pygsheets client, it's authorized on the first use"""
+
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.get_client()
+        return self._client
+
+    def get_credentials(self) -> Credentials:
         try:
-            client = pygsheets.authorize(service_account_file=self.service_account_file)
+            return Credentials.from_service_account_file(self.service_account_file, scopes=GOOGLE_SCOPES)
         except JSONDecodeError:
             raise InvalidGoogleServiceFileTypeError
-        else:
-            return client
+
+    def get_client(self) -> Client:
+        return pygsheets.authorize(
+            custom_credentials=self.credentials,
+            http=SessionHttp(self.transport, timeout=self.timeout),
+        )
+
+    def refresh_token(self) -> None:
+        self.credentials.refresh(Request(self.transport))
+
+    def _refresh_token_periodically(self) -> None:
+        while True:
+            try:
+                self.refresh_token()
+            except Exception:
+                logger.exception('Could not refresh the Google access token')
+                delay = TOKEN_REFRESH_RETRY_DELAY
+            else:
+                expires_in = (self.credentials.expiry - datetime.datetime.utcnow()).total_seconds()
+                delay = max(expires_in - self.token_refresh_margin, TOKEN_REFRESH_RETRY_DELAY)
+
+            time.sleep(delay)
+
+    def start_token_refresh(self) -> None:
+        """Starts refreshing the access token in the background, the first refresh is made right away"""
+
+        if self._token_refresh_thread is not None:
+            return
+
+        self._token_refresh_thread = threading.Thread(
+            target=self._refresh_token_periodically,
+            name='google-token-refresh',
+            daemon=True,
+        )
+        self._token_refresh_thread.start()
+
+    def get_spreadsheet_revision(self, table_id: str) -> str:
+        """
+        Returns a cheap change indicator of the spreadsheet: the time it was modified at last, according to Drive.
+        It changes on every edit, so the spreadsheet values can't differ while it stays the same.
+        """
+
+        return self.client.drive.get_update_time(table_id)
 
 
-manager = GoogleManager(settings.google_secret_file)
+transport_settings = settings.config['google'].get('transport') or {}
+manager = GoogleManager(
+    settings.google_secret_file,
+    pool_size=transport_settings.get('pool_size', DEFAULT_POOL_SIZE),
+    timeout=(
+        transport_settings.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+        transport_settings.get('read_timeout', DEFAULT_READ_TIMEOUT),
+    ),
+    token_refresh_margin=transport_settings.get('token_refresh_margin', DEFAULT_TOKEN_REFRESH_MARGIN),
+)
@@ -0,0 +1,200 @@
+"""
+    Measures the sheets API calls of the bot's flows against the in-memory sheets backend
+    and checks them against the recorded budgets (flags):
+    '-e 50' -- the number of employees in the synthetic configuration
+    '-s 4' -- the number of sections in the synthetic configuration
+    '-l 0.05' -- the simulated latency of every API call, in seconds
+    '-b benchmark_budgets.json' -- the budgets file
+    '--record' -- save the measured values as the new budgets instead of checking them
+
+    Exits with a non-zero code if any flow exceeds its budget.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator
+
+from utils.synthetic import build_data, prepare_environment
+
+DEFAULT_BUDGETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_budgets.json')
+
+
+@contextmanager
+def shifted_cache_time(seconds: float) -> Iterator[None]:
+    """
+    Moves the clock of the cells cache and of the revisions tracker forward, as if the time has passed.
+    The other modules keep the real clock: the quota and the breaker would wait for the shifted timestamps later.
+    """
+
+    from sheets import cache, revisions
+
+    shifted_time = SimpleNamespace(monotonic=lambda: time.monotonic() + seconds, time=lambda: time.time() + seconds)
+    cache.time = revisions.time = shifted_time
+    try:
+        yield
+    finally:
+        cache.time = revisions.time = time
+
+
+def read_expired_unchanged(flow: Callable[[], Any]) -> None:
+    """
+    Runs the flow, then runs it again once its cached values have expired and the revisions are outdated,
+    while the spreadsheets are unchanged: only the second run is measured,
+    it asks every spreadsheet for its revision and skips the read of the values.
+    """
+
+    from sheets.backends import backend
+    from sheets.cache import cells_cache
+    from sheets.revisions import revisions
+
+    flow()
+    backend.reset_stats()
+
+    max_ttl = max(cells_cache.default_ttl, *cells_cache.ttl_per_kind.values())
+    with shifted_cache_time(max(max_ttl, revisions.check_interval) + 1):
+        flow()
+
+
+def get_flows(config: dict[str, Any]) -> dict[str, Callable[[], Any]]:
+    from script_notifier import send_kpi_reminder, send_statistics_for_day
+    from settings import telegram as tele
+    from sheets.handlers import disbonuses, other, statistics
+    from views.handlers.kpi import KPIHandler
+
+    # the messages are not sent anywhere, the report is built as usual
+    tele.bot.send_message = lambda *args, **kwargs: None
+
+    user_id, user_data = next(iter(config['employees'].items()))
+    kpi_values = [(kpi_key, '1') for kpi_key in user_data['statistics']['kpi']]
+
+    return {
+        'update_employee_kpi': lambda: statistics.update_employee_kpi(user_id, kpi_values),
+        'get_statistic_for_today': statistics.get_statistic_for_today,
+        'get_statistic_for_today_unchanged': lambda: read_expired_unchanged(statistics.get_statistic_for_today),
+        # a fixed window: the current week's days elapsed depend on the weekday of the run
+        'get_statistic_for_7_days': lambda: statistics.get_statistic_for_period(
+            date.today() - timedelta(days=6),
+            date.today(),
+        ),
+        # the longest period of the menu, it's read with the same number of requests as the day
+        'get_statistic_for_90_days': lambda: statistics.get_statistic_for_period(
+            date.today() - timedelta(days=89),
+            date.today(),
+        ),
+        'get_key_values': statistics.get_key_values,
+        'get_funds_statistics': other.get_funds_statistics,
+        'get_leader': other.get_leader,
+        # the longest month, a fixed window: the current month's days elapsed depend on the date of the run
+        'get_leaderboard_for_31_days': lambda: other.get_leaderboard(date.today() - timedelta(days=30), date.today()),
+        'build_result_message_bonuses': KPIHandler.build_result_message_bonuses,
+        'get_user_actual_bonus_value': lambda: disbonuses.get_user_actual_bonus_value(user_id),
+        'send_statistics_for_day': send_statistics_for_day,
+        'send_kpi_reminder': send_kpi_reminder,
+    }
+
+
+def run_flow(flow: Callable[[], Any]) -> dict[str, Any]:
+    """Runs the flow with the empty cache and no known revisions, so all of its reads reach the backend"""
+
+    from sheets.backends import backend
+    from sheets.cache import cells_cache
+    from sheets.revisions import revisions
+
+    cells_cache.clear()
+    revisions.clear()
+    backend.reset_stats()
+
+    started_at = time.monotonic()
+    flow()
+    duration = time.monotonic() - started_at
+
+    return {
+        'calls': sum(backend.calls.values()),
+        'methods': dict(backend.calls),
+        'bytes': backend.bytes_transferred,
+        'time': round(duration, 3),
+    }
+
+
+def check_budgets(results: dict[str, dict[str, Any]], size: dict[str, int], budgets: dict[str, Any]) -> list[str]:
+    """
+    Returns the descriptions of the exceeded budgets.
+    The calls budgets don't depend on the configuration size, the bytes budgets are checked for the same size only.
+    The calls of every backend method are checked as well, the methods without a budget must not be called at all.
+    """
+
+    same_size = all(budgets.get(dimension) == value for dimension, value in size.items())
+
+    violations = []
+    for flow_name, result in results.items():
+        flow_budget = budgets['flows'].get(flow_name)
+        if flow_budget is None:
+            violations.append(f'{flow_name}: no budget recorded')
+            continue
+
+        if result['calls'] > flow_budget['calls']:
+            violations.append(f'{flow_name}: {result["calls"]} calls, the budget is {flow_budget["calls"]}')
+        methods_budget = flow_budget.get('methods')
+        for method, calls in result['methods'].items() if methods_budget is not None else ():
+            if calls > methods_budget.get(method, 0):
+                violations.append(f'{flow_name}: {calls} {method} calls, the budget is {methods_budget.get(method, 0)}')
+        if same_size and result['bytes'] > flow_budget['bytes']:
+            violations.append(f'{flow_name}: {result["bytes"]} bytes, the budget is {flow_budget["bytes"]}')
+
+    return violations
+
+
+def print_results(results: dict[str, dict[str, Any]]) -> None:
+    print(f'{"flow":<32}{"calls":>8}{"bytes":>12}{"time, s":>10}')
+    for flow_name, result in results.items():
+        print(f'{flow_name:<32}{result["calls"]:>8}{result["bytes"]:>12}{result["time"]:>10}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--employees', dest='employees', type=int, default=50)
+    parser.add_argument('-s', '--sections', dest='sections', type=int, default=4)
+    parser.add_argument('-l', '--latency', dest='latency', type=float, default=0.05)
+    parser.add_argument('-b', '--budgets', dest='budgets_file', default=DEFAULT_BUDGETS_FILE)
+    parser.add_argument('--record', dest='record', action='store_true')
+    args = parser.parse_args()
+
+    config = prepare_environment(args.employees, args.sections, args.latency)
+
+    from sheets.backends import backend
+
+    backend.load(build_data(config))
+
+    results = {flow_name: run_flow(flow) for flow_name, flow in get_flows(config).items()}
+    print_results(results)
+
+    size = {'employees': args.employees, 'sections': args.sections}
+    if args.record:
+        budgets = {**size, 'flows': {
+            flow_name: {'calls': result['calls'], 'methods': result['methods'], 'bytes': result['bytes']}
+            for flow_name, result in results.items()
+        }}
+        with open(args.budgets_file, 'w') as file:
+            file.write(json.dumps(budgets, indent=4) + '\n')
+        print(f'\nThe budgets are recorded to {args.budgets_file}')
+        return
+
+    with open(args.budgets_file, 'r') as file:
+        budgets = json.loads(file.read())
+
+    violations = check_budgets(results, size, budgets)
+    if violations:
+        print('\nThe budgets are exceeded:')
+        print('\n'.join(violations))
+        sys.exit(1)
+
+    print('\nAll the flows are within their budgets')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+    Measures the startup of the entry points: every scenario is run in a fresh interpreter (flags):
+    '-n 5' -- the number of runs of every scenario
+    '-e 50' -- the number of employees in the synthetic configuration
+    '-s 4' -- the number of sections in the synthetic configuration
+    '-b google' -- the sheets backend the entry points are configured with
+
+    Reports the time of every scenario and the number of the imported modules.
+    Exits with a non-zero code if importing the entry points loads the Google client libraries:
+    the client is created on the first read or write only.
+"""
+import argparse
+import json
+import statistics
+import os
+import subprocess
+import sys
+from typing import Any
+
+from utils.synthetic import prepare_environment
+
+# the modules which mean that the Google client is about to be authorized
+GOOGLE_CLIENT_MODULES = ('pygsheets', 'googleapiclient')
+
+# the scenarios which must not load the Google client
+IMPORT_SCENARIOS = ('bot: import', 'notifier: import')
+
+SCENARIOS = {
+    'bot: import': 'import bot',
+    'notifier: import': 'import script_notifier',
+    'notifier: send-kpi-reminder': '\n'.join((
+        'import script_notifier',
+        'from settings import telegram as tele',
+        'tele.bot.send_message = lambda *args, **kwargs: None',
+        'script_notifier.handle_action("send-kpi-reminder")',
+    )),
+}
+
+# the environment of the scenarios which differs from the selected one:
+# the reminder reads the today's KPI values, it's run against the empty in-memory sheets without the credentials
+SCENARIOS_ENVIRONMENT = {
+    'notifier: send-kpi-reminder': {'SHEETS_BACKEND': 'memory'},
+}
+
+SCENARIO_TEMPLATE = '''
+import json, sys, time
+started_at = time.perf_counter()
+{code}
+duration = time.perf_counter() - started_at
+print(json.dumps({{
+    'time': duration,
+    'modules': len(sys.modules),
+    'google_client': any(module in sys.modules for module in {google_client_modules!r}),
+}}))
+'''
+
+
+def run_scenario(code: str, environment: dict[str, str]) -> dict[str, Any]:
+    script = SCENARIO_TEMPLATE.format(code=code, google_client_modules=GOOGLE_CLIENT_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-c', script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, **environment},
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--runs', dest='runs', type=int, default=5)
+    parser.add_argument('-e', '--employees', dest='employees', type=int, default=50)
+    parser.add_argument('-s', '--sections', dest='sections', type=int, default=4)
+    parser.add_argument('-b', '--backend', dest='backend', choices=('google', 'memory'), default='google')
+    args = parser.parse_args()
+
+    # the scenarios inherit the environment
+    prepare_environment(args.employees, args.sections, 0, sheets_backend=args.backend)
+
+    print(f'{"scenario":<32}{"median, ms":>12}{"min, ms":>10}{"modules":>10}{"google client":>16}')
+    violations = []
+    for scenario, code in SCENARIOS.items():
+        runs = [run_scenario(code, SCENARIOS_ENVIRONMENT.get(scenario, {})) for _ in range(args.runs)]
+        times = [run['time'] * 1000 for run in runs]
+        google_client = any(run['google_client'] for run in runs)
+        print(
+            f'{scenario:<32}{statistics.median(times):>12.0f}{min(times):>10.0f}'
+            f'{runs[-1]["modules"]:>10}{"loaded" if google_client else "-":>16}'
+        )
+
+        if scenario in IMPORT_SCENARIOS and google_client:
+            violations.append(f'{scenario}: the Google client libraries are loaded')
+
+    if violations:
+        print('\n' + '\n'.join(violations))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
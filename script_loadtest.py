@@ -0,0 +1,343 @@
+"""
+    Load-tests the bot end to end: the real handlers of `bot.py` talk to a local fake of the Telegram Bot API,
+    the sheets are the in-memory backend filled with the synthetic data (flags):
+    '-e 50' -- the number of employees in the synthetic configuration, every employee is a simulated user
+    '-s 4' -- the number of sections in the synthetic configuration
+    '-l 0.05' -- the simulated latency of every sheets API call, in seconds
+    '-c 10' -- the number of users talking to the bot at once
+    '-w 2' -- the number of the bot's worker threads (the TeleBot's default is 2)
+    '--scenarios start kpi statistics announcement' -- the conversations every user goes through
+    '--step-timeout 30' -- the number of seconds to wait for the bot's reply
+
+    Reports the percentiles of every conversation step latency, the throughput and the peak memory usage.
+    Exits with a non-zero code if any step isn't answered in time.
+"""
+import argparse
+import json
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+from utils.synthetic import build_data, prepare_environment
+
+SCENARIOS = ('start', 'kpi', 'statistics', 'announcement')
+
+# the bot's long polling timeout: the bot is stopped no later than in this number of seconds
+POLLING_TIMEOUT = 1
+
+
+@dataclass
+class Step:
+    """
+    A message of the user and the bot's reply ending the step.
+    The bot sends several messages per step and to several users at once (announcements),
+    so the reply is recognized by its prefix.
+    """
+
+    name: str
+    text: str
+    reply_prefix: str
+
+
+class FakeTelegram:
+    """
+    The Telegram Bot API subset used by the bot: `getUpdates` serves the messages of the simulated users,
+    `sendMessage` records the bot's replies per chat.
+    """
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_request_handler())
+        self.server.daemon_threads = True
+
+        self._updates: list[dict[str, Any]] = []
+        self._update_ids = count(1)
+        self._message_ids = count(1)
+        # chat_id -> the texts of the bot's messages
+        self._replies: dict[int, list[str]] = {}
+        self._condition = threading.Condition()
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/bot{{0}}/{{1}}'
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send_user_message(self, user_id: int, first_name: str, text: str) -> None:
+        user = {'id': user_id, 'is_bot': False, 'first_name': first_name}
+        message = {
+            'message_id': next(self._message_ids),
+            'from': user,
+            'chat': {'id': user_id, 'type': 'private', 'first_name': first_name},
+            'date': int(time.time()),
+            'text': text,
+        }
+        with self._condition:
+            # the ids are issued in the order of the updates: the bot confirms all the ones below its offset
+            self._updates.append({'update_id': next(self._update_ids), 'message': message})
+            self._condition.notify_all()
+
+    def count_replies(self, chat_id: int) -> int:
+        with self._condition:
+            return len(self._replies.get(chat_id, []))
+
+    def wait_for_reply(self, chat_id: int, since: int, prefix: str, timeout: float) -> bool:
+        """Waits for the bot's message starting with the prefix among the chat's messages after the `since` one"""
+
+        def reply_is_received() -> bool:
+            return any(text.startswith(prefix) for text in self._replies.get(chat_id, [])[since:])
+
+        with self._condition:
+            return self._condition.wait_for(reply_is_received, timeout=timeout)
+
+    def _get_updates(self, params: dict[str, str]) -> list[dict[str, Any]]:
+        offset = int(params.get('offset') or 0)
+
+        def pending_updates() -> list[dict[str, Any]]:
+            return [update for update in self._updates if update['update_id'] >= offset]
+
+        with self._condition:
+            self._condition.wait_for(pending_updates, timeout=float(params.get('timeout') or 0))
+            # the confirmed updates are not needed anymore
+            self._updates = pending_updates()
+            return list(self._updates)
+
+    def _send_message(self, params: dict[str, str]) -> dict[str, Any]:
+        chat_id = int(params['chat_id'])
+        with self._condition:
+            self._replies.setdefault(chat_id, []).append(params.get('text', ''))
+            self._condition.notify_all()
+
+        return {
+            'message_id': next(self._message_ids),
+            'from': {'id': 0, 'is_bot': True, 'first_name': 'bot'},
+            'chat': {'id': chat_id, 'type': 'private'},
+            'date': int(time.time()),
+            'text': params.get('text', ''),
+        }
+
+    def _build_request_handler(self) -> type:
+        telegram = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                self._handle()
+
+            def do_POST(self) -> None:
+                self._handle()
+
+            def _handle(self) -> None:
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                params.update(parse_qsl(body.decode()))
+
+                method = url.path.rsplit('/', 1)[-1]
+                if method == 'getUpdates':
+                    response = {'ok': True, 'result': telegram._get_updates(params)}
+                elif method == 'sendMessage':
+                    response = {'ok': True, 'result': telegram._send_message(params)}
+                elif method == 'getMe':
+                    response = {'ok': True, 'result': {'id': 0, 'is_bot': True, 'first_name': 'bot'}}
+                else:
+                    response = {'ok': False, 'error_code': 404, 'description': f'Not Found: {method}'}
+
+                content = json.dumps(response).encode()
+                self.send_response(200 if response['ok'] else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return RequestHandler
+
+
+def build_conversations(config: dict[str, Any], user_id: str, scenarios: list[str]) -> dict[str, list[Step]]:
+    """Builds the user's conversations of the scenarios, the texts are the handlers' own choices"""
+
+    from settings import settings
+    from views.handlers.comminication import AnnouncementHandler
+    from views.handlers.kpi import KPIHandler
+    from views.handlers.statistics import StatisticsHandler
+
+    user_data = config['employees'][user_id]
+    kpi_values = ' '.join('1' for _ in user_data['statistics']['kpi'])
+    disbonus_name = next(iter(user_data['bonuses']['dis-bonuses'].values()))['name']
+    section_id = next(iter(user_data['statistics']['kpi'].values()))['section']
+
+    conversations = {
+        'start': [
+            Step('start', '/start', 'Привет'),
+        ],
+        'kpi': [
+            Step('request', 'мои показатели', '\U0001F4CB'),
+            Step('values', kpi_values, '\U00002753'),
+            Step('disbonuses', KPIHandler.YES_NO_CHOICES['yes'], '\U00002b07\U0000fe0f'),
+            Step('disbonus', disbonus_name, '\U0001f4dd'),
+            Step('finish', KPIHandler.DISBONUS_COMMON_CHOICES['quit'], '\U00002705'),
+        ],
+        'statistics': [
+            Step('menu', 'статистика', '\U00002b07\U0000fe0f'),
+            Step('type', StatisticsHandler.STATISTICS_CHOICES['general_values'], '\U00002b07\U0000fe0f'),
+            Step('section', StatisticsHandler.build_section_choices(settings.configuration)[section_id], '\U0001F5D3'),
+            Step('day', StatisticsHandler.PERIOD_CHOICES['day'], '\U0001F4C5'),
+        ],
+        'announcement': [
+            Step('request', 'объявление', '\U0001f4dd'),
+            Step('text', 'нагрузочное тестирование', '\U0001f44c'),
+            Step('confirm', AnnouncementHandler.MESSAGES_CHOICES['confirm_sending'], '\U00002705'),
+        ],
+    }
+    return {scenario: conversations[scenario] for scenario in scenarios}
+
+
+def wait_for_next_step_handler(chat_id: int, timeout: float) -> bool:
+    """
+    The handlers register the next step handler after their reply is sent,
+    a user's message sent before the registration would not reach it.
+    """
+
+    from settings import telegram as tele
+
+    deadline = time.monotonic() + timeout
+    while chat_id not in tele.bot.next_step_backend.handlers:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def talk(
+        telegram: FakeTelegram,
+        user_id: str,
+        first_name: str,
+        conversations: dict[str, list[Step]],
+        step_timeout: float,
+) -> tuple[dict[str, list[float]], list[str]]:
+    """Goes through the conversations as a user, returns the latencies of every step and the failed steps"""
+
+    chat_id = int(user_id)
+    latencies: dict[str, list[float]] = {}
+    failures = []
+
+    for scenario, steps in conversations.items():
+        for step_number, step in enumerate(steps):
+            step_label = f'{scenario}:{step.name}'
+
+            since = telegram.count_replies(chat_id)
+            started_at = time.monotonic()
+            telegram.send_user_message(chat_id, first_name, step.text)
+            if not telegram.wait_for_reply(chat_id, since, step.reply_prefix, step_timeout):
+                failures.append(f'{step_label}: no reply from the bot to the user {user_id}')
+                break
+            latencies.setdefault(step_label, []).append(time.monotonic() - started_at)
+
+            last_step = step_number == len(steps) - 1
+            if not last_step and not wait_for_next_step_handler(chat_id, step_timeout):
+                failures.append(f'{step_label}: the next step is not awaited from the user {user_id}')
+                break
+
+    return latencies, failures
+
+
+def get_percentiles(values: list[float]) -> tuple[float, float, float]:
+    """Returns p50, p95 and p99 of the values"""
+
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    percentiles = statistics.quantiles(values, n=100, method='inclusive')
+    return percentiles[49], percentiles[94], percentiles[98]
+
+
+def print_results(latencies: dict[str, list[float]], duration: float, peak_memory_kb: int) -> None:
+    print(f'{"step":<28}{"count":>8}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}')
+    for step_label, step_latencies in latencies.items():
+        p50, p95, p99 = (round(value * 1000) for value in get_percentiles(step_latencies))
+        print(f'{step_label:<28}{len(step_latencies):>8}{p50:>10}{p95:>10}{p99:>10}')
+
+    steps_count = sum(len(step_latencies) for step_latencies in latencies.values())
+    print(f'\n{steps_count} steps in {duration:.2f} s: {steps_count / duration:.1f} steps/s')
+    print(f'Peak memory usage: {peak_memory_kb / 1024:.1f} MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--employees', dest='employees', type=int, default=50)
+    parser.add_argument('-s', '--sections', dest='sections', type=int, default=4)
+    parser.add_argument('-l', '--latency', dest='latency', type=float, default=0.05)
+    parser.add_argument('-c', '--concurrency', dest='concurrency', type=int, default=10)
+    parser.add_argument('-w', '--workers', dest='workers', type=int, default=2)
+    parser.add_argument('--scenarios', dest='scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--step-timeout', dest='step_timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    config = prepare_environment(args.employees, args.sections, args.latency)
+
+    import telebot
+
+    telegram = FakeTelegram()
+    telegram.start()
+    telebot.apihelper.API_URL = telegram.api_url
+
+    # the handlers are registered on import
+    import bot  # noqa: F401
+    from settings import telegram as tele
+    from sheets.backends import backend
+
+    backend.load(build_data(config))
+    tele.bot.worker_pool = telebot.util.ThreadPool(num_threads=args.workers)
+    polling = threading.Thread(
+        target=tele.bot.polling,
+        kwargs={'none_stop': True, 'long_polling_timeout': POLLING_TIMEOUT},
+        daemon=True,
+    )
+    polling.start()
+
+    users = [
+        (user_id, user_data['firstname'], build_conversations(config, user_id, args.scenarios))
+        for user_id, user_data in config['employees'].items()
+    ]
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda user: talk(telegram, *user, args.step_timeout), users))
+    duration = time.monotonic() - started_at
+
+    tele.bot.stop_polling()
+    polling.join(timeout=POLLING_TIMEOUT * 2)
+    telegram.stop()
+
+    latencies: dict[str, list[float]] = {}
+    failures: list[str] = []
+    for user_latencies, user_failures in results:
+        for step_label, step_latencies in user_latencies.items():
+            latencies.setdefault(step_label, []).extend(step_latencies)
+        failures.extend(user_failures)
+
+    # the maximum resident set size is reported in kilobytes on Linux
+    print_results(latencies, duration, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    if failures:
+        print(f'\n{len(failures)} conversations failed:')
+        print('\n'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,90 +2,112 @@
     Notifies users through a specific way (flags):
     '-c statistics-day' -- send day statistic
     '-c statistics-week' -- send week statistic
+    '-c statistics-month' -- send month statistic
+    '-c statistics-quarter' -- send quarter statistic
+    '-c statistics-period --first-day 2021-07-01 --last-day 2021-09-30' -- send statistic of the period
     '-c values-reminder' -- send a reminder to enter the statistic values
 """
 import argparse
 import logging
+from datetime import date
+from typing import Optional
 
 from telebot.apihelper import ApiTelegramException
 
 from settings import telegram as tele
-from sheets.handlers import statistics, other
 from utils import users
-from views.handlers.kpi import KPIHandler
-from views.handlers.statistics import StatisticsHandler
 
 logger = logging.getLogger(__name__)
 
-parser = argparse.ArgumentParser()
-parser.add_argument('-a', '--action', dest='action')
-args = parser.parse_args()
+# the sheets and views modules are imported by the actions which use them:
+# every action is a separate cron invocation, it shouldn't pay for the others' imports
 
 
 def send_statistics_for_day() -> None:
-    """TODO"""
-    # general values
-    general_values_data = statistics.get_statistic_for_today()
-    general_values_result_message = StatisticsHandler.build_result_message_general_values_day(data=general_values_data)
-
-    # key values
-    key_values_data = statistics.get_key_values()
-    key_values_result_message = StatisticsHandler.build_result_message_key_values_accumulative(data=key_values_data)
-
-    # funds fulfillment values
-    # TODO: DRY (use the sample above)
-    funds_data = other.get_funds_statistics()
-
-    funds_messages_batch = ['\U0001F4CA - ДАННЫЕ ПО ФОНДАМ\n']
-    for fund_name, fund_data in funds_data.items():
-        actual, planned = fund_data
-        funds_messages_batch.append(f'{fund_name}:')
-        funds_messages_batch.append(f'\t\t\tфакт: {actual}')
-        funds_messages_batch.append(f'\t\t\tплан: {planned}\n')
-
-    funds_result_message = '\n'.join(funds_messages_batch)
+    """Sends the day report: it's read once and rendered once for the admins and once for the other subscribers"""
+    from views.reports import build_day_report, render_day_report
 
-    funds_admin_data = other.get_funds_statistics(full=True)
-
-    funds_admin_messages_batch = ['\U0001F4CA - ДАННЫЕ ПО ФОНДАМ\n']
-    for fund_name, fund_data in funds_admin_data.items():
-        actual, planned = fund_data
-        funds_admin_messages_batch.append(f'{fund_name}:')
-        funds_admin_messages_batch.append(f'\t\t\tфакт: {actual}')
-        funds_admin_messages_batch.append(f'\t\t\tплан: {planned}\n')
-
-    funds_admin_result_message = '\n'.join(funds_admin_messages_batch)
-
-    # leaders of the day
-    # TODO: DRY (use the sample above)
-    leaders_for_today = other.get_leader()
-    if not leaders_for_today:
-        leaders_for_today_result_message = '\U0001F9E2 - сегодня красавчиков нет.'
-    else:
-        leaders_for_today_result_message = f'\U0001F451 - красавчики сегодня:\n{", ".join(leaders_for_today)}'
-
-    # bonus values
-    users_bonus_values = KPIHandler.build_result_message_bonuses()
+    report = build_day_report()
+    messages_per_audience = {
+        for_admins: render_day_report(report, for_admins=for_admins)
+        for for_admins in (False, True)
+    }
 
     for user_id in users.get_statistics_subscribers_list():
-        sending_to_admin = users.user_has_admin_permission(user_id)
+        messages = messages_per_audience[users.user_has_admin_permission(user_id)]
         try:
-            tele.bot.send_message(user_id, general_values_result_message)
-            tele.bot.send_message(user_id, key_values_result_message)
-            tele.bot.send_message(user_id, funds_admin_result_message if sending_to_admin else funds_result_message)
-            tele.bot.send_message(user_id, users_bonus_values)
-            tele.bot.send_message(user_id, leaders_for_today_result_message)
+            for message in messages:
+                tele.bot.send_message(user_id, message)
         except ApiTelegramException:
             logger.exception('Sending scheduled day statistics to user failed', extra={'user_id': user_id})
 
 
-def send_statistics_for_week() -> None:
-    """TODO"""
-    ...
+def send_statistics_for_period(period: str, first_day: Optional[date] = None, last_day: Optional[date] = None) -> None:
+    """Sends the statistics of the current week, month or quarter, or of the `custom` period from/to the days"""
+    from errors import SheetsValuesUnavailableError
+    from sheets.cache import staleness
+    from sheets.handlers import other, statistics
+    from sheets.planner import FetchPlan
+    from sheets.utils import get_period_days
+    from views.handlers.statistics import StatisticsHandler
+
+    if period != 'custom':
+        first_day, last_day = get_period_days(period)
+
+    # the period's rows of every section and of the leader sheet are read at once: one range each
+    staleness.reset()
+    plan = FetchPlan()
+    statistics.declare_statistic_for_period(plan, first_day, last_day)
+    with_leaderboard = other.leader_history_is_configured()
+    if with_leaderboard:
+        other.declare_leader_points(plan, first_day, last_day)
+    plan.execute()
+
+    try:
+        general_values_data = statistics.get_statistic_for_period(first_day, last_day, plan=plan)
+    except SheetsValuesUnavailableError:
+        logger.exception(
+            'The scheduled period statistics could not be read.',
+            extra={'period': period, 'first_day': first_day, 'last_day': last_day},
+        )
+        return
+
+    general_values_result_message = StatisticsHandler.build_result_message_general_values_period(
+        general_values_data,
+        period,
+        first_day,
+        last_day,
+    )
+    general_values_result_message += StatisticsHandler.build_staleness_note()
+
+    messages = [general_values_result_message]
+    if with_leaderboard:
+        try:
+            leaderboard = other.get_leaderboard(first_day, last_day, plan=plan)
+        except SheetsValuesUnavailableError:
+            # the statistics are sent without the leaderboard
+            logger.exception(
+                'The scheduled period leaderboard could not be read.',
+                extra={'period': period, 'first_day': first_day, 'last_day': last_day},
+            )
+        else:
+            messages.append(StatisticsHandler.build_result_message_leaderboard(leaderboard, period))
+
+    for user_id in users.get_statistics_subscribers_list():
+        try:
+            for message in messages:
+                tele.bot.send_message(user_id, message)
+        except ApiTelegramException:
+            logger.exception(
+                'Sending scheduled period statistics to user failed',
+                extra={'user_id': user_id, 'period': period},
+            )
 
 
 def send_kpi_reminder() -> None:
     """TODO"""
+    from views.handlers.kpi import KPIHandler
+
     users_ids = KPIHandler.get_users_ids_with_empty_kpi_data()
     for user_id in users_ids:
         try:
@@ -100,15 +122,36 @@ def send_kpi_reminder() -> None:
             )
 
 
-def handle_action() -> None:
+def handle_action(action: str, first_day: Optional[date] = None, last_day: Optional[date] = None) -> None:
     """TODO"""
-    if args.action == 'statistics-day':
+    if action == 'statistics-day':
         send_statistics_for_day()
-    elif args.action == 'statistics-week':
-        send_statistics_for_week()
-    elif args.action == 'send-kpi-reminder':
+    elif action == 'statistics-week':
+        send_statistics_for_period('week')
+    elif action == 'statistics-month':
+        send_statistics_for_period('month')
+    elif action == 'statistics-quarter':
+        send_statistics_for_period('quarter')
+    elif action == 'statistics-period':
+        send_statistics_for_period('custom', first_day, last_day)
+    elif action == 'send-kpi-reminder':
         send_kpi_reminder()
 
 
 if __name__ == '__main__':
-    handle_action()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-a', '--action', dest='action')
+    parser.add_argument('--first-day', dest='first_day', type=date.fromisoformat)
+    parser.add_argument('--last-day', dest='last_day', type=date.fromisoformat)
+    args = parser.parse_args()
+
+    if args.action == 'statistics-period' and not (args.first_day and args.last_day):
+        parser.error('statistics-period requires --first-day and --last-day')
+    if args.action == 'statistics-period' and not args.first_day <= args.last_day <= date.today():
+        parser.error('statistics-period requires the period of the past days up to today')
+
+    from sheets.quota import BATCH, quota_scheduler
+
+    # the notifier runs alongside the bot, the quota reserved for the users' requests is left to the bot
+    quota_scheduler.default_priority = BATCH
+    handle_action(args.action, args.first_day, args.last_day)
@@ -22,6 +22,10 @@ def main():
         command=f'{cwd}/.venv/bin/python {cwd}/script_notifier.py -a statistics-day',
     ).setall('0 21 * * 1-5')
 
+    cron.new(
+        command=f'{cwd}/.venv/bin/python {cwd}/script_notifier.py -a statistics-week',
+    ).setall('30 21 * * 5')
+
     # reminder
     cron.new(
         command=f'{cwd}/.venv/bin/python {cwd}/script_notifier.py -a send-kpi-reminder',
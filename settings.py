@@ -1,22 +1,41 @@
 import json
 import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
 from json.decoder import JSONDecodeError
+from logging import getLogger
 from types import MappingProxyType
+from typing import Any, Callable, Optional
 
 import telebot
 from dotenv import load_dotenv, dotenv_values
 
-from errors import InvalidConfigurationFileTypeError
+from configuration import Configuration, load_configuration
+from errors import InvalidConfigurationError, InvalidConfigurationFileTypeError
 
 load_dotenv('project.env')
 
+logger = getLogger(__name__)
+
+# seconds between the checks of the configuration file for changes
+DEFAULT_RELOAD_INTERVAL = 5
+
+# the configuration snapshot the current handler has been started with, see `Settings.pinned`
+pinned_configuration: ContextVar[Optional[Configuration]] = ContextVar('pinned_configuration', default=None)
+
 
 class Settings:
     """
     Describes, stores and configures all the project settings.
 
     :configuration_file_path: - a path to the configuration JSON file, which represents the base project's config.
+        The staff structure is read through the validated model (`configuration`), the raw `config` is left
+        for the infrastructure sections. The file is reloaded on change without a restart, see `start_reloading`.
     :google_secret_file_path: - a path to the Google authentication file
+    :cache_file_path: - an optional path to the on-disk cache file shared by the bot's processes
+    :sheets_backend: - the name of the spreadsheets data storage, see `sheets.backends.get_backend`
     :telegram_token: - Telegram authentication token
     """
 
@@ -24,10 +43,93 @@ class Settings:
             self,
             configuration_file_path: str,
             google_secret_file_path: str,
+            cache_file_path: Optional[str] = None,
+            sheets_backend: str = 'google',
     ):
         self.config = self._setup_config(configuration_file_path)
+        self._configuration = load_configuration(self.config)
         self.configuration_file = configuration_file_path
         self.google_secret_file = google_secret_file_path
+        self.cache_file = cache_file_path
+        self.sheets_backend = sheets_backend
+
+        self._configuration_file_stat = self._get_configuration_file_stat()
+
+    @property
+    def configuration(self) -> Configuration:
+        """
+        The configuration snapshot: the one the current handler is pinned to, otherwise the latest loaded one.
+        A snapshot is immutable, the reload replaces it as a whole.
+        """
+
+        return pinned_configuration.get() or self._configuration
+
+    def pinned(self, callback: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Binds the callback to the current configuration snapshot:
+        it's run against the snapshot even if the configuration is reloaded in the meantime.
+        """
+
+        configuration = self.configuration
+
+        @wraps(callback)
+        def wrapper(*args, **kwargs):
+            token = pinned_configuration.set(configuration)
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                pinned_configuration.reset(token)
+
+        return wrapper
+
+    def _get_configuration_file_stat(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(self.configuration_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> bool:
+        """
+        Loads and validates the configuration file and swaps the new snapshot in.
+        The current snapshot is kept if the file is invalid.
+        The infrastructure sections (cache, quota, transport, ...) are read once at the start, they need a restart.
+        """
+
+        try:
+            config = self._setup_config(self.configuration_file)
+            configuration = load_configuration(config)
+        except (Exception, InvalidConfigurationFileTypeError, InvalidConfigurationError):
+            logger.exception('The changed configuration file is not loaded', extra={'file': self.configuration_file})
+            return False
+
+        self.config = config
+        self._configuration = configuration
+        logger.info('The configuration file is reloaded', extra={'file': self.configuration_file})
+        return True
+
+    def _reload_on_change(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+
+            stat = self._get_configuration_file_stat()
+            if stat is None or stat == self._configuration_file_stat:
+                continue
+            self._configuration_file_stat = stat
+            self.reload()
+
+    def start_reloading(self) -> None:
+        """Starts checking the configuration file for changes in the background, see `reload`"""
+
+        interval = (self.config.get('configuration-reload') or {}).get('interval', DEFAULT_RELOAD_INTERVAL)
+        if not interval:
+            return
+        threading.Thread(
+            target=self._reload_on_change,
+            args=(interval,),
+            name='configuration-reload',
+            daemon=True,
+        ).start()
 
     def __map_dictionary(self, object) -> MappingProxyType:
         """Protects extracted dictionary from editing"""
@@ -55,6 +157,35 @@ class Settings:
         return self.__map_dictionary(environment_variables)
 
 
+class StaffBot(telebot.TeleBot):
+    """
+    TeleBot, which passes every message of the received batch to its chat's next step handler.
+    The original implementation removes the handled messages from the batch while iterating over it,
+    so the message following a handled one is skipped when several users answer at once.
+
+    Every handler is pinned to the configuration snapshot (see `Settings.pinned`) and its next step handlers
+    are pinned to the same one, so a conversation is finished against the configuration it was started with.
+    """
+
+    def _exec_task(self, task, *args, **kwargs):
+        super()._exec_task(settings.pinned(task), *args, **kwargs)
+
+    def register_next_step_handler_by_chat_id(self, chat_id, callback, *args, **kwargs):
+        super().register_next_step_handler_by_chat_id(chat_id, settings.pinned(callback), *args, **kwargs)
+
+    def _notify_next_handlers(self, new_messages):
+        not_handled_messages = []
+        for message in new_messages:
+            handlers = self.next_step_backend.get_handlers(message.chat.id)
+            if not handlers:
+                not_handled_messages.append(message)
+                continue
+            for handler in handlers:
+                self._exec_task(handler['callback'], message, *handler['args'], **handler['kwargs'])
+
+        new_messages[:] = not_handled_messages
+
+
 class Telegram:
     """
     Describes, stores and configures all the telegram settings.
@@ -63,13 +194,28 @@ class Telegram:
     """
 
     def __init__(self, bot_token: str):
-        self.bot = telebot.TeleBot(bot_token)
+        self.bot_token = bot_token
         self.main_markup = telebot.types.ReplyKeyboardMarkup(row_width=2)
 
+        self._bot: Optional[StaffBot] = None
+        self._bot_lock = threading.Lock()
+
+    @property
+    def bot(self) -> StaffBot:
+        """The bot is created on the first use: it starts its worker threads right away"""
+
+        if self._bot is None:
+            with self._bot_lock:
+                if self._bot is None:
+                    self._bot = StaffBot(self.bot_token)
+        return self._bot
+
 
 settings = Settings(
     configuration_file_path=os.getenv('CONFIGURATION_FILE_PATH'),
     google_secret_file_path=os.getenv('GOOGLE_SECRET_FILE'),
+    cache_file_path=os.getenv('SHEETS_CACHE_FILE'),
+    sheets_backend=os.getenv('SHEETS_BACKEND', 'google'),
 )
 telegram = Telegram(
     bot_token=os.getenv('TELEGRAM_TOKEN'),
@@ -0,0 +1,73 @@
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from math import fsum
+from operator import sub
+from typing import Iterable, Mapping, Optional
+
+
+def parse_number(value: Optional[str]) -> float:
+    """Converts the read value to a number, the empty and non-numeric values count as 0: '1 500,5' -> 1500.5"""
+
+    if not value:
+        return 0
+    try:
+        return float(value.replace('\xa0', '').replace(' ', '').replace(',', '.'))
+    except ValueError:
+        return 0
+
+
+def format_number(value: float) -> str:
+    """Formats the aggregated number the way the sheets show it: 3.0 -> '3', 2.5 -> '2.5', 1.999 -> '2'"""
+
+    formatted = f'{value:.2f}'.rstrip('0').rstrip('.')
+    # the values rounding to zero from below are not shown as '-0'
+    return '0' if formatted == '-0' else formatted
+
+
+def format_signed_number(value: float) -> str:
+    """Formats the change of a number, see `format_number`: 2.5 -> '+2.5', -3.0 -> '-3', 0.0 -> '+0'"""
+
+    formatted = format_number(value)
+    return formatted if formatted.startswith('-') else f'+{formatted}'
+
+
+@dataclass(frozen=True)
+class KPIBlock:
+    """
+    The values of a section's columns for the days from `first_day` to `last_day`, a row per day.
+    The values are kept column by column as arrays of floats: a 90-day block of a hundred columns is
+    a hundred compact arrays instead of nine thousand strings, and every aggregate is one pass over an array.
+    """
+
+    first_day: date
+    last_day: date
+    # column -> the column's values from the first day to the last one
+    columns: Mapping[str, array]
+
+    @classmethod
+    def from_values(cls, first_day: date, last_day: date, values: Mapping[str, Iterable[Optional[str]]]) -> 'KPIBlock':
+        """Builds the block from the read values, see `FetchPlan.get_columns`"""
+
+        return cls(
+            first_day=first_day,
+            last_day=last_day,
+            columns={column: array('d', map(parse_number, column_values)) for column, column_values in values.items()},
+        )
+
+    @property
+    def days_count(self) -> int:
+        return (self.last_day - self.first_day).days + 1
+
+    def sum(self, column: str) -> float:
+        return fsum(self.columns[column])
+
+    def mean(self, column: str) -> float:
+        """The average value per day"""
+        return self.sum(column) / self.days_count
+
+    def deltas(self, column: str) -> array:
+        """The day-over-day changes of the column's value, one per day but the first one"""
+
+        values = self.columns[column]
+        return array('d', map(sub, values[1:], values[:-1]))
@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, TypeVar
+
+from settings import settings
+
+DEFAULT_CONCURRENCY = 4
+
+T = TypeVar('T')
+
+
+class AsyncSheetsClient:
+    """
+    Lets the blocking sheets backend calls be awaited, so independent spreadsheets are read concurrently.
+
+    There is no asynchronous HTTP library among the project dependencies, so the calls are made
+    in worker threads (the Google backend sends them by the pooled keep-alive session of `GoogleManager`),
+    while the event loop awaits them.
+
+    :concurrency: - the maximum number of calls made simultaneously
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sheets')
+
+    async def run(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs the blocking function in one of the `concurrency` worker threads, within the caller's context.
+        The limit is shared by all the event loops, so it holds for the sync wrappers run from different threads too.
+        """
+
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            partial(context.run, function, *args, **kwargs),
+        )
+
+
+client_settings = settings.config.get('sheets-client') or {}
+sheets_client = AsyncSheetsClient(concurrency=client_settings.get('concurrency', DEFAULT_CONCURRENCY))
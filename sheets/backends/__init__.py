@@ -0,0 +1,55 @@
+from threading import Lock
+from typing import Any, Optional
+
+from errors import InvalidSheetsBackendError
+from settings import settings
+from sheets.backends.base import SheetsBackend
+
+
+def get_backend() -> SheetsBackend:
+    """
+    Creates the backend selected in the settings (see `Settings.sheets_backend`).
+    The backends are imported only when selected: the in-memory one doesn't need Google credentials at all.
+    """
+
+    if settings.sheets_backend == 'google':
+        from sheets.backends.google import GoogleBackend
+
+        return GoogleBackend()
+
+    if settings.sheets_backend == 'memory':
+        from sheets.backends.memory import MemoryBackend
+
+        memory_settings = settings.config.get('memory-backend') or {}
+        return MemoryBackend.from_file(
+            memory_settings.get('data_file'),
+            latency=memory_settings.get('latency', 0),
+            error_rate=memory_settings.get('error_rate', 0),
+        )
+
+    raise InvalidSheetsBackendError(settings.sheets_backend)
+
+
+class LazyBackend:
+    """
+    Stands for the selected backend and creates it on the first use (see `get_backend`).
+    The Google backend pulls in the Google API client libraries and authorizes against Sheets,
+    the processes which never read or write the sheets (e.g. sending reminders) don't pay for it.
+    """
+
+    def __init__(self):
+        self._backend: Optional[SheetsBackend] = None
+        self._lock = Lock()
+
+    def get(self) -> SheetsBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = get_backend()
+        return self._backend
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
+backend = LazyBackend()
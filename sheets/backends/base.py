@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, Union
+
+
+class SheetsBackend(ABC):
+    """
+    Storage of the spreadsheets data used by `sheets.tools`.
+
+    The spreadsheets are addressed by table_id and sheet_id, the cells and ranges by the A1 notation.
+    The read values are strings, an empty cell is read as an empty string.
+    The ranges are read the way Google Sheets reads them: trailing empty rows and cells are omitted,
+    an empty range is read as [['']].
+    """
+
+    @abstractmethod
+    def get_worksheet_title(self, table_id: str, sheet_id: Union[str, int]) -> str:
+        """Resolves the worksheet and returns its title, used to label the ranges of batch requests"""
+
+    @abstractmethod
+    def get_cell(self, table_id: str, sheet_id: Union[str, int], cell: str) -> str:
+        ...
+
+    @abstractmethod
+    def get_ranges(self, table_id: str, sheet_id: Union[str, int], ranges: list[str]) -> list[list[list[str]]]:
+        """Reads the A1 ranges of one worksheet"""
+
+    @abstractmethod
+    def batch_get(self, table_id: str, ranges: list[tuple[str, str]]) -> list[list[list[str]]]:
+        """Reads the (sheet_id, A1 range) ranges of any worksheets of one spreadsheet at once"""
+
+    @abstractmethod
+    def update_cell(self, table_id: str, sheet_id: Union[str, int], cell: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def batch_update(self, table_id: str, updates: Iterable[tuple[str, str, str]]) -> None:
+        """Writes the (sheet_id, cell, value) values to any worksheets of one spreadsheet at once"""
+
+    @abstractmethod
+    def get_revision(self, table_id: str) -> str:
+        """Returns a value which changes on every edit of the spreadsheet, see `RevisionsTracker`"""
+
+    def warm_up(self) -> None:
+        """Prepares the backend for the first requests, called once the bot is started"""
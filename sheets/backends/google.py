@@ -0,0 +1,106 @@
+from logging import getLogger
+from typing import Any, Callable, Iterable, Union
+
+from pygsheets import Worksheet
+
+from manager import manager
+from sheets.backends.base import SheetsBackend
+from sheets.registry import handle_is_stale, worksheets
+from sheets.utils import build_sheet_range_label
+
+logger = getLogger(__name__)
+
+SHEETS_API_URL = 'https://sheets.googleapis.com/v4/spreadsheets'
+
+
+class GoogleBackend(SheetsBackend):
+    """
+    Google Sheets.
+
+    The worksheets handles are taken from the registry (see `WorksheetRegistry`): if a call made with a handle
+    fails as stale, the handle is resolved again and the call is retried once.
+    Batch reads are sent by the pooled session of `GoogleManager`, which is safe to share between threads.
+    """
+
+    @staticmethod
+    def _execute_on_worksheet(table_id: str, sheet_id: str, operation: Callable[[Worksheet], Any]) -> Any:
+        worksheet = worksheets.get(table_id, sheet_id)
+        try:
+            return operation(worksheet)
+        except Exception as error:
+            if not handle_is_stale(error):
+                raise
+
+        logger.warning(
+            'Worksheet handle is stale, resolving it again',
+            extra={'table_id': table_id, 'sheet_id': sheet_id},
+        )
+        worksheet = worksheets.refresh(table_id, sheet_id)
+        return operation(worksheet)
+
+    @staticmethod
+    def _execute_on_table(
+            table_id: str,
+            sheets_ids: Iterable[str],
+            operation: Callable[[dict[str, Worksheet]], Any],
+    ) -> Any:
+        """The operation receives a sheet_id -> worksheet mapping, see `_execute_on_worksheet`"""
+
+        sheets_ids = list(sheets_ids)
+        try:
+            return operation(worksheets.get_many(table_id, sheets_ids))
+        except Exception as error:
+            if not handle_is_stale(error):
+                raise
+
+        logger.warning('Worksheets handles are stale, resolving them again', extra={'table_id': table_id})
+        return operation(worksheets.refresh_many(table_id, sheets_ids))
+
+    def get_worksheet_title(self, table_id: str, sheet_id: Union[str, int]) -> str:
+        return worksheets.get(table_id, sheet_id).title
+
+    def get_cell(self, table_id: str, sheet_id: Union[str, int], cell: str) -> str:
+        return self._execute_on_worksheet(table_id, sheet_id, lambda sheet: sheet.get_value(cell))
+
+    def get_ranges(self, table_id: str, sheet_id: Union[str, int], ranges: list[str]) -> list[list[list[str]]]:
+        return self._execute_on_worksheet(table_id, sheet_id, lambda sheet: sheet.get_values_batch(ranges))
+
+    def batch_get(self, table_id: str, ranges: list[tuple[str, str]]) -> list[list[list[str]]]:
+        def send_batch_get(sheets: dict[str, Worksheet]) -> list[list[list[str]]]:
+            labels = [build_sheet_range_label(sheets[sheet_id].title, cells_range) for sheet_id, cells_range in ranges]
+            response = manager.session.get(
+                f'{SHEETS_API_URL}/{table_id}/values:batchGet',
+                params={'ranges': labels, 'majorDimension': 'ROWS', 'valueRenderOption': 'FORMATTED_VALUE'},
+                timeout=manager.timeout,
+            )
+            response.raise_for_status()
+            # the same format `pygsheets.Client.get_range` returns
+            return [value_range.get('values', [['']]) for value_range in response.json().get('valueRanges', [])]
+
+        return self._execute_on_table(table_id, {sheet_id for sheet_id, _ in ranges}, send_batch_get)
+
+    def update_cell(self, table_id: str, sheet_id: Union[str, int], cell: str, value: str) -> None:
+        self._execute_on_worksheet(table_id, sheet_id, lambda sheet: sheet.update_value(cell, value))
+
+    def batch_update(self, table_id: str, updates: Iterable[tuple[str, str, str]]) -> None:
+        updates = list(updates)
+
+        def send_batch_update(sheets: dict[str, Worksheet]) -> None:
+            data = [
+                {'range': build_sheet_range_label(sheets[sheet_id].title, cell), 'values': [[value]]}
+                for sheet_id, cell, value in updates
+            ]
+            request = manager.client.sheet.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=table_id,
+                body={'valueInputOption': 'USER_ENTERED', 'data': data},
+            )
+            request.execute(num_retries=manager.client.sheet.retries)
+
+        self._execute_on_table(table_id, {sheet_id for sheet_id, _, _ in updates}, send_batch_update)
+
+    def get_revision(self, table_id: str) -> str:
+        return manager.get_spreadsheet_revision(table_id)
+
+    def warm_up(self) -> None:
+        manager.start_token_refresh()
+        worksheets.warm_up()
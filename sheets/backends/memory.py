@@ -0,0 +1,153 @@
+import json
+import random
+import time
+from itertools import count
+from threading import Lock
+from typing import Any, Iterable, Optional, TypeVar, Union
+
+from errors import SheetsBackendError
+from sheets.backends.base import SheetsBackend
+from sheets.utils import get_column_index, get_column_letters, split_cell_label
+
+# HTTP status of the injected failures: the one Google answers with when it's temporarily unavailable
+INJECTED_ERROR_STATUS = 503
+
+T = TypeVar('T')
+
+
+class MemoryBackend(SheetsBackend):
+    """
+    In-memory spreadsheets addressed by the A1 notation, lets the bot be run and profiled without Google.
+
+    Every call waits for `latency` seconds and fails with `error_rate` probability,
+    so the slow and the failing Google can be imitated as well.
+    The calls and the size of their JSON payloads are counted (`calls`, `bytes_transferred`), see `reset_stats`.
+
+    :latency: - the number of seconds every call takes
+    :error_rate: - the probability of a call to fail with `SheetsBackendError`
+    :data: - the initial values: table_id -> sheet_id -> cell -> value
+    """
+
+    def __init__(self, latency: float = 0, error_rate: float = 0, data: Optional[dict] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        # number of the calls made, per method name
+        self.calls: dict[str, int] = {}
+        # size of the requests and responses payloads, as if they were sent to Google
+        self.bytes_transferred = 0
+
+        # (table_id, sheet_id) -> cell -> value
+        self._cells: dict[tuple[str, str], dict[str, str]] = {}
+        # table_id -> the number of the spreadsheet edits
+        self._revisions: dict[str, int] = {}
+        self._revisions_counter = count(1)
+        self._lock = Lock()
+
+        self.load(data or {})
+
+    @classmethod
+    def from_file(cls, file_path: Optional[str], **kwargs) -> 'MemoryBackend':
+        """Creates the backend with the initial values from the JSON file, see `load`"""
+
+        data = None
+        if file_path:
+            with open(file_path, 'r') as file:
+                data = json.loads(file.read())
+        return cls(data=data, **kwargs)
+
+    def load(self, data: dict) -> None:
+        """
+        Sets the values, the data sample:
+        {
+            'table_id_1': {
+                'sheet_id_1': {'B5': '1', 'C5': '2'},
+                ...
+            },
+            ...
+        }
+        """
+
+        with self._lock:
+            for table_id, sheets in data.items():
+                for sheet_id, cells in sheets.items():
+                    worksheet = self._cells.setdefault((str(table_id), str(sheet_id)), {})
+                    worksheet.update({self._normalize_cell(cell): str(value) for cell, value in cells.items()})
+                self._revisions[str(table_id)] = next(self._revisions_counter)
+
+    @staticmethod
+    def _normalize_cell(cell: str) -> str:
+        column, row = split_cell_label(cell)
+        return f'{column}{row}'
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.bytes_transferred = 0
+
+    def _call(self, method: str, request: Any) -> None:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        self._transfer(request)
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise SheetsBackendError(f'Injected failure of "{method}"', status=INJECTED_ERROR_STATUS)
+
+    def _transfer(self, payload: T) -> T:
+        size = len(json.dumps(payload, ensure_ascii=False).encode())
+        with self._lock:
+            self.bytes_transferred += size
+        return payload
+
+    def _read_range(self, table_id: str, sheet_id: Union[str, int], cells_range: str) -> list[list[str]]:
+        first_cell, _, last_cell = cells_range.partition(':')
+        first_column, first_row = split_cell_label(first_cell)
+        last_column, last_row = split_cell_label(last_cell or first_cell)
+        columns = [
+            get_column_letters(index)
+            for index in range(get_column_index(first_column), get_column_index(last_column) + 1)
+        ]
+
+        worksheet = self._cells.get((str(table_id), str(sheet_id)), {})
+        rows = []
+        for row in range(first_row, last_row + 1):
+            values = [worksheet.get(f'{column}{row}', '') for column in columns]
+            while values and values[-1] == '':
+                values.pop()
+            rows.append(values)
+        while rows and not rows[-1]:
+            rows.pop()
+
+        return rows or [['']]
+
+    def get_worksheet_title(self, table_id: str, sheet_id: Union[str, int]) -> str:
+        return f'Sheet{sheet_id}'
+
+    def get_cell(self, table_id: str, sheet_id: Union[str, int], cell: str) -> str:
+        self._call('get_cell', cell)
+        return self._transfer(self._cells.get((str(table_id), str(sheet_id)), {}).get(self._normalize_cell(cell), ''))
+
+    def get_ranges(self, table_id: str, sheet_id: Union[str, int], ranges: list[str]) -> list[list[list[str]]]:
+        self._call('get_ranges', ranges)
+        return self._transfer([self._read_range(table_id, sheet_id, cells_range) for cells_range in ranges])
+
+    def batch_get(self, table_id: str, ranges: list[tuple[str, str]]) -> list[list[list[str]]]:
+        self._call('batch_get', ranges)
+        return self._transfer([self._read_range(table_id, sheet_id, cells_range) for sheet_id, cells_range in ranges])
+
+    def update_cell(self, table_id: str, sheet_id: Union[str, int], cell: str, value: str) -> None:
+        self.batch_update(table_id, [(str(sheet_id), cell, value)])
+
+    def batch_update(self, table_id: str, updates: Iterable[tuple[str, str, str]]) -> None:
+        updates = list(updates)
+        self._call('batch_update', updates)
+        with self._lock:
+            for sheet_id, cell, value in updates:
+                worksheet = self._cells.setdefault((str(table_id), str(sheet_id)), {})
+                worksheet[self._normalize_cell(cell)] = str(value)
+            self._revisions[str(table_id)] = next(self._revisions_counter)
+
+    def get_revision(self, table_id: str) -> str:
+        self._call('get_revision', table_id)
+        return self._transfer(str(self._revisions.get(str(table_id), 0)))
@@ -0,0 +1,101 @@
+import time
+from logging import getLogger
+from threading import Lock
+from typing import Any, Callable
+
+from settings import settings
+
+logger = getLogger(__name__)
+
+DEFAULT_FAILURES_THRESHOLD = 3
+DEFAULT_LATENCY_THRESHOLD = 10
+DEFAULT_RECOVERY_TIMEOUT = 60
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str):
+        message = f'The "{name}" circuit is open, the call is rejected.'
+        super().__init__(message)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing remote service for a while, so that callers fail fast instead of waiting.
+
+    The circuit opens after `failures_threshold` consecutive failed calls, a call which took longer
+    than `latency_threshold` seconds counts as a failed one. While the circuit is open, all the calls
+    are rejected with `CircuitOpenError`. After `recovery_timeout` seconds one trial call is let through:
+    its success closes the circuit, its failure opens it again.
+
+    :name: - a name of the service used in logs
+    """
+
+    def __init__(self, name: str, failures_threshold: int, latency_threshold: float, recovery_timeout: float):
+        self.name = name
+        self.failures_threshold = failures_threshold
+        self.latency_threshold = latency_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._failures = 0
+        self._opened_at = None
+        self._trial_call_in_progress = False
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Checks if the calls are being rejected right now"""
+
+        with self._lock:
+            return self._opened_at is not None and (
+                time.monotonic() - self._opened_at < self.recovery_timeout or self._trial_call_in_progress
+            )
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.recovery_timeout or self._trial_call_in_progress:
+                raise CircuitOpenError(self.name)
+            self._trial_call_in_progress = True
+
+    def _after_call(self, succeeded: bool) -> None:
+        with self._lock:
+            self._trial_call_in_progress = False
+
+            if succeeded:
+                if self._opened_at is not None:
+                    logger.warning('Circuit is closed', extra={'circuit': self.name})
+                self._failures = 0
+                self._opened_at = None
+                return
+
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failures_threshold:
+                logger.error('Circuit is open', extra={'circuit': self.name, 'failures': self._failures})
+                self._opened_at = time.monotonic()
+
+    def call(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        self._before_call()
+
+        started_at = time.monotonic()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            self._after_call(succeeded=False)
+            raise
+
+        duration = time.monotonic() - started_at
+        if duration > self.latency_threshold:
+            logger.warning('Call is too slow', extra={'circuit': self.name, 'duration': duration})
+        self._after_call(succeeded=duration <= self.latency_threshold)
+
+        return result
+
+
+breaker_settings = settings.config.get('circuit-breaker') or {}
+google_breaker = CircuitBreaker(
+    name='google',
+    failures_threshold=breaker_settings.get('failures_threshold', DEFAULT_FAILURES_THRESHOLD),
+    latency_threshold=breaker_settings.get('latency_threshold', DEFAULT_LATENCY_THRESHOLD),
+    recovery_timeout=breaker_settings.get('recovery_timeout', DEFAULT_RECOVERY_TIMEOUT),
+)
@@ -0,0 +1,289 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock, local
+from typing import Iterable, Optional, Union
+
+from settings import settings
+from sheets.storage import SQLiteStorage, storage
+from sheets.utils import split_cell_label
+
+# seconds a cached value stays fresh, per kind of data:
+# today's KPI and bonuses rows are being filled during the evening, funds and key values change rarely
+DEFAULT_TTL_PER_KIND = {
+    'kpi': 60,
+    'bonuses': 60,
+    'leader': 300,
+    'funds': 900,
+    'key-values': 900,
+}
+DEFAULT_TTL = 60
+DEFAULT_MAX_SIZE = 5000
+# seconds after the value's expiration during which it is still served while being refreshed in the background
+DEFAULT_STALE_WHILE_REVALIDATE = 300
+
+CacheKey = tuple[str, str, str]
+
+
+@dataclass
+class CacheEntry:
+    value: str
+    kind: Optional[str]
+    # monotonic time, used to check freshness
+    stored_at: float
+    # wall-clock time, used to show how old a served stale value is
+    read_at: float
+    # revision of the spreadsheet the value was read at, see `RevisionsTracker`
+    revision: Optional[str] = None
+
+
+class Staleness(local):
+    """
+    Remembers (per thread) the read time of the oldest stale value served since the last `reset`,
+    so that a handler can mark its answer as built from outdated data.
+    """
+
+    def __init__(self):
+        self.oldest_read_at: Optional[float] = None
+
+    def reset(self) -> None:
+        self.oldest_read_at = None
+
+    def mark(self, entry: CacheEntry) -> None:
+        if self.oldest_read_at is None or entry.read_at < self.oldest_read_at:
+            self.oldest_read_at = entry.read_at
+
+    @property
+    def as_of(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.oldest_read_at) if self.oldest_read_at is not None else None
+
+
+class CellsCache:
+    """
+    In-process read-through cache of the cells values with LRU size bounds.
+
+    Every value is stored with the kind of its data, the kind defines how long the value stays fresh.
+    Cells are addressed by (table_id, sheet_id, cell) keys.
+    Expired values are kept until evicted: they are served as the last known good ones when Google is unavailable
+    and, during `stale_while_revalidate` seconds after the expiration, while being refreshed in the background.
+
+    :max_size: - the maximum number of the cached cells, the least recently used ones are evicted first
+    :ttl_per_kind: - the number of seconds a value of the specific kind stays fresh
+    :default_ttl: - the number of seconds a value of any other kind stays fresh
+    :stale_while_revalidate: - the number of seconds an expired value is served while being refreshed
+    :storage: - an optional on-disk storage the cache is loaded from and written through to,
+                so the values read by one process are reused by the next ones
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            ttl_per_kind: dict[str, int],
+            default_ttl: int,
+            stale_while_revalidate: int = 0,
+            storage: Optional[SQLiteStorage] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_per_kind = ttl_per_kind
+        self.default_ttl = default_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.storage = storage
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+        self._entries: OrderedDict[CacheKey, CacheEntry] = OrderedDict()
+        self._lock = Lock()
+
+        if self.storage:
+            self._load_from_storage()
+
+    def _load_from_storage(self) -> None:
+        """Loads the values which may still be fresh, the stored wall-clock stamps are converted to monotonic ones"""
+
+        max_age = max([self.default_ttl, *self.ttl_per_kind.values()]) + self.stale_while_revalidate
+        self.storage.delete_outdated_cells(max_age)
+
+        time_shift = time.time() - time.monotonic()
+        with self._lock:
+            for table_id, sheet_id, cell, value, kind, revision, read_at in self.storage.get_cells(max_age):
+                self._entries[(table_id, sheet_id, cell)] = CacheEntry(
+                    value=value,
+                    kind=kind,
+                    stored_at=read_at - time_shift,
+                    read_at=read_at,
+                    revision=revision,
+                )
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def build_key(table_id: str, sheet_id: Union[str, int], cell: str) -> CacheKey:
+        column, row = split_cell_label(cell)
+        return str(table_id), str(sheet_id), f'{column}{row}'
+
+    def get_ttl(self, kind: Optional[str]) -> int:
+        return self.ttl_per_kind.get(kind, self.default_ttl)
+
+    def get_age(self, entry: CacheEntry) -> float:
+        return time.monotonic() - entry.stored_at
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.get_age(entry) <= self.get_ttl(entry.kind)
+
+    def is_revalidatable(self, entry: CacheEntry) -> bool:
+        """Checks if the expired value still may be served while being refreshed in the background"""
+        return self.get_age(entry) <= self.get_ttl(entry.kind) + self.stale_while_revalidate
+
+    def get_entry(self, table_id: str, sheet_id: Union[str, int], cell: str) -> Optional[CacheEntry]:
+        """Returns the cached entry of the cell regardless of its freshness"""
+
+        key = self.build_key(table_id, sheet_id, cell)
+        with self._lock:
+            return self._get_entry(key)
+
+    def _get_entry(self, key: CacheKey) -> Optional[CacheEntry]:
+        """Returns the cached entry and marks it as the most recently used one, the lock must be held"""
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def get(self, table_id: str, sheet_id: Union[str, int], cell: str) -> Optional[str]:
+        """Returns the fresh cached value of the cell, or None if there is no such one"""
+
+        key = self.build_key(table_id, sheet_id, cell)
+        # the counters are updated under the lock: the cache is read from the bot's and the reading threads
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None or not self.is_fresh(entry):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry.value
+
+    def get_stale(self, table_id: str, sheet_id: Union[str, int], cell: str) -> Optional[str]:
+        """
+        Returns the cached value of the cell regardless of its freshness, or None if there is no such one.
+        Serving a value which is not fresh is registered in `staleness`.
+        """
+
+        key = self.build_key(table_id, sheet_id, cell)
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                return None
+
+            stale = not self.is_fresh(entry)
+            if stale:
+                self.stale_hits += 1
+
+        if stale:
+            staleness.mark(entry)
+        return entry.value
+
+    def set(
+            self,
+            table_id: str,
+            sheet_id: Union[str, int],
+            cell: str,
+            value: str,
+            kind: Optional[str],
+            revision: Optional[str] = None,
+    ) -> None:
+        self.set_many([(table_id, sheet_id, cell, value)], kind=kind, revision=revision)
+
+    def set_many(
+            self,
+            cells: Iterable[tuple[str, Union[str, int], str, str]],
+            kind: Optional[str],
+            revision: Optional[str] = None,
+    ) -> None:
+        """Stores the (table_id, sheet_id, cell, value) values of one kind read just now at the specified revision"""
+
+        keys_values = [(self.build_key(table_id, sheet_id, cell), value) for table_id, sheet_id, cell, value in cells]
+        stored_at, read_at = time.monotonic(), time.time()
+
+        with self._lock:
+            for key, value in keys_values:
+                self._entries[key] = CacheEntry(value, kind, stored_at, read_at, revision)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        if self.storage:
+            self.storage.set_cells(
+                (table_id, sheet_id, cell, split_cell_label(cell)[1], value, kind, revision)
+                for (table_id, sheet_id, cell), value in keys_values
+            )
+
+    def revalidate(self, cells: Iterable[tuple[str, Union[str, int], str]]) -> None:
+        """Makes the cached (table_id, sheet_id, cell) values fresh again: their spreadsheet hasn't changed"""
+
+        stored_at, read_at = time.monotonic(), time.time()
+
+        revalidated = []
+        with self._lock:
+            for table_id, sheet_id, cell in cells:
+                entry = self._entries.get(self.build_key(table_id, sheet_id, cell))
+                if entry is not None:
+                    entry.stored_at, entry.read_at = stored_at, read_at
+                    revalidated.append((*self.build_key(table_id, sheet_id, cell), entry))
+
+        if self.storage and revalidated:
+            self.storage.set_cells(
+                (table_id, sheet_id, cell, split_cell_label(cell)[1], entry.value, entry.kind, entry.revision)
+                for table_id, sheet_id, cell, entry in revalidated
+            )
+
+    def invalidate_rows(self, table_id: str, sheet_id: Union[str, int], rows: Iterable[int]) -> None:
+        """
+        Drops the cached cells of the rows.
+        A written cell invalidates its whole row, because the rows contain formulas (e.g. day totals)
+        which depend on the written cells.
+        """
+
+        table_id, sheet_id, rows = str(table_id), str(sheet_id), set(rows)
+        with self._lock:
+            for key in list(self._entries):
+                key_table_id, key_sheet_id, cell = key
+                if key_table_id == table_id and key_sheet_id == sheet_id and split_cell_label(cell)[1] in rows:
+                    del self._entries[key]
+
+        if self.storage:
+            self.storage.delete_rows(table_id, sheet_id, rows)
+
+    def invalidate_cells(self, cells: Iterable[tuple[str, Union[str, int], str]]) -> None:
+        """Drops the cached rows of the written (table_id, sheet_id, cell) cells, see `invalidate_rows`"""
+
+        rows_per_sheet: dict[tuple[str, str], set[int]] = {}
+        for table_id, sheet_id, cell in cells:
+            rows_per_sheet.setdefault((str(table_id), str(sheet_id)), set()).add(split_cell_label(cell)[1])
+
+        for (table_id, sheet_id), rows in rows_per_sheet.items():
+            self.invalidate_rows(table_id, sheet_id, rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'stale_hits': self.stale_hits,
+            }
+
+
+staleness = Staleness()
+
+cache_settings = settings.config.get('cache') or {}
+cells_cache = CellsCache(
+    max_size=cache_settings.get('max_size', DEFAULT_MAX_SIZE),
+    ttl_per_kind={**DEFAULT_TTL_PER_KIND, **(cache_settings.get('ttl') or {})},
+    default_ttl=DEFAULT_TTL,
+    stale_while_revalidate=cache_settings.get('stale_while_revalidate', DEFAULT_STALE_WHILE_REVALIDATE),
+    storage=storage,
+)
@@ -1,42 +1,107 @@
 from logging import getLogger
-from typing import Union
+from typing import Iterable, Optional, Union
 
 from settings import settings
-from sheets.tools import get_cell_value, update_cell_value
+from sheets.planner import FetchPlan
+from sheets.tools import update_cells_values
 from sheets.utils import get_actual_row_for_disbonuses
 
 logger = getLogger(__name__)
 
 
-def update_disbonus_for_user(user_id: str, disbonus_id: str, disbonus_value: Union[int, str]) -> None:
-    """TODO"""
+def update_disbonuses_for_user(
+        user_id: Union[int, str],
+        disbonuses_values: Iterable[tuple[str, Union[int, str]]],
+) -> None:
+    """
+    Writes the user's dis-bonuses values to the dis-bonuses sheet in one batch request.
 
-    try:
-        user_id = str(user_id)
-        disbonus_column = settings.config['employees'][user_id]['bonuses']['dis-bonuses'][disbonus_id]['column']
+    :disbonuses_values: (disbonus_id, disbonus_value) pairs
+    """
 
-        update_cell_value(
-            table_id=settings.config['google']['dis-bonuses']['table'],
-            sheet_id=settings.config['google']['dis-bonuses']['sheet'],
-            value=str(disbonus_value),
-            column=disbonus_column,
-            row=str(get_actual_row_for_disbonuses()),
-        )
-    except KeyError:
-        logger.exception(f'user with ID: {user_id} does not have a disbonus with the next id: {disbonus_id}')
+    disbonuses_sheet = settings.configuration.disbonuses_sheet
+    employee = settings.configuration.employees[int(user_id)]
+    row = str(get_actual_row_for_disbonuses())
 
+    updates = []
+    for disbonus_id, disbonus_value in disbonuses_values:
+        try:
+            disbonus_column = employee.disbonuses[disbonus_id].column
+        except KeyError:
+            logger.exception(f'user with ID: {user_id} does not have a disbonus with the next id: {disbonus_id}')
+            continue
 
-def get_user_actual_bonus_value(user_id: str):
-    """TODO"""
+        updates.append((disbonuses_sheet.table, disbonuses_sheet.sheet, disbonus_column + row, str(disbonus_value)))
 
-    user_id = str(user_id)
-    user_bonus_value_column = settings.config['employees'][user_id]['bonuses']['bonus-value-column']
+    update_cells_values(updates)
 
-    value = get_cell_value(
-        table_id=settings.config['google']['dis-bonuses']['table'],
-        sheet_id=settings.config['google']['dis-bonuses']['sheet'],
-        column=user_bonus_value_column,
-        row=str(get_actual_row_for_disbonuses()),
+
+def update_disbonus_for_user(user_id: Union[int, str], disbonus_id: str, disbonus_value: Union[int, str]) -> None:
+    """Writes a single dis-bonus value of the user"""
+
+    update_disbonuses_for_user(user_id=user_id, disbonuses_values=[(disbonus_id, disbonus_value)])
+
+
+def get_bonus_value_columns(users_ids: Optional[Iterable[Union[int, str]]] = None) -> dict[int, str]:
+    """Returns the bonus balance columns of the users, of all the users with the bonuses by default"""
+
+    employees = settings.configuration.employees
+    if users_ids is None:
+        users_ids = employees
+    return {
+        int(user_id): employees[int(user_id)].bonus_value_column
+        for user_id in users_ids
+        if employees[int(user_id)].bonus_value_column
+    }
+
+
+def declare_actual_bonus_values(plan: FetchPlan, users_ids: Optional[Iterable[Union[int, str]]] = None) -> None:
+    """Declares the cells read by `get_actual_bonus_values`: the balance columns of today's row"""
+
+    plan.add_row(
+        settings.configuration.disbonuses_sheet.table,
+        settings.configuration.disbonuses_sheet.sheet,
+        get_bonus_value_columns(users_ids).values(),
+        get_actual_row_for_disbonuses(),
+        kind='bonuses',
+    )
+
+
+def get_actual_bonus_values(
+        users_ids: Optional[Iterable[Union[int, str]]] = None,
+        plan: Optional[FetchPlan] = None,
+) -> dict[int, str]:
+    """
+    Returns the actual bonus balances of the users, of all the users with the bonuses by default.
+    All the balances are in today's row of the dis-bonuses sheet, so they are read with a single request.
+
+    Return value sample:
+    {user_id_1: '1000', user_id_2: '750', ...}
+    """
+
+    if users_ids is not None:
+        users_ids = list(users_ids)
+    if plan is None:
+        plan = FetchPlan.prepared(declare_actual_bonus_values, users_ids=users_ids)
+
+    bonus_value_columns = get_bonus_value_columns(users_ids)
+    values = plan.get_row(
+        table_id=settings.configuration.disbonuses_sheet.table,
+        sheet_id=settings.configuration.disbonuses_sheet.sheet,
+        columns=bonus_value_columns.values(),
+        row=get_actual_row_for_disbonuses(),
     )
 
-    return str(value)
+    return {user_id: str(values[column]) for user_id, column in bonus_value_columns.items()}
+
+
+def declare_user_actual_bonus_value(plan: FetchPlan, user_id: Union[int, str]) -> None:
+    """Declares the cell read by `get_user_actual_bonus_value`"""
+
+    declare_actual_bonus_values(plan, users_ids=[user_id])
+
+
+def get_user_actual_bonus_value(user_id: Union[int, str], plan: Optional[FetchPlan] = None) -> str:
+    """Returns the actual bonus balance of the user, see `get_actual_bonus_values`"""
+
+    return str(get_actual_bonus_values(users_ids=[user_id], plan=plan).get(int(user_id)))
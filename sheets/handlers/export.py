@@ -0,0 +1,158 @@
+import csv
+import json
+from datetime import date, timedelta
+from logging import getLogger
+from typing import Any, IO, Iterable, Iterator, Optional
+
+from errors import SheetsValuesUnavailableError
+from settings import settings
+from sheets.handlers.statistics import declare_statistic_for_period, get_sections_layout
+from sheets.layout import SectionLayout
+from sheets.planner import FetchPlan
+from sheets.utils import get_elapsed_days, get_rows_for_section
+
+logger = getLogger(__name__)
+
+# the number of days read with one request per spreadsheet: the longer the chunks, the fewer the requests,
+# but the bigger their payloads and the more values are kept in memory at once
+DEFAULT_CHUNK_DAYS = 31
+
+EXPORT_FIELDS = ('date', 'section', 'user_id', 'full_name', 'item', 'value')
+
+export_settings = settings.config.get('export') or {}
+
+
+def iter_days_chunks(first_day: date, last_day: date, chunk_days: int) -> Iterator[tuple[date, date]]:
+    """Splits the days from `first_day` to `last_day` inclusive to the chunks of `chunk_days` days at most"""
+
+    chunk_first_day = first_day
+    while chunk_first_day <= last_day:
+        chunk_last_day = min(chunk_first_day + timedelta(days=chunk_days - 1), last_day)
+        yield chunk_first_day, chunk_last_day
+        chunk_first_day = chunk_last_day + timedelta(days=1)
+
+
+def iter_section_records(
+        plan: FetchPlan,
+        section: SectionLayout,
+        first_day: date,
+        last_day: date,
+) -> Iterator[dict[str, Any]]:
+    """Yields the records of the section's days declared in the plan, see `iter_statistic_records`"""
+
+    first_row, _ = get_rows_for_section(section.section_id, first_day, last_day)
+    for day_offset in range((last_day - first_day).days + 1):
+        day = (first_day + timedelta(days=day_offset)).isoformat()
+        values = plan.get_row(section.table_id, section.sheet_id, section.columns, first_row + day_offset)
+        # the rows which could not be read must not pass for the empty ones
+        if None in values.values():
+            raise SheetsValuesUnavailableError(section.table_id, section.sheet_id)
+
+        for name, column in section.totals:
+            yield {
+                'date': day, 'section': section.name, 'user_id': None, 'full_name': None,
+                'item': name, 'value': values[column],
+            }
+        for employee in section.employees:
+            for _, item_name, column in employee.items:
+                yield {
+                    'date': day, 'section': section.name, 'user_id': employee.user_id, 'full_name': employee.full_name,
+                    'item': item_name, 'value': values[column],
+                }
+
+
+def iter_statistic_records(
+        first_day: date,
+        last_day: date,
+        filter_by_section_id: Optional[str] = None,
+        chunk_days: Optional[int] = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Streams the statistics of the days from `first_day` to `last_day` inclusive (the days to come are skipped,
+    there are no records if none of the days has come yet):
+    a record per day per section's total item (without the user) and per employee's KPI item.
+    The days are read in chunks of `chunk_days` days, one request per spreadsheet each,
+    and only the values of the current chunk are kept in memory.
+    Raises `SheetsValuesUnavailableError` as soon as a chunk could not be read.
+
+    Record sample:
+    {'date': '2021-07-01', 'section': 'name', 'user_id': 1, 'full_name': 'Full Name', 'item': 'item', 'value': '1'}
+    """
+
+    chunk_days = chunk_days or export_settings.get('chunk_days', DEFAULT_CHUNK_DAYS)
+    elapsed_days = get_elapsed_days(first_day, last_day)
+    if elapsed_days is None:
+        return
+
+    first_day, last_day = elapsed_days
+    sections = get_sections_layout(filter_by_section_id)
+
+    for chunk_first_day, chunk_last_day in iter_days_chunks(first_day, last_day, chunk_days):
+        plan = FetchPlan.prepared(
+            declare_statistic_for_period,
+            first_day=chunk_first_day,
+            last_day=chunk_last_day,
+            filter_by_section_id=filter_by_section_id,
+        )
+        for section in sections:
+            yield from iter_section_records(plan, section, chunk_first_day, chunk_last_day)
+        # the chunk's values are released before the next chunk is read
+        del plan
+
+
+def write_csv(records: Iterable[dict[str, Any]], file: IO[str]) -> int:
+    writer = csv.DictWriter(file, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+
+    records_count = 0
+    for records_count, record in enumerate(records, start=1):
+        writer.writerow(record)
+    return records_count
+
+
+def write_jsonl(records: Iterable[dict[str, Any]], file: IO[str]) -> int:
+    records_count = 0
+    for records_count, record in enumerate(records, start=1):
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return records_count
+
+
+# export format -> (writer, encoding of the file): the BOM lets Excel recognise the cyrillic CSV as UTF-8
+EXPORT_FORMATS = {
+    'csv': (write_csv, 'utf-8-sig'),
+    'jsonl': (write_jsonl, 'utf-8'),
+}
+
+
+def export_statistics(
+        path: str,
+        export_format: str,
+        first_day: date,
+        last_day: date,
+        filter_by_section_id: Optional[str] = None,
+        chunk_days: Optional[int] = None,
+) -> int:
+    """
+    Writes the statistics records (see `iter_statistic_records`) to the file in the format, record by record.
+    Returns the number of the written records.
+    Raises `SheetsValuesUnavailableError` if some of the days could not be read, the file is incomplete then.
+    """
+
+    writer, encoding = EXPORT_FORMATS[export_format]
+    with open(path, 'w', newline='', encoding=encoding) as file:
+        records = iter_statistic_records(
+            first_day,
+            last_day,
+            filter_by_section_id=filter_by_section_id,
+            chunk_days=chunk_days,
+        )
+        records_count = writer(records, file)
+
+    logger.info(
+        'The statistics are exported.',
+        extra={
+            'export_format': export_format, 'first_day': first_day, 'last_day': last_day,
+            'section_id': filter_by_section_id, 'records_count': records_count,
+        },
+    )
+    return records_count
@@ -1,73 +1,229 @@
+import heapq
 import logging
-from typing import Optional
+from datetime import date, timedelta
+from operator import itemgetter
+from typing import Mapping, Optional
 
+from errors import LeaderHistoryNotConfiguredError
 from settings import settings
-from sheets.tools import get_cell_value
+from sheets.aggregation import KPIBlock
+from sheets.planner import FetchPlan
+from sheets.utils import get_elapsed_days, get_row_for_day
 
 logger = logging.getLogger(__name__)
 
+# the number of the candidates in the leaderboard, the ones sharing the last place with them are added
+DEFAULT_LEADERBOARD_SIZE = 5
 
-def get_funds_statistics(full=False) -> dict[str, tuple[str, str]]:
+
+def declare_funds_statistics(plan: FetchPlan, full=False) -> None:
+    """Declares the cells read by `get_funds_statistics`"""
+
+    funds_google_data = settings.configuration.funds_sheet
+    for fund in settings.configuration.funds:
+        if fund.admin_only and not full:
+            continue
+
+        for cell in (fund.actual_cell, fund.planned_cell):
+            plan.add_cell(funds_google_data.table, funds_google_data.sheet, cell, kind='funds')
+
+
+def get_funds_statistics(full=False, plan: Optional[FetchPlan] = None) -> dict[str, tuple[str, str]]:
     """TODO"""
 
+    if plan is None:
+        plan = FetchPlan.prepared(declare_funds_statistics, full=full)
+
     result = {}
 
-    for fund_data in settings.config['other']['funds']['items'].values():
-        if fund_data['statistics']['admin_only'] and not full:
+    funds_google_data = settings.configuration.funds_sheet
+    for fund in settings.configuration.funds:
+        if fund.admin_only and not full:
             continue
 
-        fund_actual = get_cell_value(
-            table_id=settings.config['other']['funds']['google']['table'],
-            sheet_id=settings.config['other']['funds']['google']['sheet'],
-            cell=fund_data['statistics']['cells']['actual'],
+        fund_actual = plan.get_cell(
+            table_id=funds_google_data.table,
+            sheet_id=funds_google_data.sheet,
+            cell=fund.actual_cell,
         )
-        fund_planned = get_cell_value(
-            table_id=settings.config['other']['funds']['google']['table'],
-            sheet_id=settings.config['other']['funds']['google']['sheet'],
-            cell=fund_data['statistics']['cells']['planned'],
+        fund_planned = plan.get_cell(
+            table_id=funds_google_data.table,
+            sheet_id=funds_google_data.sheet,
+            cell=fund.planned_cell,
         )
 
-        result[fund_data['name']] = (fund_actual, fund_planned)
+        result[fund.name] = (fund_actual, fund_planned)
 
     return result
 
 
-# TODO use ENUM
-def get_leader(period: str = 'today') -> Optional[list[str]]:
-    """
-    TODO
+def leader_history_is_configured() -> bool:
+    """Checks if the leader sheet keeps the candidates' points per day, so the leaderboard covers any period"""
+    return settings.configuration.leader_sheet.start_row is not None
 
-    Return value sample:
-    [firstname_1 lastname_1, firstname_2 lastname_2]
+
+def _get_leader_cells_period(first_day: date, last_day: date) -> Optional[str]:
+    """Returns 'today' or 'yesterday' if the points of the period are in the candidates' cells, None otherwise"""
+
+    today = date.today()
+    if first_day == last_day == today:
+        return 'today'
+    if first_day == last_day == today - timedelta(days=1):
+        return 'yesterday'
+    return None
+
+
+def declare_leader_points(plan: FetchPlan, first_day: date, last_day: date) -> None:
+    """
+    Declares the cells read by `get_leader_points`: the today's or the yesterday's cells of the candidates,
+    or the candidates' columns of the period's rows, read as one range.
+    Raises `LeaderHistoryNotConfiguredError` for the other periods if the leader sheet keeps no points per day.
     """
 
-    result = []
+    leader_google_data = settings.configuration.leader_sheet
+    candidates = settings.configuration.leader_candidates
+
+    cells_period = _get_leader_cells_period(first_day, last_day)
+    if cells_period is not None:
+        for candidate in candidates:
+            plan.add_cell(
+                leader_google_data.table,
+                leader_google_data.sheet,
+                candidate.today_cell if cells_period == 'today' else candidate.yesterday_cell,
+                kind='leader',
+            )
+    elif leader_history_is_configured():
+        elapsed_days = get_elapsed_days(first_day, last_day)
+        if elapsed_days is None:
+            return
+
+        first_day, last_day = elapsed_days
+        plan.add_rows(
+            leader_google_data.table,
+            leader_google_data.sheet,
+            [candidate.column for candidate in candidates],
+            get_row_for_day(leader_google_data.start_row, first_day),
+            get_row_for_day(leader_google_data.start_row, last_day),
+        )
+    else:
+        raise LeaderHistoryNotConfiguredError()
+
 
-    points_per_user: dict[str, Optional[int]] = {}
-    for user_id, cells in settings.config['other']['leader']['candidates'].items():
-        value = get_cell_value(
-            table_id=settings.config['other']['leader']['google']['table'],
-            sheet_id=settings.config['other']['leader']['google']['sheet'],
-            # TODO fix this crunch during next refactoring
-            cell=cells['today' if period == 'today' else 'yesterday']
+def get_leader_points(first_day: date, last_day: date, plan: Optional[FetchPlan] = None) -> dict[int, float]:
+    """
+    Returns the points of every candidate for the period, see `declare_leader_points`.
+    There are no candidates if none of the period's days has come yet.
+    """
+
+    if plan is None:
+        plan = FetchPlan.prepared(declare_leader_points, first_day=first_day, last_day=last_day)
+
+    leader_google_data = settings.configuration.leader_sheet
+    candidates = settings.configuration.leader_candidates
+
+    cells_period = _get_leader_cells_period(first_day, last_day)
+    if cells_period is None:
+        if not leader_history_is_configured():
+            raise LeaderHistoryNotConfiguredError()
+
+        elapsed_days = get_elapsed_days(first_day, last_day)
+        if elapsed_days is None:
+            return {}
+
+        first_day, last_day = elapsed_days
+        block = KPIBlock.from_values(first_day, last_day, plan.get_columns(
+            leader_google_data.table,
+            leader_google_data.sheet,
+            [candidate.column for candidate in candidates],
+            get_row_for_day(leader_google_data.start_row, first_day),
+            get_row_for_day(leader_google_data.start_row, last_day),
+        ))
+        return {candidate.user_id: block.sum(candidate.column) for candidate in candidates}
+
+    points_per_user = {}
+    for candidate in candidates:
+        user_id = candidate.user_id
+        value = plan.get_cell(
+            table_id=leader_google_data.table,
+            sheet_id=leader_google_data.sheet,
+            cell=candidate.today_cell if cells_period == 'today' else candidate.yesterday_cell,
         )
 
         try:
             points_per_user[user_id] = int(value)
-        except ValueError:
+        except (TypeError, ValueError):
             logger.error(
                 'The retrieved points value of candidate is not numeric.',
                 extra={'user_id': user_id, 'value': value},
             )
             points_per_user[user_id] = 0
 
-    max_points = max(points_per_user.values())
-    if max_points:
-        for user_id, points in points_per_user.items():
-            if points == max_points:
-                result.append(
-                    f'{settings.config["employees"][user_id]["firstname"]} '
-                    f'{settings.config["employees"][user_id]["lastname"]}',
-                )
+    return points_per_user
 
-    return result
+
+def rank_leaders(points_per_user: Mapping[int, float], size: int) -> list[tuple[int, float]]:
+    """
+    Selects the `size` candidates with the most points, the ones sharing the last place with them are added as well.
+    Nobody is ranked if the most points are 0, as the leaders of the day have always been picked.
+    The heap selection doesn't sort all the candidates.
+
+    Return value sample (size 2):
+    [(user_id_1, 50), (user_id_2, 40), (user_id_3, 40)]
+    """
+
+    leaders = heapq.nlargest(size, points_per_user.items(), key=itemgetter(1))
+    if not leaders or leaders[0][1] == 0:
+        return []
+
+    ranked = {user_id for user_id, _ in leaders}
+    last_place_points = leaders[-1][1]
+    leaders.extend(
+        (user_id, points) for user_id, points in points_per_user.items()
+        if points == last_place_points and user_id not in ranked
+    )
+
+    return leaders
+
+
+def get_leaderboard(
+        first_day: date,
+        last_day: date,
+        size: int = DEFAULT_LEADERBOARD_SIZE,
+        plan: Optional[FetchPlan] = None,
+) -> list[tuple[str, float]]:
+    """
+    Ranks the candidates by their points for the period, see `rank_leaders`.
+
+    Return value sample:
+    [('firstname_1 lastname_1', 50), ('firstname_2 lastname_2', 40), ...]
+    """
+
+    employees = settings.configuration.employees
+    return [
+        (employees[user_id].full_name, points)
+        for user_id, points in rank_leaders(get_leader_points(first_day, last_day, plan=plan), size)
+    ]
+
+
+def _get_leader_day(period: str) -> date:
+    return date.today() if period == 'today' else date.today() - timedelta(days=1)
+
+
+def declare_leader(plan: FetchPlan, period: str = 'today') -> None:
+    """Declares the cells read by `get_leader`"""
+
+    day = _get_leader_day(period)
+    declare_leader_points(plan, day, day)
+
+
+# TODO use ENUM
+def get_leader(period: str = 'today', plan: Optional[FetchPlan] = None) -> Optional[list[str]]:
+    """
+    Returns the candidates with the most points of the day, nobody if the most points are 0.
+
+    Return value sample:
+    [firstname_1 lastname_1, firstname_2 lastname_2]
+    """
+
+    day = _get_leader_day(period)
+    return [full_name for full_name, _ in get_leaderboard(day, day, size=1, plan=plan)]
@@ -3,21 +3,59 @@ from logging import getLogger
 from typing import Any, Optional, Union
 
 from settings import settings
-from sheets.tools import get_cell_value, get_cells_values, update_cell_value
-from sheets.utils import get_actual_row_for_section
+from sheets.aggregation import KPIBlock, format_number, format_signed_number
+from sheets.layout import SectionLayout, build_expected_kpi_index, build_sections_layout
+from sheets.planner import FetchPlan
+from sheets.tools import update_cells_values
+from sheets.utils import get_actual_row_for_section, get_elapsed_days, get_rows_for_section
 
 logger = getLogger(__name__)
 
 
+def get_user_kpi_columns_per_section(
+        user_id: Union[int, str],
+        filter_by_section_id: Optional[str] = None,
+) -> dict[str, list[str]]:
+    """Groups the sheet columns of the user's KPI items by sections"""
+
+    columns_per_section = {}
+    for kpi_item in settings.configuration.employees[int(user_id)].kpi.values():
+        if filter_by_section_id and kpi_item.section_id != filter_by_section_id:
+            continue
+        columns_per_section.setdefault(kpi_item.section_id, []).append(kpi_item.column)
+
+    return columns_per_section
+
+
+def declare_user_statistics_for_today(
+        plan: FetchPlan,
+        user_id: Union[int, str],
+        filter_by_section_id: Optional[str] = None,
+) -> None:
+    """Declares the cells read by `get_user_statistics_for_today`"""
+
+    for section, columns in get_user_kpi_columns_per_section(user_id, filter_by_section_id).items():
+        section_google_data = settings.configuration.sections[section].google
+        plan.add_row(
+            section_google_data.table,
+            section_google_data.sheet,
+            columns,
+            get_actual_row_for_section(section),
+            kind='kpi',
+        )
+
+
 def get_user_statistics_for_today(
-        user_id: str,
+        user_id: Union[int, str],
         filter_by_section_id: Optional[str] = None,
+        plan: Optional[FetchPlan] = None,
 ) -> dict[str, Union[str, dict[str, str]]]:
     """
     Extracts statistics for the specified user according to the configuration file.
 
     :user_id: id of the user which statistics data should be extracted
     :filter_by_section_id: section id which should be filtered
+    :plan: a fetch plan the user's cells are declared in, a new one is executed if it's not provided
 
     Return value sample:
     {
@@ -27,36 +65,96 @@ def get_user_statistics_for_today(
         ...
     }
     """
+    if plan is None:
+        plan = FetchPlan.prepared(
+            declare_user_statistics_for_today,
+            user_id=user_id,
+            filter_by_section_id=filter_by_section_id,
+        )
+
     result = {}
 
-    columns_per_section = {}
-    for item_number, item_data in settings.config['employees'][user_id]['statistics']['kpi'].items():
-        if filter_by_section_id and item_data['section'] != filter_by_section_id:
+    for item_number, kpi_item in settings.configuration.employees[int(user_id)].kpi.items():
+        if filter_by_section_id and kpi_item.section_id != filter_by_section_id:
             continue
-        columns_per_section.setdefault(item_data['section'], []).append(item_data['column'])
+
+        section_google_data = settings.configuration.sections[kpi_item.section_id].google
         result[item_number] = {
-            'item_name': item_data['name'],
-            'section': item_data['section'],
+            'item_name': kpi_item.name,
+            'section': kpi_item.section_id,
+            'value': plan.get_cell(
+                table_id=section_google_data.table,
+                sheet_id=section_google_data.sheet,
+                cell=f'{kpi_item.column}{get_actual_row_for_section(kpi_item.section_id)}',
+            ),
         }
 
-    for section, columns in columns_per_section.items():
-        section_google_data = settings.config['sections'][section]['google']
-        section_values = get_cells_values(
-            table_id=section_google_data['table'],
-            sheet_id=section_google_data['sheet'],
-            columns=columns,
-            row=str(get_actual_row_for_section(section))
+    return result
+
+
+def declare_expected_kpi_for_today(plan: FetchPlan) -> None:
+    """Declares the cells read by `get_users_ids_with_empty_kpi`: one row per section"""
+
+    for section in build_expected_kpi_index(settings.configuration).get(date.today().weekday(), ()):
+        section_google_data = settings.configuration.sections[section.section_id].google
+        plan.add_row(
+            section_google_data.table,
+            section_google_data.sheet,
+            section.columns,
+            get_actual_row_for_section(section.section_id),
+            kind='kpi',
         )
-        section_values_index = 0
-        for item_number in result.keys():
-            if result[item_number]['section'] == section:
-                result[item_number].update({'value': section_values[section_values_index]})
-                section_values_index += 1
 
-    return result
+
+def get_users_ids_with_empty_kpi(plan: Optional[FetchPlan] = None) -> list[int]:
+    """
+    Returns the ids of the employees who haven't filled in all of their today's KPI items yet,
+    in the order of the configuration. The items which are not scheduled for today are not checked.
+    The values which could not be read count as empty: an extra reminder is better than a missed one.
+    """
+    if plan is None:
+        plan = FetchPlan.prepared(declare_expected_kpi_for_today)
+
+    users_ids = set()
+    for section in build_expected_kpi_index(settings.configuration).get(date.today().weekday(), ()):
+        section_google_data = settings.configuration.sections[section.section_id].google
+        values = plan.get_row(
+            section_google_data.table,
+            section_google_data.sheet,
+            section.columns,
+            get_actual_row_for_section(section.section_id),
+        )
+        users_ids.update(user_id for user_id, column in section.items if not values[column])
+
+    return [user_id for user_id in settings.configuration.employees if user_id in users_ids]
+
+
+def get_sections_layout(filter_by_section_id: Optional[str] = None) -> list[SectionLayout]:
+    """Returns the layouts of all the sections or of the filtered one"""
+
+    sections_layout = build_sections_layout(settings.configuration)
+    if filter_by_section_id:
+        return [sections_layout[filter_by_section_id]]
+    return list(sections_layout.values())
+
+
+def declare_statistic_for_today(plan: FetchPlan, filter_by_section_id: Optional[str] = None) -> None:
+    """Declares the cells read by `get_statistic_for_today`: one row per section, its totals and employees' KPI"""
+
+    for section in get_sections_layout(filter_by_section_id):
+        plan.add_row(
+            section.table_id,
+            section.sheet_id,
+            section.columns,
+            get_actual_row_for_section(section.section_id),
+            kind='kpi',
+        )
 
 
-def get_statistic_for_today(filter_by_section_id: Optional[str] = None) -> dict[str, Any]:
+def get_statistic_for_today(
+        filter_by_section_id: Optional[str] = None,
+        plan: Optional[FetchPlan] = None,
+) -> dict[str, Any]:
     """
     TODO
 
@@ -100,47 +198,126 @@ def get_statistic_for_today(filter_by_section_id: Optional[str] = None) -> dict[
     }
     """
 
+    if plan is None:
+        plan = FetchPlan.prepared(declare_statistic_for_today, filter_by_section_id=filter_by_section_id)
+
     result = {}
+    for section in get_sections_layout(filter_by_section_id):
+        values = plan.get_row(
+            table_id=section.table_id,
+            sheet_id=section.sheet_id,
+            columns=section.columns,
+            row=get_actual_row_for_section(section.section_id),
+        )
 
-    # fill with total values
-    for section_id, data in settings.config['sections'].items():
-        section_name = settings.config['sections'][section_id]['name']
+        result[section.name] = {
+            'total': [(name, values[column]) for name, column in section.totals],
+            'per_employee': [
+                {
+                    'full_name': employee.full_name,
+                    'statistics': [(item_name, values[column]) for _, item_name, column in employee.items],
+                }
+                for employee in section.employees
+            ],
+        }
 
-        if filter_by_section_id and section_id != filter_by_section_id:
-            continue
+    return result
 
-        items_names, sheet_columns = [], []
-        for statistic_item in data['statistics']['period']['day'].values():
-            items_names.append(statistic_item['name'])
-            sheet_columns.append(statistic_item['column'])
 
-        values = get_cells_values(
-            table_id=data['google']['table'],
-            sheet_id=data['google']['sheet'],
-            columns=sheet_columns,
-            row=str(get_actual_row_for_section(section_id))
-        )
-        total_data = list(zip(items_names, values))
+def declare_statistic_for_period(
+        plan: FetchPlan,
+        first_day: date,
+        last_day: date,
+        filter_by_section_id: Optional[str] = None,
+) -> None:
+    """
+    Declares the cells read by `get_statistic_for_period`: the rows of the period per section,
+    the consecutive rows are read as one block, so every section takes one range of the request whatever the period.
+    """
+
+    elapsed_days = get_elapsed_days(first_day, last_day)
+    if elapsed_days is None:
+        return
 
-        result.setdefault(section_name, {}).update({'total': total_data})
+    for section in get_sections_layout(filter_by_section_id):
+        first_row, last_row = get_rows_for_section(section.section_id, *elapsed_days)
+        plan.add_rows(section.table_id, section.sheet_id, section.columns, first_row, last_row)
 
-        users_results = []
-        for user_id, user_data in settings.config['employees'].items():
-            if not user_data['statistics']:
-                continue
 
-            user_statistics = get_user_statistics_for_today(user_id=user_id, filter_by_section_id=section_id)
+def get_section_block(plan: FetchPlan, section: SectionLayout, first_day: date, last_day: date) -> KPIBlock:
+    """
+    Takes the section's block of the period declared by `declare_statistic_for_period` from the plan,
+    the period must be cut at today already, see `get_elapsed_days`.
+    """
+
+    first_row, last_row = get_rows_for_section(section.section_id, first_day, last_day)
+    values = plan.get_columns(section.table_id, section.sheet_id, section.columns, first_row, last_row)
+    return KPIBlock.from_values(first_day, last_day, values)
+
+
+def get_statistic_for_period(
+        first_day: date,
+        last_day: date,
+        filter_by_section_id: Optional[str] = None,
+        plan: Optional[FetchPlan] = None,
+) -> dict[str, Any]:
+    """
+    Aggregates the statistics of the days from `first_day` to `last_day` inclusive (the days to come are skipped):
+    the sums of the section's total items and of every employee's KPI items, the section's average values per day
+    and the changes of the last day against the day before. There are no sections if none of the days has come yet.
+    Raises `SheetsValuesUnavailableError` if the period's values could not be read.
+
+    Return value sample:
+    {
+        'first_section_name': {
+            'total': [('statistic_item_1', '20'), ('statistic_item_2', '31')],
+            'average': [('statistic_item_1', '2'), ('statistic_item_2', '3.1')],
+            'delta': [('statistic_item_1', '+1'), ('statistic_item_2', '-2')],
+            'per_employee': [
+                {
+                    'full_name': 'Full Name 1',
+                    'statistics': [('statistic_item_1', '12'), ('statistic_item_2', '10')],
+                },
+                ...
+            ],
+        },
+        'second_section_name': {
+        ...
+    }
+    """
 
-            if not user_statistics.values():
-                continue
+    if plan is None:
+        plan = FetchPlan.prepared(
+            declare_statistic_for_period,
+            first_day=first_day,
+            last_day=last_day,
+            filter_by_section_id=filter_by_section_id,
+        )
 
-            user_result = {
-                'full_name': f'{user_data["firstname"]} {user_data["lastname"]}',
-                'statistics': [(item['item_name'], item['value']) for item in user_statistics.values()],
-            }
-            users_results.append(user_result)
+    elapsed_days = get_elapsed_days(first_day, last_day)
+    if elapsed_days is None:
+        return {}
 
-        result[section_name]['per_employee'] = users_results
+    result = {}
+    for section in get_sections_layout(filter_by_section_id):
+        block = get_section_block(plan, section, *elapsed_days)
+        sums = {column: format_number(block.sum(column)) for column in section.columns}
+
+        deltas = [(name, block.deltas(column)) for name, column in section.totals]
+        result[section.name] = {
+            'total': [(name, sums[column]) for name, column in section.totals],
+            'average': [(name, format_number(block.mean(column))) for name, column in section.totals],
+            'delta': [
+                (name, format_signed_number(column_deltas[-1])) for name, column_deltas in deltas if column_deltas
+            ],
+            'per_employee': [
+                {
+                    'full_name': employee.full_name,
+                    'statistics': [(item_name, sums[column]) for _, item_name, column in employee.items],
+                }
+                for employee in section.employees
+            ],
+        }
 
     return result
 
@@ -148,38 +325,49 @@ def get_statistic_for_today(filter_by_section_id: Optional[str] = None) -> dict[
 def prepare_kpi_keys_and_questions(employee_id: Union[int, str]) -> tuple[list[str], list[str]]:
     """TODO"""
 
-    employee_id = str(employee_id)
     day_of_the_week_today = date.weekday(date.today())
     kpi_keys, kpi_questions = [], []
 
-    employee_statistics_data = settings.config['employees'][employee_id]['statistics']
-    if employee_statistics_data:
-        for kpi_key, kpi_data in employee_statistics_data['kpi'].items():
-            if day_of_the_week_today in kpi_data['schedule']:
-                kpi_keys.append(kpi_key)
-                kpi_questions.append(kpi_data['question'])
+    for kpi_key, kpi_item in settings.configuration.employees[int(employee_id)].kpi.items():
+        if day_of_the_week_today in kpi_item.schedule:
+            kpi_keys.append(kpi_key)
+            kpi_questions.append(kpi_item.question)
 
     return kpi_keys, kpi_questions
 
 
 def update_employee_kpi(employee_id: Union[int, str], kpi_values: list[tuple[str, str]]) -> None:
-    """TODO"""
+    """Writes the employee's KPI values to the sections sheets in one batch request per spreadsheet"""
 
-    employee_id = str(employee_id)
+    employee = settings.configuration.employees[int(employee_id)]
+    updates = []
     for kpi_key, value_to_update in kpi_values:
-        kpi_item = settings.config['employees'][employee_id]['statistics']['kpi'][kpi_key]
-        section_google_data = settings.config['sections'][kpi_item['section']]['google']
-
-        update_cell_value(
-            table_id=section_google_data['table'],
-            sheet_id=section_google_data['sheet'],
-            value=value_to_update,
-            column=kpi_item['column'],
-            row=str(get_actual_row_for_section(kpi_item['section'])),
-        )
+        kpi_item = employee.kpi[kpi_key]
+        section_google_data = settings.configuration.sections[kpi_item.section_id].google
+        row = str(get_actual_row_for_section(kpi_item.section_id))
+
+        updates.append((
+            section_google_data.table,
+            section_google_data.sheet,
+            kpi_item.column + row,
+            value_to_update,
+        ))
 
+    update_cells_values(updates)
 
-def get_key_values() -> dict[str, dict[str, tuple[str, str, str]]]:
+
+def declare_key_values(plan: FetchPlan) -> None:
+    """Declares the cells read by `get_key_values`"""
+
+    key_values_sheet = settings.configuration.key_values_sheet
+    for key_value in settings.configuration.key_values:
+        for period in key_value.periods:
+            for cell in (period.actual_cell, period.planned_cell):
+                if cell:
+                    plan.add_cell(key_values_sheet.table, key_values_sheet.sheet, cell, kind='key-values')
+
+
+def get_key_values(plan: Optional[FetchPlan] = None) -> dict[str, dict[str, tuple[str, str, str]]]:
     """
     TODO
 
@@ -201,22 +389,25 @@ def get_key_values() -> dict[str, dict[str, tuple[str, str, str]]]:
     }
     """
 
+    if plan is None:
+        plan = FetchPlan.prepared(declare_key_values)
+
+    key_values_sheet = settings.configuration.key_values_sheet
     result = {}
-    for item_id, key_value_data in settings.config['other']['key-values']['items'].items():
-        result[item_id] = {'name': key_value_data['name'], 'values': []}
-
-        for period_data in key_value_data['statistics']['period'].values():
-            period = period_data['name']
-            actual = get_cell_value(
-                table_id=settings.config['other']['key-values']['google']['table'],
-                sheet_id=settings.config['other']['key-values']['google']['sheet'],
-                cell=period_data['cells']['actual'],
+    for key_value in settings.configuration.key_values:
+        result[key_value.key] = {'name': key_value.name, 'values': []}
+
+        for period in key_value.periods:
+            actual = plan.get_cell(
+                table_id=key_values_sheet.table,
+                sheet_id=key_values_sheet.sheet,
+                cell=period.actual_cell,
             )
-            planned = get_cell_value(
-                table_id=settings.config['other']['key-values']['google']['table'],
-                sheet_id=settings.config['other']['key-values']['google']['sheet'],
-                cell=period_data['cells']['planned'],
-            ) if period_data['cells']['planned'] else None
-            result[item_id]['values'].append((period, actual, planned))
+            planned = plan.get_cell(
+                table_id=key_values_sheet.table,
+                sheet_id=key_values_sheet.sheet,
+                cell=period.planned_cell,
+            ) if period.planned_cell else None
+            result[key_value.key]['values'].append((period.name, actual, planned))
 
     return result
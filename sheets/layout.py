@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+
+from configuration import Configuration, derived_index
+
+
+@dataclass(frozen=True)
+class EmployeeColumns:
+    """The columns of the employee's KPI items in one section's sheet"""
+
+    user_id: int
+    full_name: str
+    # (kpi item key, item name, column), in the order of the configuration
+    items: tuple[tuple[str, str, str], ...]
+
+
+@dataclass(frozen=True)
+class SectionLayout:
+    """
+    Where the section's day statistics are in its sheet: a row per day,
+    the section's total columns and the KPI columns of every employee reporting to the section.
+    """
+
+    section_id: str
+    name: str
+    table_id: str
+    sheet_id: str
+    # (item name, column) of the section's total values
+    totals: tuple[tuple[str, str], ...]
+    employees: tuple[EmployeeColumns, ...]
+    # all the columns above without duplicates, read at once as the section's row
+    columns: tuple[str, ...]
+
+
+@derived_index
+def build_sections_layout(configuration: Configuration) -> dict[str, SectionLayout]:
+    """
+    Builds the layout of every section, the employees are grouped by sections in one pass over the configuration,
+    so the reports don't walk the employees' configuration per section.
+    """
+
+    items_per_section: dict[str, dict[int, list[tuple[str, str, str]]]] = {}
+    for user_id, employee in configuration.employees.items():
+        for item_key, kpi_item in employee.kpi.items():
+            user_items = items_per_section.setdefault(kpi_item.section_id, {}).setdefault(user_id, [])
+            user_items.append((item_key, kpi_item.name, kpi_item.column))
+
+    layout = {}
+    for section_id, section in configuration.sections.items():
+        totals = tuple((item.name, item.column) for item in section.day_items)
+        employees = tuple(
+            EmployeeColumns(
+                user_id=user_id,
+                full_name=configuration.employees[user_id].full_name,
+                items=tuple(user_items),
+            )
+            for user_id, user_items in items_per_section.get(section_id, {}).items()
+        )
+
+        columns = [column for _, column in totals]
+        columns.extend(column for employee in employees for _, _, column in employee.items)
+
+        layout[section_id] = SectionLayout(
+            section_id=section_id,
+            name=section.name,
+            table_id=section.google.table,
+            sheet_id=section.google.sheet,
+            totals=totals,
+            employees=employees,
+            columns=tuple(dict.fromkeys(columns)),
+        )
+
+    return layout
+
+
+@dataclass(frozen=True)
+class SectionExpectedKPI:
+    """The KPI items of one section which the employees fill in on a weekday"""
+
+    section_id: str
+    # (user id, column) of every expected item
+    items: tuple[tuple[int, str], ...]
+    # the columns of the items above without duplicates, read at once as the section's day row
+    columns: tuple[str, ...]
+
+
+@derived_index
+def build_expected_kpi_index(configuration: Configuration) -> dict[int, tuple[SectionExpectedKPI, ...]]:
+    """
+    Groups the KPI items by the weekdays of their schedules (0 is Monday) and by sections,
+    so checking a day's values doesn't walk the employees' configuration.
+    """
+
+    items_per_weekday: dict[int, dict[str, list[tuple[int, str]]]] = {}
+    for user_id, employee in configuration.employees.items():
+        for kpi_item in employee.kpi.values():
+            for weekday in kpi_item.schedule:
+                section_items = items_per_weekday.setdefault(weekday, {}).setdefault(kpi_item.section_id, [])
+                section_items.append((user_id, kpi_item.column))
+
+    return {
+        weekday: tuple(
+            SectionExpectedKPI(
+                section_id=section_id,
+                items=tuple(section_items),
+                columns=tuple(dict.fromkeys(column for _, column in section_items)),
+            )
+            for section_id, section_items in items_per_section.items()
+        )
+        for weekday, items_per_section in items_per_weekday.items()
+    }
@@ -0,0 +1,294 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from threading import Lock
+from typing import Callable, Iterable, Optional, Union
+
+from errors import SheetsValuesUnavailableError
+from sheets.breaker import google_breaker
+from sheets.cache import cells_cache
+from sheets.quota import BATCH, quota_scheduler
+from sheets.revisions import revisions
+from sheets.tools import get_tables_ranges_values, unpack_ranges_values
+from sheets.utils import build_covering_ranges, split_cell_label
+
+logger = getLogger(__name__)
+
+
+class FetchPlan:
+    """
+    Coalesces the reads of several report builders into as few requests as possible.
+
+    Every builder declares the cells it needs (`add_cell`, `add_row`, `add_rows`), the plan deduplicates them,
+    groups them by spreadsheet and reads them with one `values.batchGet` per spreadsheet (`execute`).
+    Then the builders take their values from the plan (`get_cell`, `get_row`, `get_columns`).
+    The number of requests depends only on the number of spreadsheets, not on the number of cells,
+    and the spreadsheets are read concurrently.
+
+    Fresh cached values are taken from the cells cache and are not requested at all,
+    the kind of the declared cells defines how long their values stay fresh there.
+    Expired values whose spreadsheet hasn't changed since they were read (see `RevisionsTracker`) are fresh again.
+    Recently expired values are served as well, while being refreshed in the background (stale-while-revalidate).
+    While Google is unavailable (the circuit is open) or if a request fails, the last known values are served.
+    """
+
+    _revalidation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='revalidation')
+    # (table_id, sheet_id, cell) being refreshed in the background right now
+    _revalidating: set[tuple[str, str, str]] = set()
+    _revalidating_lock = Lock()
+
+    def __init__(self):
+        # table_id -> sheet_id -> row -> columns
+        self._requested: dict[str, dict[str, dict[int, set[str]]]] = {}
+        # (table_id, sheet_id, row) -> kind of the data
+        self._kinds: dict[tuple[str, str, int], Optional[str]] = {}
+        # (table_id, sheet_id, row) of the rows declared by `add_rows` only, they are not cached
+        self._uncached_rows: set[tuple[str, str, int]] = set()
+        # (table_id, sheet_id, cell) -> value
+        self._values: dict[tuple[str, str, str], str] = {}
+        # (table_id, sheet_id, row, column, kind) of the served stale values to refresh in the background
+        self._to_revalidate: list[tuple[str, str, int, str, Optional[str]]] = []
+
+    @classmethod
+    def prepared(cls, declare: Callable[..., None], **kwargs) -> 'FetchPlan':
+        """Creates a plan for a single builder: declares the builder's cells and reads them right away"""
+
+        plan = cls()
+        declare(plan, **kwargs)
+        plan.execute()
+        return plan
+
+    def add_cell(self, table_id: str, sheet_id: Union[str, int], cell: str, kind: Optional[str] = None) -> None:
+        column, row = split_cell_label(cell)
+        self.add_row(table_id, sheet_id, [column], row, kind=kind)
+
+    def add_row(
+            self,
+            table_id: str,
+            sheet_id: Union[str, int],
+            columns: Iterable[str],
+            row: Union[str, int],
+            kind: Optional[str] = None,
+    ) -> None:
+        table_id, sheet_id, row = str(table_id), str(sheet_id), int(row)
+
+        columns_to_request, unchanged_cells = [], []
+        for column in columns:
+            column = column.upper()
+            cell = f'{column}{row}'
+
+            value = cells_cache.get(table_id, sheet_id, cell)
+            if value is None:
+                entry = cells_cache.get_entry(table_id, sheet_id, cell)
+                if entry is not None and google_breaker.is_open:
+                    value = cells_cache.get_stale(table_id, sheet_id, cell)
+                elif entry is not None and revisions.is_unchanged(table_id, entry.revision):
+                    value = entry.value
+                    unchanged_cells.append((table_id, sheet_id, cell))
+                elif entry is not None and cells_cache.is_revalidatable(entry):
+                    value = cells_cache.get_stale(table_id, sheet_id, cell)
+                    self._to_revalidate.append((table_id, sheet_id, row, column, kind))
+
+            if value is None:
+                columns_to_request.append(column)
+            else:
+                self._values[(table_id, sheet_id, cell)] = value
+
+        cells_cache.revalidate(unchanged_cells)
+        if columns_to_request:
+            self._request(table_id, sheet_id, columns_to_request, row, kind)
+
+    def add_rows(
+            self,
+            table_id: str,
+            sheet_id: Union[str, int],
+            columns: Iterable[str],
+            first_row: Union[str, int],
+            last_row: Union[str, int],
+    ) -> None:
+        """
+        Declares the columns of the rows from `first_row` to `last_row`, they are read as one block of ranges.
+        The block bypasses the cells cache: the rows of a long period would evict all the cached cells,
+        so its values are always read from Google and there are no last known ones to serve if the read fails.
+        """
+
+        table_id, sheet_id = str(table_id), str(sheet_id)
+        columns = [column.upper() for column in columns]
+        for row in range(int(first_row), int(last_row) + 1):
+            self._request(table_id, sheet_id, columns, row, kind=None, cached=False)
+
+    def _request(
+            self,
+            table_id: str,
+            sheet_id: str,
+            columns: Iterable[str],
+            row: int,
+            kind: Optional[str],
+            cached: bool = True,
+    ) -> None:
+        columns_per_row = self._requested.setdefault(table_id, {}).setdefault(sheet_id, {})
+        columns_per_row.setdefault(row, set()).update(columns)
+        # the row is cached if any of its declarations is
+        if cached:
+            self._kinds[(table_id, sheet_id, row)] = kind
+            self._uncached_rows.discard((table_id, sheet_id, row))
+        elif (table_id, sheet_id, row) not in self._kinds:
+            self._uncached_rows.add((table_id, sheet_id, row))
+
+    @classmethod
+    def _revalidate(cls, cells: list[tuple[str, str, int, str, Optional[str]]]) -> None:
+        plan = cls()
+        for table_id, sheet_id, row, column, kind in cells:
+            plan._request(table_id, sheet_id, [column], row, kind)
+
+        try:
+            # nobody waits for the background refresh, so it doesn't take the quota reserved for the users
+            with quota_scheduler.prioritized(BATCH):
+                plan.execute()
+        finally:
+            with cls._revalidating_lock:
+                cls._revalidating.difference_update(
+                    (table_id, sheet_id, f'{column}{row}') for table_id, sheet_id, row, column, _ in cells
+                )
+
+    def _schedule_revalidation(self) -> None:
+        """Refreshes the served stale values in the background, skipping the ones which are being refreshed already"""
+
+        with self._revalidating_lock:
+            cells = [
+                (table_id, sheet_id, row, column, kind)
+                for table_id, sheet_id, row, column, kind in self._to_revalidate
+                if (table_id, sheet_id, f'{column}{row}') not in self._revalidating
+            ]
+            self._revalidating.update(
+                (table_id, sheet_id, f'{column}{row}') for table_id, sheet_id, row, column, _ in cells
+            )
+        self._to_revalidate.clear()
+
+        if cells:
+            self._revalidation_executor.submit(self._revalidate, cells)
+
+    @staticmethod
+    def _build_blocks(columns_per_row: dict[int, set[str]]) -> list[tuple[int, int, set[str]]]:
+        """Merges the consecutive requested rows into (first_row, last_row, columns) blocks"""
+
+        blocks = []
+        for row in sorted(columns_per_row):
+            if blocks and blocks[-1][1] == row - 1:
+                first_row, _, columns = blocks[-1]
+                blocks[-1] = (first_row, row, columns | columns_per_row[row])
+            else:
+                blocks.append((row, row, set(columns_per_row[row])))
+
+        return blocks
+
+    def execute(self) -> None:
+        """Reads all the declared cells which have not been read yet"""
+
+        ranges_per_table, targets_per_table = {}, {}
+        for table_id, rows_per_sheet in self._requested.items():
+            ranges, targets = [], []
+            for sheet_id, columns_per_row in rows_per_sheet.items():
+                for first_row, last_row, columns in self._build_blocks(columns_per_row):
+                    block_ranges, positions = build_covering_ranges(columns, first_row, last_row)
+                    ranges.extend((sheet_id, block_range) for block_range in block_ranges)
+                    targets.append((sheet_id, first_row, last_row, len(block_ranges), positions))
+
+            ranges_per_table[table_id], targets_per_table[table_id] = ranges, targets
+
+        # the revisions are taken before the read, so the read values can't be older than them;
+        # they are needed for the cached values only, the blocks declared by `add_rows` are not cached
+        revisions_per_table = revisions.get_actual_many(
+            table_id
+            for table_id, rows_per_sheet in self._requested.items()
+            if any(
+                (table_id, sheet_id, row) not in self._uncached_rows
+                for sheet_id, columns_per_row in rows_per_sheet.items()
+                for row in columns_per_row
+            )
+        )
+
+        values_per_table = get_tables_ranges_values(ranges_per_table) if ranges_per_table else {}
+
+        for table_id, rows_per_sheet in self._requested.items():
+            ranges_values = values_per_table[table_id]
+            if ranges_values is None:
+                self._serve_last_known_values(table_id, rows_per_sheet)
+                continue
+
+            first_range_number = 0
+            for sheet_id, first_row, last_row, ranges_count, positions in targets_per_table[table_id]:
+                block_values = unpack_ranges_values(
+                    ranges_values[first_range_number:first_range_number + ranges_count],
+                    positions,
+                    rows_count=last_row - first_row + 1,
+                )
+                first_range_number += ranges_count
+
+                columns_per_row = rows_per_sheet[sheet_id]
+                for row, row_values in enumerate(block_values, start=first_row):
+                    read_cells = []
+                    for column in columns_per_row.get(row, ()):
+                        cell = f'{column}{row}'
+                        self._values[(table_id, sheet_id, cell)] = row_values[column]
+                        read_cells.append((table_id, sheet_id, cell, row_values[column]))
+                    if (table_id, sheet_id, row) in self._uncached_rows:
+                        continue
+                    cells_cache.set_many(
+                        read_cells,
+                        kind=self._kinds.get((table_id, sheet_id, row)),
+                        revision=revisions_per_table.get(table_id),
+                    )
+
+        self._requested.clear()
+        self._uncached_rows.clear()
+        self._schedule_revalidation()
+
+    def _serve_last_known_values(self, table_id: str, rows_per_sheet: dict[str, dict[int, set[str]]]) -> None:
+        for sheet_id, columns_per_row in rows_per_sheet.items():
+            for row, columns in columns_per_row.items():
+                for column in columns:
+                    value = cells_cache.get_stale(table_id, sheet_id, f'{column}{row}')
+                    if value is not None:
+                        self._values[(table_id, sheet_id, f'{column}{row}')] = value
+
+    def get_cell(self, table_id: str, sheet_id: Union[str, int], cell: str) -> Optional[str]:
+        """Returns the read value of the cell, or None if the cell has not been declared or could not be read"""
+
+        column, row = split_cell_label(cell)
+        return self._values.get((str(table_id), str(sheet_id), f'{column}{row}'))
+
+    def get_row(
+            self,
+            table_id: str,
+            sheet_id: Union[str, int],
+            columns: Iterable[str],
+            row: Union[str, int],
+    ) -> dict[str, Optional[str]]:
+        """Returns the read values of the row's columns, see `get_cell`"""
+
+        table_id, sheet_id, row = str(table_id), str(sheet_id), int(row)
+        return {column: self._values.get((table_id, sheet_id, f'{column.upper()}{row}')) for column in columns}
+
+    def get_columns(
+            self,
+            table_id: str,
+            sheet_id: Union[str, int],
+            columns: Iterable[str],
+            first_row: Union[str, int],
+            last_row: Union[str, int],
+    ) -> dict[str, list[str]]:
+        """
+        Returns the read values of the block declared by `add_rows` column by column, from the first row down.
+        Raises `SheetsValuesUnavailableError` if the block could not be read: it has no last known values,
+        the missing ones must not pass for the empty cells.
+        """
+
+        table_id, sheet_id = str(table_id), str(sheet_id)
+        rows = range(int(first_row), int(last_row) + 1)
+        values = {
+            column: [self._values.get((table_id, sheet_id, f'{column.upper()}{row}')) for row in rows]
+            for column in columns
+        }
+        if any(None in column_values for column_values in values.values()):
+            raise SheetsValuesUnavailableError(table_id, sheet_id)
+        return values
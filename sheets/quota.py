@@ -0,0 +1,210 @@
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from threading import Lock
+from typing import Any, Callable, Iterator, Optional
+
+from errors import SheetsBackendError
+from settings import settings
+
+logger = getLogger(__name__)
+
+READ = 'read'
+WRITE = 'write'
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# the default Google Sheets per-user quotas, all the bot's requests are made by one service account
+DEFAULT_QUOTAS_PER_MINUTE = {READ: 60, WRITE: 60}
+# the share of every bucket which only the interactive calls can take
+DEFAULT_INTERACTIVE_RESERVE = 0.25
+DEFAULT_MAX_RETRIES = 4
+# seconds, the backoff delay of the first retry, doubled on every next one
+DEFAULT_BACKOFF_BASE = 1
+DEFAULT_BACKOFF_MAX = 32
+
+RETRYABLE_HTTP_STATUSES = (429, 500, 502, 503, 504)
+
+
+def get_error_status(error: Exception) -> Optional[int]:
+    """Returns the HTTP status of the failed backend request, or None if the error is not an HTTP one"""
+
+    if isinstance(error, SheetsBackendError):
+        return error.status
+
+    # the client libraries are loaded by the Google backend already if their errors are raised,
+    # they are not imported with the module: importing the bot or the notifier doesn't pull them in
+    from googleapiclient.errors import HttpError
+    from requests import HTTPError
+
+    if isinstance(error, HttpError):
+        return error.resp.status
+    if isinstance(error, HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+
+class TokenBucket:
+    """
+    Lets through `capacity` calls per minute, the spent tokens are refilled evenly during the minute.
+
+    :capacity: - the number of the calls per minute
+    :reserve: - the share of the bucket which can't be taken by the calls not allowed to use the reserve
+    """
+
+    def __init__(self, capacity: int, reserve: float = 0):
+        self.capacity = capacity
+        self.reserve = reserve
+        self.refill_rate = capacity / 60
+
+        self._tokens = float(capacity)
+        self._refilled_at = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.refill_rate)
+        self._refilled_at = now
+
+    def try_take(self, use_reserve: bool) -> float:
+        """Takes a token if it's available, returns 0 then, otherwise returns the number of seconds to wait"""
+
+        floor = 0 if use_reserve else self.capacity * self.reserve
+        with self._lock:
+            self._refill()
+            if self._tokens - 1 >= floor:
+                self._tokens -= 1
+                return 0
+            return (floor + 1 - self._tokens) / self.refill_rate
+
+    def take(self, use_reserve: bool) -> float:
+        """Waits for a token and takes it, returns the number of seconds it waited"""
+
+        waited = 0
+        while True:
+            delay = self.try_take(use_reserve)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class QuotaScheduler:
+    """
+    Central scheduler of the Google Sheets calls, keeps the bot within the per-minute quotas.
+
+    Every call takes a token of its quota (reads or writes) first, so the calls are slowed down
+    when the quota is about to run out instead of being rejected by Google.
+    The calls rejected anyway (429) or failed on Google's side (5xx) are retried with exponential backoff and jitter.
+
+    The calls have priorities: the interactive ones (users' requests) may use the whole quota,
+    while the batch ones (the notifier's reports, background refreshes) leave `interactive_reserve` of it untouched.
+    The priority is taken from the context (see `prioritized`) or from `default_priority` of the process.
+
+    :quotas_per_minute: - quota name -> the number of the calls allowed per minute
+    :interactive_reserve: - the share of every quota reserved for the interactive calls
+    :max_retries: - the maximum number of retries of a failed call
+    :backoff_base: - the maximum delay of the first retry in seconds, doubled on every next one
+    :backoff_max: - the maximum delay of a retry in seconds
+    """
+
+    def __init__(
+            self,
+            quotas_per_minute: dict[str, int],
+            interactive_reserve: float,
+            max_retries: int,
+            backoff_base: float,
+            backoff_max: float,
+    ):
+        self.buckets = {
+            quota: TokenBucket(capacity, reserve=interactive_reserve) for quota, capacity in quotas_per_minute.items()
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_priority = INTERACTIVE
+
+        self._priority: ContextVar[Optional[str]] = ContextVar('priority', default=None)
+        # quota name -> monotonic times of the calls made within the last minute
+        self._calls: dict[str, deque[float]] = {quota: deque() for quota in quotas_per_minute}
+        self.throttled = 0
+        self.retried = 0
+        self._lock = Lock()
+
+    @property
+    def priority(self) -> str:
+        return self._priority.get() or self.default_priority
+
+    @contextmanager
+    def prioritized(self, priority: str) -> Iterator[None]:
+        """Makes the calls made within the context (including its asyncio tasks) have the specified priority"""
+
+        token = self._priority.set(priority)
+        try:
+            yield
+        finally:
+            self._priority.reset(token)
+
+    def _register_call(self, quota: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls[quota]
+            calls.append(now)
+            while calls and calls[0] < now - 60:
+                calls.popleft()
+
+    def get_backoff_delay(self, attempt: int) -> float:
+        """Full jitter: a random delay up to the exponentially growing limit"""
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, quota: str, function: Callable[..., Any], *args, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            waited = self.buckets[quota].take(use_reserve=self.priority == INTERACTIVE)
+            if waited:
+                self.throttled += 1
+                logger.warning(
+                    'Call is throttled to stay within the quota',
+                    extra={'quota': quota, 'priority': self.priority, 'waited': waited},
+                )
+            self._register_call(quota)
+
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                if get_error_status(error) not in RETRYABLE_HTTP_STATUSES or attempt >= self.max_retries:
+                    raise
+
+                delay = self.get_backoff_delay(attempt)
+                self.retried += 1
+                logger.warning(
+                    'Call failed, retrying',
+                    extra={'quota': quota, 'status': get_error_status(error), 'attempt': attempt, 'delay': delay},
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> dict[str, int]:
+        """Returns the number of the calls of every quota made within the last minute"""
+
+        now = time.monotonic()
+        with self._lock:
+            result = {
+                quota: sum(1 for called_at in calls if called_at >= now - 60) for quota, calls in self._calls.items()
+            }
+        return {**result, 'throttled': self.throttled, 'retried': self.retried}
+
+
+quota_settings = settings.config.get('quota') or {}
+quota_scheduler = QuotaScheduler(
+    quotas_per_minute={**DEFAULT_QUOTAS_PER_MINUTE, **(quota_settings.get('per_minute') or {})},
+    interactive_reserve=quota_settings.get('interactive_reserve', DEFAULT_INTERACTIVE_RESERVE),
+    max_retries=quota_settings.get('max_retries', DEFAULT_MAX_RETRIES),
+    backoff_base=quota_settings.get('backoff_base', DEFAULT_BACKOFF_BASE),
+    backoff_max=quota_settings.get('backoff_max', DEFAULT_BACKOFF_MAX),
+)
@@ -0,0 +1,147 @@
+from logging import getLogger
+from threading import Lock
+from typing import Iterable, Union
+
+from pygsheets import Spreadsheet, Worksheet
+from pygsheets.exceptions import SpreadsheetNotFound, WorksheetNotFound
+
+from manager import manager
+from settings import settings
+from sheets.breaker import google_breaker
+from sheets.quota import READ, get_error_status, quota_scheduler
+from sheets.storage import storage
+
+logger = getLogger(__name__)
+
+# HTTP statuses Google answers with when a range refers to a renamed or removed worksheet
+STALE_HANDLE_HTTP_STATUSES = (400, 404)
+
+
+def handle_is_stale(error: Exception) -> bool:
+    """Checks if the error was caused by an outdated worksheet handle rather than by the request itself"""
+
+    if isinstance(error, (SpreadsheetNotFound, WorksheetNotFound)):
+        return True
+    return get_error_status(error) in STALE_HANDLE_HTTP_STATUSES
+
+
+def get_configured_worksheets() -> dict[str, set[str]]:
+    """
+    Collects all the worksheets mentioned in the configuration file.
+
+    Return value sample:
+    {
+        'table_id_1': {'sheet_id_1', 'sheet_id_2'},
+        'table_id_2': {'sheet_id_3'},
+        ...
+    }
+    """
+
+    configuration = settings.configuration
+    google_data = [section.google for section in configuration.sections.values()]
+    google_data.append(configuration.disbonuses_sheet)
+    google_data.append(configuration.funds_sheet)
+    google_data.append(configuration.key_values_sheet)
+    google_data.append(configuration.leader_sheet)
+
+    result = {}
+    for data in google_data:
+        result.setdefault(data.table, set()).add(data.sheet)
+
+    return result
+
+
+class WorksheetRegistry:
+    """
+    Process-wide storage of the resolved worksheets handles, keyed by (table_id, sheet_id).
+
+    Opening a spreadsheet and looking its worksheet up costs two metadata round-trips to Google,
+    so every handle is resolved once and then shared by all the sheets handlers.
+    A handle is resolved again only when a call made with it fails as stale (see `handle_is_stale`).
+
+    The spreadsheets metadata is kept in the on-disk storage (if it's configured),
+    so the next processes resolve the handles without any requests at all.
+    """
+
+    def __init__(self):
+        self._worksheets: dict[tuple[str, str], Worksheet] = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def open_table(table_id: str, use_storage: bool = True) -> Spreadsheet:
+        """
+        Opens the spreadsheet using its stored metadata if it's allowed and available,
+        otherwise requests the metadata from Google and stores it.
+        The request goes through the circuit breaker like the other calls, see `call_backend`.
+        """
+
+        metadata = storage.get_table_metadata(table_id) if storage and use_storage else None
+        if metadata is None:
+            # the same request `Client.open_by_key` makes
+            metadata = quota_scheduler.call(
+                READ,
+                google_breaker.call,
+                manager.client.sheet.get,
+                table_id,
+                fields='properties,sheets/properties,spreadsheetId,namedRanges',
+                includeGridData=False,
+            )
+            if storage:
+                storage.set_table_metadata(table_id, metadata)
+
+        return manager.client.spreadsheet_cls(manager.client, metadata)
+
+    def _resolve(self, table_id: str, sheets_ids: Iterable[Union[str, int]], use_storage: bool) -> dict[str, Worksheet]:
+        table = self.open_table(table_id, use_storage=use_storage)
+        try:
+            result = {sheet_id: table.worksheet('id', sheet_id) for sheet_id in sheets_ids}
+        except WorksheetNotFound:
+            if not use_storage:
+                raise
+            # the stored metadata is outdated
+            return self._resolve(table_id, sheets_ids, use_storage=False)
+
+        with self._lock:
+            for sheet_id, worksheet in result.items():
+                self._worksheets[(str(table_id), str(sheet_id))] = worksheet
+
+        return result
+
+    def get(self, table_id: str, sheet_id: Union[str, int]) -> Worksheet:
+        return self.get_many(table_id, [sheet_id])[sheet_id]
+
+    def refresh(self, table_id: str, sheet_id: Union[str, int]) -> Worksheet:
+        return self.refresh_many(table_id, [sheet_id])[sheet_id]
+
+    def get_many(self, table_id: str, sheets_ids: Iterable[Union[str, int]]) -> dict[str, Worksheet]:
+        """Returns handles of several worksheets of one spreadsheet, opening the spreadsheet at most once"""
+
+        result, missing_sheets_ids = {}, []
+        for sheet_id in sheets_ids:
+            worksheet = self._worksheets.get((str(table_id), str(sheet_id)))
+            if worksheet is None:
+                missing_sheets_ids.append(sheet_id)
+            else:
+                result[sheet_id] = worksheet
+
+        if missing_sheets_ids:
+            result.update(self._resolve(table_id, missing_sheets_ids, use_storage=True))
+
+        return result
+
+    def refresh_many(self, table_id: str, sheets_ids: Iterable[Union[str, int]]) -> dict[str, Worksheet]:
+        """Resolves the handles again, requesting the actual spreadsheet metadata from Google"""
+
+        return self._resolve(table_id, sheets_ids, use_storage=False)
+
+    def warm_up(self) -> None:
+        """Resolves all the configured worksheets, opening every spreadsheet only once"""
+
+        for table_id, sheets_ids in get_configured_worksheets().items():
+            try:
+                self._resolve(table_id, sheets_ids, use_storage=True)
+            except Exception:
+                logger.exception('Could not resolve worksheets of the table', extra={'table_id': table_id})
+
+
+worksheets = WorksheetRegistry()
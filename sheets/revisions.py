@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from threading import Lock
+from typing import Iterable, Optional
+
+from settings import settings
+from sheets.backends import backend
+from sheets.breaker import google_breaker
+
+logger = getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 30
+
+
+class RevisionsTracker:
+    """
+    Tracks the revisions of the spreadsheets (see `SheetsBackend.get_revision`).
+
+    Cached values are stored with the revision their spreadsheet had right before they were read (see `get_actual`),
+    so an expired value is still valid if the revision hasn't changed since then, and the full read is skipped.
+    The revision of a spreadsheet is requested at most once per `check_interval` seconds,
+    and right after every write to it (see `invalidate`).
+
+    :check_interval: - the number of seconds a requested revision is considered actual, 0 disables the tracking
+    """
+
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='revisions')
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+
+        # table_id -> (revision, monotonic time it was requested at)
+        self._revisions: dict[str, tuple[str, float]] = {}
+        # table_id -> number of the writes, the revision requested while the spreadsheet was written is not kept
+        self._writes: dict[str, int] = {}
+        self._lock = Lock()
+
+    def get_actual(self, table_id: str) -> Optional[str]:
+        """Returns the revision requested within the last `check_interval` seconds, requesting it if needed"""
+
+        if not self.check_interval:
+            return None
+
+        table_id = str(table_id)
+        revision_data = self._revisions.get(table_id)
+        if revision_data and time.monotonic() - revision_data[1] <= self.check_interval:
+            return revision_data[0]
+
+        writes = self._writes.get(table_id, 0)
+        try:
+            revision = google_breaker.call(backend.get_revision, table_id)
+        except Exception:
+            logger.exception('Could not get the spreadsheet revision', extra={'table_id': table_id})
+            return None
+
+        with self._lock:
+            if self._writes.get(table_id, 0) != writes:
+                # the revision may predate the write, it's requested again next time
+                return None
+            self._revisions[table_id] = (revision, time.monotonic())
+
+        return revision
+
+    def get_actual_many(self, tables_ids: Iterable[str]) -> dict[str, Optional[str]]:
+        """Returns the actual revisions of the spreadsheets (see `get_actual`), they are requested concurrently"""
+
+        tables_ids = list(tables_ids)
+        if len(tables_ids) < 2:
+            return {table_id: self.get_actual(table_id) for table_id in tables_ids}
+        return dict(zip(tables_ids, self._executor.map(self.get_actual, tables_ids)))
+
+    def invalidate(self, table_id: str) -> None:
+        """
+        Forgets the revision of the spreadsheet after a write to it. The revision has changed,
+        so the expired values of the rows which weren't written are revalidated against a newly requested one:
+        the changes made by others meanwhile are not hidden for the rest of `check_interval`.
+        """
+
+        table_id = str(table_id)
+        with self._lock:
+            self._revisions.pop(table_id, None)
+            self._writes[table_id] = self._writes.get(table_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._revisions.clear()
+
+    def is_unchanged(self, table_id: str, revision: Optional[str]) -> bool:
+        """Checks if the spreadsheet hasn't changed since it had the specified revision"""
+
+        return revision is not None and self.get_actual(table_id) == revision
+
+
+revisions = RevisionsTracker(
+    check_interval=(settings.config.get('cache') or {}).get('revision_check_interval', DEFAULT_CHECK_INTERVAL),
+)
@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import time
+from logging import getLogger
+from threading import Lock
+from typing import Iterable, Optional
+
+from settings import settings
+
+logger = getLogger(__name__)
+
+
+class SQLiteStorage:
+    """
+    On-disk storage shared by all the bot's processes (the bot itself and the cron-spawned notifier runs),
+    so that a new process does not start cold.
+
+    Keeps the spreadsheets metadata, which is needed to resolve worksheets handles without requests to Google,
+    and the recently read cells values with the time they were read at.
+    Any storage error is logged and treated as a missing entry: the storage is an optimisation only.
+
+    :file_path: - a path to the SQLite database file, it is created if it doesn't exist
+    """
+
+    # increase on every schema change: the tables of other versions are dropped and created again
+    SCHEMA_VERSION = 2
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(file_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._setup_schema()
+
+    def _setup_schema(self) -> None:
+        with self._lock:
+            version, = self._connection.execute('PRAGMA user_version').fetchone()
+            if version == self.SCHEMA_VERSION:
+                return
+
+            self._connection.executescript(f'''
+                BEGIN;
+                DROP TABLE IF EXISTS tables_metadata;
+                DROP TABLE IF EXISTS cells;
+                CREATE TABLE tables_metadata (
+                    table_id TEXT PRIMARY KEY,
+                    metadata TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                );
+                CREATE TABLE cells (
+                    table_id TEXT NOT NULL,
+                    sheet_id TEXT NOT NULL,
+                    cell TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    value TEXT NOT NULL,
+                    kind TEXT,
+                    revision TEXT,
+                    stored_at REAL NOT NULL,
+                    PRIMARY KEY (table_id, sheet_id, cell)
+                );
+                CREATE INDEX cells_rows ON cells (table_id, sheet_id, row);
+                PRAGMA user_version = {self.SCHEMA_VERSION};
+                COMMIT;
+            ''')
+
+    def _execute(self, query: str, parameters: Iterable = ()) -> list[tuple]:
+        try:
+            with self._lock:
+                return self._connection.execute(query, parameters).fetchall()
+        except sqlite3.Error:
+            logger.exception('Storage query failed', extra={'file_path': self.file_path, 'query': query})
+            return []
+
+    def _execute_many(self, query: str, parameters: Iterable[Iterable]) -> None:
+        try:
+            with self._lock:
+                self._connection.execute('BEGIN')
+                try:
+                    self._connection.executemany(query, parameters)
+                except sqlite3.Error:
+                    self._connection.execute('ROLLBACK')
+                    raise
+                self._connection.execute('COMMIT')
+        except sqlite3.Error:
+            logger.exception('Storage query failed', extra={'file_path': self.file_path, 'query': query})
+
+    def get_table_metadata(self, table_id: str) -> Optional[dict]:
+        """Returns the stored spreadsheet metadata as it was returned by the Google Sheets API"""
+
+        rows = self._execute('SELECT metadata FROM tables_metadata WHERE table_id = ?', (str(table_id),))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_table_metadata(self, table_id: str, metadata: dict) -> None:
+        self._execute(
+            'INSERT OR REPLACE INTO tables_metadata (table_id, metadata, stored_at) VALUES (?, ?, ?)',
+            (str(table_id), json.dumps(metadata), time.time()),
+        )
+
+    def get_cells(self, max_age: float) -> list[tuple[str, str, str, str, Optional[str], Optional[str], float]]:
+        """
+        Returns (table_id, sheet_id, cell, value, kind, revision, stored_at) of the cells
+        read within the last `max_age` seconds.
+        """
+
+        return self._execute(
+            'SELECT table_id, sheet_id, cell, value, kind, revision, stored_at FROM cells WHERE stored_at >= ?',
+            (time.time() - max_age,),
+        )
+
+    def set_cells(self, cells: Iterable[tuple[str, str, str, int, str, Optional[str], Optional[str]]]) -> None:
+        """Stores the (table_id, sheet_id, cell, row, value, kind, revision) values read just now"""
+
+        stored_at = time.time()
+        self._execute_many(
+            'INSERT OR REPLACE INTO cells (table_id, sheet_id, cell, row, value, kind, revision, stored_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((*cell, stored_at) for cell in cells),
+        )
+
+    def delete_rows(self, table_id: str, sheet_id: str, rows: Iterable[int]) -> None:
+        self._execute_many(
+            'DELETE FROM cells WHERE table_id = ? AND sheet_id = ? AND row = ?',
+            ((str(table_id), str(sheet_id), row) for row in rows),
+        )
+
+    def delete_outdated_cells(self, max_age: float) -> None:
+        self._execute('DELETE FROM cells WHERE stored_at < ?', (time.time() - max_age,))
+
+
+def get_storage() -> Optional[SQLiteStorage]:
+    """Opens the storage if its file is configured (see `Settings.cache_file`)"""
+
+    if not settings.cache_file:
+        return None
+
+    try:
+        return SQLiteStorage(settings.cache_file)
+    except sqlite3.Error:
+        logger.exception('Could not open the storage, working without it', extra={'file_path': settings.cache_file})
+        return None
+
+
+storage = get_storage()
@@ -1,15 +1,23 @@
-import datetime
+import asyncio
 from logging import getLogger
-from typing import Union, Iterable, Optional
+from typing import Callable, TypeVar, Union, Iterable, Optional
 
-from manager import manager
 from settings import settings
+from sheets.aio import sheets_client
+from sheets.backends import backend
+from sheets.breaker import google_breaker
+from sheets.cache import cells_cache
+from sheets.quota import READ, WRITE, quota_scheduler
+from sheets.revisions import revisions
+from sheets.utils import build_covering_ranges
 
-START_DATE = datetime.date.fromisoformat(settings.config['start_date'])
+START_DATE = settings.configuration.start_date
 
 
 logger = getLogger(__name__)
 
+T = TypeVar('T')
+
 # def google_query_booster(page, values, row):
 #     values = list(zip(values.keys(), values.values()))
 #     values.sort(key=lambda x: (len(x[1]), x[1]))
@@ -30,6 +38,16 @@ logger = getLogger(__name__)
 #     cell = kpi_value['column'] + str(diff.days + section_google_data['start_row'])
 
 
+def call_backend(quota: str, method: Callable[..., T], *args) -> T:
+    """
+    Calls the method of the sheets backend (see `SheetsBackend`).
+    The call goes through the circuit breaker: it fails fast with `CircuitOpenError` while the backend is down.
+    It's scheduled within the specified quota (reads or writes) by the quota scheduler, see `QuotaScheduler`.
+    """
+
+    return quota_scheduler.call(quota, google_breaker.call, method, *args)
+
+
 def update_cell_value(
         table_id: str,
         sheet_id: str,
@@ -40,6 +58,7 @@ def update_cell_value(
 ) -> None:
     """
     Updates the cell of specified Google sheets.
+    The cached values of the cell's row and the revision of the spreadsheet are invalidated.
     """
 
     if not (cell or (row and column)):
@@ -48,16 +67,51 @@ def update_cell_value(
     if not cell:
         cell = column + row
 
-    table = manager.client.open_by_key(table_id)
-    sheet = table.worksheet('id', sheet_id)
-
     try:
-        sheet.update_value(cell, value)
+        call_backend(WRITE, backend.update_cell, table_id, sheet_id, cell, value)
     except Exception:
         logger.exception(
             'Could not write data to the cell',
-            extra={'table': table, 'sheet_id': sheet_id, 'cell': cell, 'value': value},
+            extra={'table_id': table_id, 'sheet_id': sheet_id, 'cell': cell, 'value': value},
         )
+    finally:
+        cells_cache.invalidate_cells([(table_id, sheet_id, cell)])
+        revisions.invalidate(table_id)
+
+
+def update_cells_values(updates: Iterable[tuple[str, str, str, str]]) -> None:
+    """
+    Updates many cells at once, sending a single `values.batchUpdate` request per spreadsheet.
+    The cached values of the written rows and the revisions of the written spreadsheets are invalidated.
+
+    :updates: (table_id, sheet_id, cell, value) tuples
+    """
+
+    cells_per_table: dict[str, dict[str, list[tuple[str, str]]]] = {}
+    for table_id, sheet_id, cell, value in updates:
+        cells_per_table.setdefault(table_id, {}).setdefault(sheet_id, []).append((cell, value))
+
+    for table_id, cells_per_sheet in cells_per_table.items():
+        table_updates = [
+            (sheet_id, cell, value)
+            for sheet_id, cells in cells_per_sheet.items()
+            for cell, value in cells
+        ]
+
+        try:
+            call_backend(WRITE, backend.batch_update, table_id, table_updates)
+        except Exception:
+            logger.exception(
+                'Could not write data to the cells',
+                extra={'table_id': table_id, 'cells': cells_per_table[table_id]},
+            )
+        finally:
+            cells_cache.invalidate_cells(
+                (table_id, sheet_id, cell)
+                for sheet_id, cells in cells_per_sheet.items()
+                for cell, _ in cells
+            )
+            revisions.invalidate(table_id)
 
 
 def get_cell_value(
@@ -66,9 +120,12 @@ def get_cell_value(
         column: Optional[str] = None,
         row: Optional[str] = None,
         cell: Optional[str] = None,
+        kind: Optional[str] = None,
 ) -> Union[str, None]:
     """
-    Get value from the specific cell
+    Get value from the specific cell.
+    The value is served from the cache while it's fresh, `kind` defines its freshness period.
+    If the cell can't be read, its last known value is served.
     """
 
     if not (cell or (row and column)):
@@ -77,45 +134,199 @@ def get_cell_value(
     if not cell:
         cell = column + row
 
-    table = manager.client.open_by_key(table_id)
-    sheet = table.worksheet('id', sheet_id)
+    result = cells_cache.get(table_id, sheet_id, cell)
+    if result is not None:
+        return result
 
-    result = None
     try:
-        result = sheet.get_value(cell)
+        result = call_backend(READ, backend.get_cell, table_id, sheet_id, cell)
+        cells_cache.set(table_id, sheet_id, cell, result, kind=kind)
     except Exception:
         logger.exception(
             'Could not get cell data from the sheet',
-            extra={'table': table, 'sheet_id': sheet_id, 'cell': cell},
+            extra={'table_id': table_id, 'sheet_id': sheet_id, 'cell': cell},
         )
+        result = cells_cache.get_stale(table_id, sheet_id, cell)
     finally:
         return result
 
 
-def get_cells_values(
+def unpack_ranges_values(
+        ranges_values: list[list[list[str]]],
+        positions: dict[str, tuple[int, int]],
+        rows_count: int,
+) -> list[dict[str, str]]:
+    """
+    Converts the values of the covering ranges to column -> value mappings, one per row.
+    Google omits trailing empty rows and cells, so the missing values are treated as empty strings.
+    """
+
+    result = []
+    for row_offset in range(rows_count):
+        row_values = {}
+        for column, (range_number, column_offset) in positions.items():
+            range_rows = ranges_values[range_number] if range_number < len(ranges_values) else []
+            range_row = range_rows[row_offset] if row_offset < len(range_rows) else []
+            row_values[column] = range_row[column_offset] if column_offset < len(range_row) else ''
+        result.append(row_values)
+
+    return result
+
+
+def get_range_values(
         table_id: str,
         sheet_id: str,
         columns: Iterable[str],
-        row: str,
-) -> Union[list[tuple[str, str]], None]:
-    """TODO"""
+        first_row: int,
+        last_row: Optional[int] = None,
+        kind: Optional[str] = None,
+) -> Union[dict[int, dict[str, str]], None]:
+    """
+    Reads the specified columns of the rows from `first_row` to `last_row` with a single request.
+    The columns are covered by the smallest set of contiguous ranges (see `build_covering_ranges`).
+    The request is skipped if all the values are cached and fresh, `kind` defines their freshness period.
+    If the range can't be read, the last known values are served, provided all of them are cached.
+
+    Return value sample:
+    {
+        5: {'B': '1', 'C': '', 'E': '3'},
+        6: {'B': '2', 'C': '4', 'E': ''},
+        ...
+    }
+    """
+
+    last_row = last_row or first_row
+    columns = list(columns)
+    ranges, positions = build_covering_ranges(columns, first_row, last_row)
+    if not ranges:
+        return {}
 
-    table = manager.client.open_by_key(table_id)
-    sheet = table.worksheet('id', sheet_id)
-    cells = [(column + row, column + row) for column in columns]
+    cached_result = {}
+    for row in range(first_row, last_row + 1):
+        cached_result[row] = {column: cells_cache.get(table_id, sheet_id, f'{column}{row}') for column in columns}
+        if None in cached_result[row].values():
+            break
+    else:
+        return cached_result
 
     result = None
     try:
-        result = tuple(map(lambda arr: arr[0][0], sheet.get_values_batch(cells)))
+        ranges_values = call_backend(READ, backend.get_ranges, table_id, sheet_id, ranges)
+        rows_values = unpack_ranges_values(ranges_values, positions, last_row - first_row + 1)
+        result = dict(zip(range(first_row, last_row + 1), rows_values))
+
+        cells_cache.set_many(
+            (
+                (table_id, sheet_id, f'{column}{row}', value)
+                for row, row_values in result.items()
+                for column, value in row_values.items()
+            ),
+            kind=kind,
+        )
     except Exception:
         logger.exception(
-            'Could not get cells data from the sheet',
-            extra={'table': table, 'sheet_id': sheet_id, 'cells': cells},
+            'Could not get range data from the sheet',
+            extra={'table_id': table_id, 'sheet_id': sheet_id, 'ranges': ranges},
         )
+        result = {
+            row: {column: cells_cache.get_stale(table_id, sheet_id, f'{column}{row}') for column in columns}
+            for row in range(first_row, last_row + 1)
+        }
+        if any(None in row_values.values() for row_values in result.values()):
+            result = None
+    finally:
+        return result
+
+
+def get_row_values(
+        table_id: str,
+        sheet_id: str,
+        columns: Iterable[str],
+        row: Union[int, str],
+        kind: Optional[str] = None,
+) -> Union[dict[str, str], None]:
+    """
+    Reads the specified columns of one row with a single request, see `get_range_values`.
+
+    Return value sample:
+    {'B': '1', 'C': '', 'E': '3'}
+    """
+
+    rows_values = get_range_values(table_id, sheet_id, columns, int(row), kind=kind)
+    if rows_values is None:
+        return None
+    return rows_values.get(int(row), {})
+
+
+async def get_ranges_values_batch_async(
+        table_id: str,
+        ranges: list[tuple[str, str]],
+) -> Union[list[list[list[str]]], None]:
+    """
+    Reads ranges of any worksheets of one spreadsheet with a single batch request (`values.batchGet` of Google),
+    without blocking the event loop (see `AsyncSheetsClient`).
+
+    :ranges: (sheet_id, A1 range) pairs
+    """
+
+    result = None
+    try:
+        result = await sheets_client.run(call_backend, READ, backend.batch_get, table_id, ranges)
+    except Exception:
+        logger.exception('Could not get ranges data from the table', extra={'table_id': table_id, 'ranges': ranges})
     finally:
         return result
 
 
+def get_ranges_values_batch(
+        table_id: str,
+        ranges: list[tuple[str, str]],
+) -> Union[list[list[list[str]]], None]:
+    """Synchronous version of `get_ranges_values_batch_async`"""
+
+    return asyncio.run(get_ranges_values_batch_async(table_id, ranges))
+
+
+async def get_tables_ranges_values_async(
+        ranges_per_table: dict[str, list[tuple[str, str]]],
+) -> dict[str, Union[list[list[list[str]]], None]]:
+    """
+    Reads ranges of several spreadsheets concurrently, one `values.batchGet` request per spreadsheet,
+    so the whole read takes as long as the slowest request. A spreadsheet which can't be read gets None.
+
+    :ranges_per_table: table_id -> (sheet_id, A1 range) pairs
+    """
+
+    results = await asyncio.gather(
+        *(get_ranges_values_batch_async(table_id, ranges) for table_id, ranges in ranges_per_table.items())
+    )
+    return dict(zip(ranges_per_table, results))
+
+
+def get_tables_ranges_values(
+        ranges_per_table: dict[str, list[tuple[str, str]]],
+) -> dict[str, Union[list[list[list[str]]], None]]:
+    """Synchronous version of `get_tables_ranges_values_async`"""
+
+    return asyncio.run(get_tables_ranges_values_async(ranges_per_table))
+
+
+def get_cells_values(
+        table_id: str,
+        sheet_id: str,
+        columns: Iterable[str],
+        row: str,
+        kind: Optional[str] = None,
+) -> Union[tuple[str, ...], None]:
+    """Reads the specified columns of one row and returns their values in the order of the columns"""
+
+    columns = list(columns)
+    row_values = get_row_values(table_id, sheet_id, columns, row, kind=kind)
+    if row_values is None:
+        return None
+    return tuple(row_values[column] for column in columns)
+
+
 # def save_current_plan_to_google_sheet(sheet_key, page_id, user_id,
 #                                       department, position, period):
 #     """
@@ -1,21 +1,174 @@
-from datetime import date
+import re
+from calendar import monthrange
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Iterable, Optional
 
 from settings import settings
 
+# the maximum number of unused columns between two requested ones that still lets them share a range:
+# a few extra cells in the payload are cheaper than an additional range in the request
+RANGE_MAX_COLUMNS_GAP = 3
+
+CELL_LABEL_PATTERN = re.compile(r'^([A-Za-z]+)(\d+)$')
+# the number of the parsed cell labels kept: the labels of the cached cells are parsed over and over again
+CELL_LABELS_CACHE_SIZE = 16384
+
+
+def get_row_for_day(start_row: int, day: date) -> int:
+    """Returns the row of the day in a sheet with a row per day, which starts at `start_row` on the start date"""
+
+    days_diff = day - settings.configuration.start_date
+    return days_diff.days + start_row
+
+
+def get_rows_for_section(section: str, first_day: date, last_day: date) -> tuple[int, int]:
+    """Returns the first and the last rows of the section's days from `first_day` to `last_day` inclusive"""
+
+    start_row = settings.configuration.sections[section].google.start_row
+    return get_row_for_day(start_row, first_day), get_row_for_day(start_row, last_day)
+
 
 def get_actual_row_for_section(section: str) -> int:
     """TODO"""
 
-    days_diff = date.today() - date.fromisoformat(settings.config['start_date'])
-    row_number = days_diff.days + settings.config['sections'][section]['google']['start_row']
-
-    return row_number
+    return get_row_for_day(settings.configuration.sections[section].google.start_row, date.today())
 
 
 def get_actual_row_for_disbonuses() -> int:
     """TODO"""
 
-    days_diff = date.today() - date.fromisoformat(settings.config['start_date'])
-    row_number = days_diff.days + settings.config['google']['dis-bonuses']['start_row']
+    return get_row_for_day(settings.configuration.disbonuses_sheet.start_row, date.today())
+
+
+def get_period_days(period: str, day: Optional[date] = None) -> tuple[date, date]:
+    """
+    Returns the first and the last days of the period of the day (today by default):
+    'day', 'week' (Monday to Sunday), 'month' or 'quarter'.
+    The period is cut at the start date, there are no rows before it.
+    """
+
+    day = day or date.today()
+    if period == 'day':
+        first_day, last_day = day, day
+    elif period == 'week':
+        first_day = day - timedelta(days=day.weekday())
+        last_day = first_day + timedelta(days=6)
+    elif period == 'month':
+        first_day = day.replace(day=1)
+        last_day = day.replace(day=monthrange(day.year, day.month)[1])
+    elif period == 'quarter':
+        first_month = (day.month - 1) // 3 * 3 + 1
+        first_day = date(day.year, first_month, 1)
+        last_day = date(day.year, first_month + 2, monthrange(day.year, first_month + 2)[1])
+    else:
+        raise ValueError(f'"{period}" is not a known period')
+
+    return max(first_day, settings.configuration.start_date), last_day
+
+
+def get_elapsed_days(first_day: date, last_day: date) -> Optional[tuple[date, date]]:
+    """
+    Cuts the period at today: the rows of the days to come are empty, they are not read.
+    Returns None if none of the period's days has come yet.
+    """
+
+    last_elapsed_day = min(last_day, date.today())
+    if first_day > last_elapsed_day:
+        return None
+    return first_day, last_elapsed_day
+
+
+def build_sheet_range_label(sheet_title: str, cells_range: str) -> str:
+    """Builds an A1 notation label of the range which is bound to the specified sheet: 'Sheet title'!A1:B2"""
+
+    escaped_title = sheet_title.replace("'", "''")
+    return f"'{escaped_title}'!{cells_range}"
+
+
+@lru_cache(maxsize=None)
+def get_column_index(column: str) -> int:
+    """Converts the column letters to the column's 1-based index: 'A' -> 1, 'Z' -> 26, 'AA' -> 27"""
+
+    index = 0
+    for letter in column.upper():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index
+
+
+@lru_cache(maxsize=None)
+def get_column_letters(index: int) -> str:
+    """Converts the 1-based column index to the column's letters: 1 -> 'A', 26 -> 'Z', 27 -> 'AA'"""
+
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def build_covering_spans(columns: Iterable[str], max_gap: int = RANGE_MAX_COLUMNS_GAP) -> list[tuple[int, int]]:
+    """
+    Builds the smallest set of contiguous columns spans which covers all the specified columns.
+    Neighbouring columns are merged into one span while the gap between them does not exceed `max_gap`.
+
+    Return value sample (columns 'B', 'C', 'E', 'Q'):
+    [(2, 5), (17, 17)]
+    """
+
+    spans = []
+    for index in sorted({get_column_index(column) for column in columns}):
+        if spans and index - spans[-1][1] - 1 <= max_gap:
+            spans[-1][1] = index
+        else:
+            spans.append([index, index])
+
+    return [(first, last) for first, last in spans]
+
+
+def build_covering_ranges(
+        columns: Iterable[str],
+        first_row: int,
+        last_row: int,
+        max_gap: int = RANGE_MAX_COLUMNS_GAP,
+) -> tuple[list[str], dict[str, tuple[int, int]]]:
+    """
+    Builds the A1 ranges which cover the specified columns of the rows from `first_row` to `last_row`,
+    together with the precomputed position of every column inside the ranges.
+
+    Return value sample (columns 'B', 'C', 'E', 'Q', rows 5-5):
+    (
+        ['B5:E5', 'Q5:Q5'],
+        {'B': (0, 0), 'C': (0, 1), 'E': (0, 3), 'Q': (1, 0)},
+    )
+    """
+
+    columns = list(columns)
+    spans = build_covering_spans(columns, max_gap=max_gap)
+
+    ranges = [
+        f'{get_column_letters(first)}{first_row}:{get_column_letters(last)}{last_row}'
+        for first, last in spans
+    ]
+
+    positions = {}
+    for column in columns:
+        column_index = get_column_index(column)
+        for range_number, (first, last) in enumerate(spans):
+            if first <= column_index <= last:
+                positions[column] = (range_number, column_index - first)
+                break
+
+    return ranges, positions
+
+
+@lru_cache(maxsize=CELL_LABELS_CACHE_SIZE)
+def split_cell_label(cell: str) -> tuple[str, int]:
+    """Splits the A1 cell label to its column letters and row number: 'B12' -> ('B', 12)"""
+
+    match = CELL_LABEL_PATTERN.match(cell.strip())
+    if not match:
+        raise ValueError(f'"{cell}" is not a valid A1 cell label')
 
-    return row_number
+    column, row = match.groups()
+    return column.upper(), int(row)
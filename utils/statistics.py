@@ -1,9 +1,10 @@
-from typing import Union
+from typing import Mapping, Union
 
+from configuration import Disbonus
 from settings import settings
 
 
-def get_user_disbonus_data(user_id: Union[str, int]) -> dict[str, dict[str, Union[str, int]]]:
+def get_user_disbonus_data(user_id: Union[str, int]) -> Mapping[str, Disbonus]:
     """TODO"""
 
-    return settings.config['employees'][str(user_id)]['bonuses']['dis-bonuses']
+    return settings.configuration.employees[int(user_id)].disbonuses
@@ -0,0 +1,214 @@
+"""
+    Synthetic configuration and spreadsheets data of any size, used to benchmark and load-test the bot
+    against the in-memory sheets backend (see `MemoryBackend`).
+    The module doesn't import the settings: the configuration is generated before the settings are loaded.
+"""
+import json
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from typing import Any
+
+SECTIONS_TABLE_PREFIX = 'sections-'
+OTHER_TABLE = 'other'
+DISBONUSES_TABLE = 'dis-bonuses'
+
+# the statistics start that many days ago, enough for a quarter report; their rows are the first ones in the sheets
+DAYS_OF_STATISTICS = 120
+SECTIONS_START_ROW = 5
+DISBONUSES_START_ROW = 3
+# the points per day are to the right of the today/yesterday cells, a column per candidate
+LEADER_START_ROW = 5
+LEADER_FIRST_COLUMN = 5
+
+SECTION_ITEMS = ('звонки', 'встречи', 'договоры')
+DISBONUSES = ('опоздание', 'отчет не сдан')
+
+# the quotas are not the subject of the benchmarks: throttled calls would only distort the measured time
+UNLIMITED_QUOTA_PER_MINUTE = 1_000_000
+
+
+def get_column_letters(index: int) -> str:
+    """Converts the 1-based column index to its letters: 1 -> 'A', 28 -> 'AB'"""
+
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def build_config(employees_count: int, sections_count: int) -> dict[str, Any]:
+    """
+    Builds a configuration of the same structure as the production one.
+    Every employee reports to one section, the first one is an admin, all of them are subscribed to the statistics.
+    """
+
+    start_date = date.today() - timedelta(days=DAYS_OF_STATISTICS)
+    config = {
+        'start_date': start_date.isoformat(),
+        'sections': {},
+        'employees': {},
+        'subscriptions': {'statistics': []},
+        'google': {'dis-bonuses': {'table': DISBONUSES_TABLE, 'sheet': 0, 'start_row': DISBONUSES_START_ROW}},
+        'other': {
+            'funds': {
+                'google': {'table': OTHER_TABLE, 'sheet': 0},
+                'items': {
+                    '0': {'name': 'фонд оплаты', 'statistics': {
+                        'admin_only': False, 'cells': {'actual': 'B2', 'planned': 'C2'},
+                    }},
+                    '1': {'name': 'фонд развития', 'statistics': {
+                        'admin_only': True, 'cells': {'actual': 'B3', 'planned': 'C3'},
+                    }},
+                },
+            },
+            'key-values': {
+                'google': {'table': OTHER_TABLE, 'sheet': 1},
+                'items': {
+                    '0': {'name': 'выручка', 'statistics': {'period': {
+                        '0': {'name': 'день', 'cells': {'actual': 'B2', 'planned': None}},
+                        '1': {'name': 'месяц', 'cells': {'actual': 'B3', 'planned': 'C3'}},
+                    }}},
+                },
+            },
+            'leader': {
+                'google': {'table': OTHER_TABLE, 'sheet': 2, 'start_row': LEADER_START_ROW},
+                'candidates': {},
+            },
+        },
+    }
+
+    for section_number in range(sections_count):
+        config['sections'][f'section-{section_number}'] = {
+            'name': f'отдел {section_number}',
+            'google': {
+                'table': f'{SECTIONS_TABLE_PREFIX}{section_number}',
+                'sheet': 0,
+                'start_row': SECTIONS_START_ROW,
+            },
+            'statistics': {'period': {'day': {
+                str(item_number): {'name': item_name, 'column': get_column_letters(item_number + 2)}
+                for item_number, item_name in enumerate(SECTION_ITEMS)
+            }}},
+        }
+
+    for employee_number in range(employees_count):
+        user_id = str(100000 + employee_number)
+        section_id = f'section-{employee_number % sections_count}'
+        # the section's total columns come first, then the columns of its employees
+        first_column = len(SECTION_ITEMS) + 2 + len(SECTION_ITEMS) * (employee_number // sections_count)
+        first_disbonus_column = 2 + (len(DISBONUSES) + 1) * employee_number
+
+        config['employees'][user_id] = {
+            'firstname': f'Имя{employee_number}',
+            'lastname': f'Фамилия{employee_number}',
+            'admin': employee_number == 0,
+            'statistics': {'kpi': {
+                str(item_number): {
+                    'name': item_name,
+                    'section': section_id,
+                    'column': get_column_letters(first_column + item_number),
+                    'question': f'Сколько сегодня: {item_name}?',
+                    'schedule': list(range(7)),
+                }
+                for item_number, item_name in enumerate(SECTION_ITEMS)
+            }},
+            'bonuses': {
+                'bonus-value-column': get_column_letters(first_disbonus_column),
+                'dis-bonuses': {
+                    str(disbonus_number): {
+                        'name': disbonus_name,
+                        'column': get_column_letters(first_disbonus_column + disbonus_number + 1),
+                    }
+                    for disbonus_number, disbonus_name in enumerate(DISBONUSES)
+                },
+            },
+        }
+        config['subscriptions']['statistics'].append(user_id)
+        config['other']['leader']['candidates'][user_id] = {
+            'today': f'B{2 + employee_number}',
+            'yesterday': f'C{2 + employee_number}',
+            'column': get_column_letters(LEADER_FIRST_COLUMN + employee_number),
+        }
+
+    return config
+
+
+def build_data(config: dict[str, Any], seed: int = 0) -> dict[str, dict[str, dict[str, str]]]:
+    """
+    Fills the configured cells with random values for every day of the statistics,
+    the result is in the `MemoryBackend.load` format.
+    """
+
+    generator = random.Random(seed)
+    data: dict[str, dict[str, dict[str, str]]] = {}
+
+    def set_value(google_data: dict[str, Any], cell: str, value: Any) -> None:
+        worksheet = data.setdefault(str(google_data['table']), {}).setdefault(str(google_data['sheet']), {})
+        worksheet[cell] = str(value)
+
+    days = range(DAYS_OF_STATISTICS + 1)
+    for section in config['sections'].values():
+        for day in days:
+            for item in section['statistics']['period']['day'].values():
+                set_value(section['google'], f'{item["column"]}{section["google"]["start_row"] + day}', 0)
+
+    for employee in config['employees'].values():
+        for day in days:
+            for item in employee['statistics']['kpi'].values():
+                section_google_data = config['sections'][item['section']]['google']
+                row = section_google_data['start_row'] + day
+                set_value(section_google_data, f'{item["column"]}{row}', generator.randint(0, 10))
+
+            disbonuses_google_data = config['google']['dis-bonuses']
+            row = disbonuses_google_data['start_row'] + day
+            set_value(disbonuses_google_data, f'{employee["bonuses"]["bonus-value-column"]}{row}', 1000)
+
+    for fund in config['other']['funds']['items'].values():
+        for cell in fund['statistics']['cells'].values():
+            set_value(config['other']['funds']['google'], cell, generator.randint(10000, 100000))
+
+    for key_value in config['other']['key-values']['items'].values():
+        for period in key_value['statistics']['period'].values():
+            for cell in period['cells'].values():
+                if cell:
+                    set_value(config['other']['key-values']['google'], cell, generator.randint(100, 1000))
+
+    leader_google_data = config['other']['leader']['google']
+    for cells in config['other']['leader']['candidates'].values():
+        for cell in (cells['today'], cells['yesterday']):
+            set_value(leader_google_data, cell, generator.randint(0, 50))
+        for day in days:
+            row = leader_google_data['start_row'] + day
+            set_value(leader_google_data, f'{cells["column"]}{row}', generator.randint(0, 50))
+
+    return data
+
+
+def prepare_environment(
+        employees_count: int,
+        sections_count: int,
+        latency: float,
+        sheets_backend: str = 'memory',
+) -> dict[str, Any]:
+    """
+    Writes the synthetic configuration and points the settings to it and to the sheets backend (the in-memory one
+    by default). The project modules read the settings on import, so they must be imported after this call.
+    """
+
+    config = build_config(employees_count, sections_count)
+    config['memory-backend'] = {'latency': latency}
+    config['quota'] = {'per_minute': {'read': UNLIMITED_QUOTA_PER_MINUTE, 'write': UNLIMITED_QUOTA_PER_MINUTE}}
+
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+    with config_file:
+        json.dump(config, config_file)
+
+    os.environ['CONFIGURATION_FILE_PATH'] = config_file.name
+    os.environ['SHEETS_BACKEND'] = sheets_backend
+    os.environ.pop('SHEETS_CACHE_FILE', None)
+    os.environ.setdefault('TELEGRAM_TOKEN', '0:synthetic')
+
+    return config
@@ -6,43 +6,36 @@ from settings import settings
 def user_is_registered(user_id: Union[str, int]) -> bool:
     """TODO"""
 
-    user_id = str(user_id)
-    if settings.config['employees'].get(user_id):
-        return True
-    return False
+    return int(user_id) in settings.configuration.employees
 
 
 def user_has_admin_permission(user_id: Union[str, int]) -> bool:
     """TODO"""
 
-    user_id = str(user_id)
-    return settings.config['employees'][user_id]['admin']
+    return int(user_id) in settings.configuration.admins
 
 
 def get_users_list() -> list[tuple[str, str]]:
     """TODO"""
 
-    users = settings.config['employees'].values()
-    return [(user["firstname"], user["lastname"]) for user in users]
+    employees = settings.configuration.employees.values()
+    return [(employee.firstname, employee.lastname) for employee in employees]
 
 
-def get_user_ids() -> list[str]:
+def get_user_ids() -> list[int]:
     """TODO"""
 
-    return list(settings.config['employees'].keys())
+    return list(settings.configuration.employees)
 
 
-def get_statistics_subscribers_list() -> list[str]:
+def get_statistics_subscribers_list() -> list[int]:
     """TODO"""
 
-    return list(settings.config['subscriptions']['statistics'])
+    return list(settings.configuration.subscribers)
 
 
 def get_user_full_name_from_id(user_id: Union[str, int]) -> tuple[str, str]:
     """TODO"""
 
-    user_id = str(user_id)
-    return (
-        settings.config['employees'][user_id]['firstname'],
-        settings.config['employees'][user_id]['lastname'],
-    )
+    employee = settings.configuration.employees[int(user_id)]
+    return employee.firstname, employee.lastname
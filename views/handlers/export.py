@@ -0,0 +1,138 @@
+import os
+from datetime import date
+from logging import getLogger
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+from telebot.types import Message, ReplyKeyboardMarkup, InlineKeyboardButton
+
+from errors import SheetsValuesUnavailableError
+from settings import settings, telegram as tele
+from sheets.handlers.export import EXPORT_FORMATS, export_statistics
+from utils.users import user_has_admin_permission
+from views.handlers.statistics import StatisticsHandler
+
+logger = getLogger(__name__)
+
+
+class ExportHandler:
+    """Exports the KPI statistics of a period to a CSV or JSONL file and sends it back. Admins only."""
+
+    ALL_SECTIONS_CHOICE = '\U0001f5c3 - все направления'
+    FORMAT_CHOICES = {
+        'csv': '\U0001F4C4 - CSV',
+        'jsonl': '\U0001F4C3 - JSONL',
+    }
+
+    def __init__(self, sender_id: str):
+        self.sender_id = sender_id
+        self.section_id: Optional[str] = None
+        self.export_format: Optional[str] = None
+        self.section_choices = StatisticsHandler.build_section_choices(settings.configuration)
+
+        self.section_markup = ReplyKeyboardMarkup(row_width=2)
+        for text in [self.ALL_SECTIONS_CHOICE, *self.section_choices.values()]:
+            self.section_markup.add(InlineKeyboardButton(text=text))
+
+        self.format_markup = ReplyKeyboardMarkup(row_width=2)
+        for export_format in EXPORT_FORMATS:
+            self.format_markup.add(InlineKeyboardButton(text=self.FORMAT_CHOICES[export_format]))
+
+    def _choose_section(self, message: Message) -> None:
+        if message.text != self.ALL_SECTIONS_CHOICE and message.text not in self.section_choices.values():
+            tele.bot.send_message(
+                self.sender_id,
+                text='\U00002b07\U0000fe0f - выберите направление',
+                reply_markup=self.section_markup,
+            )
+            tele.bot.register_next_step_handler(message, self._choose_section)
+            return
+
+        for section_id, section_message in self.section_choices.items():
+            if section_message == message.text:
+                self.section_id = section_id
+
+        tele.bot.send_message(
+            self.sender_id,
+            text='\U00002b07\U0000fe0f - выберите формат',
+            reply_markup=self.format_markup,
+        )
+        tele.bot.register_next_step_handler(message, self._choose_format)
+
+    def _choose_format(self, message: Message) -> None:
+        for export_format, format_message in self.FORMAT_CHOICES.items():
+            if format_message == message.text:
+                self.export_format = export_format
+
+        if self.export_format is None:
+            tele.bot.send_message(
+                self.sender_id,
+                text='\U00002b07\U0000fe0f - выберите формат',
+                reply_markup=self.format_markup,
+            )
+            tele.bot.register_next_step_handler(message, self._choose_format)
+        else:
+            tele.bot.send_message(self.sender_id, '\U0001F5D3 - введите период в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ')
+            tele.bot.register_next_step_handler(message, self._get_period)
+
+    def _get_period(self, message: Message) -> None:
+        period = StatisticsHandler.parse_custom_period(message.text)
+        if period is None:
+            tele.bot.send_message(
+                self.sender_id,
+                f'\U0001F5D3 - введите период с {settings.configuration.start_date:%d.%m.%Y} по сегодня '
+                f'в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ.',
+            )
+            tele.bot.register_next_step_handler(message, self._get_period)
+        else:
+            self.send_export(*period)
+
+    def send_export(self, first_day: date, last_day: date) -> None:
+        """Exports the statistics to a temporary file and sends it as a document"""
+
+        tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
+
+        file_name = f'kpi_{self.section_id or "all"}_{first_day:%Y-%m-%d}_{last_day:%Y-%m-%d}.{self.export_format}'
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, file_name)
+            try:
+                records_count = export_statistics(
+                    path,
+                    self.export_format,
+                    first_day,
+                    last_day,
+                    filter_by_section_id=self.section_id,
+                )
+            except SheetsValuesUnavailableError:
+                logger.exception(
+                    'The statistics export failed.',
+                    extra={'first_day': first_day, 'last_day': last_day, 'section_id': self.section_id},
+                )
+                tele.bot.send_message(
+                    self.sender_id,
+                    '\U000026a0 - не удалось прочитать часть данных за период, выгрузка отменена. Попробуйте позже.',
+                    reply_markup=tele.main_markup,
+                )
+                return
+
+            with open(path, 'rb') as file:
+                tele.bot.send_document(
+                    self.sender_id,
+                    file,
+                    caption=f'\U00002705 - выгружено записей: {records_count}',
+                    reply_markup=tele.main_markup,
+                )
+
+    def start_export(self, message: Message) -> None:
+        """TODO"""
+
+        if not user_has_admin_permission(self.sender_id):
+            tele.bot.send_message(self.sender_id, 'Выгрузка доступна только администраторам.')
+            return
+
+        tele.bot.send_message(
+            self.sender_id,
+            text='\U00002b07\U0000fe0f - выберите направление',
+            reply_markup=self.section_markup,
+        )
+        tele.bot.register_next_step_handler(message, self._choose_section)
@@ -1,9 +1,16 @@
-from typing import Union, Optional
+from typing import Mapping, Optional
 
 from telebot.types import Message, ReplyKeyboardMarkup, InlineKeyboardButton
 
-from sheets.handlers.disbonuses import get_user_actual_bonus_value, update_disbonus_for_user
-from sheets.handlers.statistics import update_employee_kpi, prepare_kpi_keys_and_questions
+from configuration import Disbonus
+from sheets.handlers.disbonuses import (
+    declare_actual_bonus_values,
+    get_actual_bonus_values,
+    get_user_actual_bonus_value,
+    update_disbonus_for_user,
+)
+from sheets.handlers.statistics import get_users_ids_with_empty_kpi, update_employee_kpi, prepare_kpi_keys_and_questions
+from sheets.planner import FetchPlan
 from settings import settings, telegram as tele
 from utils.statistics import get_user_disbonus_data
 
@@ -31,7 +38,7 @@ class KPIHandler:
     def _handle_disbonuses(
             self,
             message: Message,
-            user_disbonus_data: dict[str, dict[str, Union[int, str]]],
+            user_disbonus_data: Mapping[str, Disbonus],
             disbonus_map: dict[str, str],
     ) -> None:
         if message.text == self.DISBONUS_COMMON_CHOICES['quit']:
@@ -86,7 +93,7 @@ class KPIHandler:
         if message.text == self.YES_NO_CHOICES['yes']:
             user_data = get_user_disbonus_data(self.sender_id)
 
-            disbonus_map = {disbonus_id: disbonus_data['name'] for disbonus_id, disbonus_data in user_data.items()}
+            disbonus_map = {disbonus_id: disbonus.name for disbonus_id, disbonus in user_data.items()}
             for disbonus_name in disbonus_map.values():
                 self.disbonus_personal_markup.add(InlineKeyboardButton(text=disbonus_name))
 
@@ -154,31 +161,38 @@ class KPIHandler:
         tele.bot.register_next_step_handler(message, self._parse_answer, kpi_keys)
 
     @staticmethod
-    def build_result_message_bonuses() -> str:
-        """TODO: docstring"""
-        user_ids = [
-            (str(user_id), f'{user_data["firstname"]} {user_data["lastname"]}')
-            for user_id, user_data in settings.config['employees'].items()
-            if user_data['bonuses']
+    def get_users_with_bonuses() -> list[tuple[int, str]]:
+        """Returns ids and full names of the users who have bonuses"""
+        return [
+            (user_id, employee.full_name)
+            for user_id, employee in settings.configuration.employees.items()
+            if employee.bonus_value_column
         ]
 
+    @staticmethod
+    def declare_result_message_bonuses(plan: FetchPlan) -> None:
+        """Declares the cells read by `build_result_message_bonuses`"""
+        declare_actual_bonus_values(plan)
+
+    @classmethod
+    def build_result_message_bonuses(cls, plan: Optional[FetchPlan] = None) -> str:
+        """TODO: docstring"""
+        if plan is None:
+            plan = FetchPlan.prepared(cls.declare_result_message_bonuses)
+
+        return cls.format_result_message_bonuses(get_actual_bonus_values(plan=plan))
+
+    @classmethod
+    def format_result_message_bonuses(cls, bonus_values: Mapping[int, str]) -> str:
+        """Builds the bonuses message of the read balances, see `get_actual_bonus_values`"""
+
         messages_batch = ['\U0001f4b0 - бонусный баланс по сотрудникам:\n']
-        for user_id, user_name in user_ids:
-            user_bonus_value = get_user_actual_bonus_value(user_id=user_id)
-            messages_batch.append(f'\t\t\t{user_name} -> {user_bonus_value}')
+        for user_id, user_name in cls.get_users_with_bonuses():
+            messages_batch.append(f'\t\t\t{user_name} -> {bonus_values[user_id]}')
 
         return '\n'.join(messages_batch)
 
     @staticmethod
-    def get_users_ids_with_empty_kpi_data() -> list[str]:
-        """
-        TODO: currently a plug and returns all users who's kpi is being tracked.
-        Should be refactored to return only users who's kpi is not filled yet.
-        """
-        users_with_empty_kpi_data: list[str] = [
-            user_id
-            for user_id, user_data in settings.config['employees'].items()
-            if user_data['statistics'] is not None and user_data['statistics']['kpi'] is not None
-        ]
-
-        return users_with_empty_kpi_data
+    def get_users_ids_with_empty_kpi_data() -> list[int]:
+        """Returns the ids of the users who haven't filled in today's KPI yet, see `get_users_ids_with_empty_kpi`"""
+        return get_users_ids_with_empty_kpi()
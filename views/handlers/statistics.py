@@ -1,12 +1,24 @@
-from typing import Any
+import re
+from datetime import date, datetime
+from logging import getLogger
+from typing import Any, Optional
 
 from telebot.types import Message, ReplyKeyboardMarkup, InlineKeyboardButton
 
+from configuration import Configuration, derived_index
+from errors import LeaderHistoryNotConfiguredError, SheetsValuesUnavailableError
 from settings import settings, telegram as tele
-from sheets.handlers.other import get_funds_statistics, get_leader
-from sheets.handlers.statistics import get_statistic_for_today, get_key_values
+from sheets.cache import staleness
+from sheets.aggregation import format_number
+from sheets.handlers.other import get_funds_statistics, get_leader, get_leaderboard, leader_history_is_configured
+from sheets.handlers.statistics import get_statistic_for_period, get_statistic_for_today, get_key_values
+from sheets.utils import get_period_days
 from utils.users import user_has_admin_permission
 
+logger = getLogger(__name__)
+
+CUSTOM_PERIOD_PATTERN = re.compile(r'^\s*(\d{2}\.\d{2}\.\d{4})\s*-\s*(\d{2}\.\d{2}\.\d{4})\s*$')
+
 
 class StatisticsHandler:
     """TODO"""
@@ -22,29 +34,57 @@ class StatisticsHandler:
         'day': '\U00000031\U0000FE0F\U000020E3 - день',
         'week': '\U00000037\U0000FE0F\U000020E3 - неделя',
         'month': '\U0001f522 - месяц',
+        'quarter': '\U0001F4C8 - квартал',
+        'custom': '\U0001F4DD - свой период',
         'accumulative': '\U0001F520 - акумулятивно',
     }
-    SECTION_CHOICES = {section: f"\U0001f5c2 - {data['name']}" for section, data in settings.config['sections'].items()}
+
+    PERIOD_TITLES = {
+        'week': '\U0001F4C6 - СТАТИСТИКА ЗА НЕДЕЛЮ',
+        'month': '\U0001F4C6 - СТАТИСТИКА ЗА МЕСЯЦ',
+        'quarter': '\U0001F4C6 - СТАТИСТИКА ЗА КВАРТАЛ',
+        'custom': '\U0001F4C6 - СТАТИСТИКА ЗА ПЕРИОД',
+    }
 
     PERIOD_PER_STATISTICS_CHOICES = {
-        'general_values': ['day'],
+        'general_values': ['day', 'week', 'month', 'quarter', 'custom'],
         'key_values': ['accumulative'],
         'funds_fulfillment': ['month'],
-        'leader': ['day'],
+        'leader': ['day', 'week', 'month', 'custom'],
+    }
+    # the periods which need the candidates' points per day in the leader sheet
+    LEADER_HISTORY_PERIODS = ('week', 'month', 'custom')
+
+    VALUES_UNAVAILABLE_MESSAGE = '\U000026a0 - данные за период сейчас недоступны, попробуйте позже.'
+
+    LEADERBOARD_PERIOD_NAMES = {
+        'day': 'дня',
+        'week': 'недели',
+        'month': 'месяца',
+        'quarter': 'квартала',
+        'custom': 'периода',
     }
 
     def __init__(self, sender_id: str):
         self.sender_id = sender_id
+        # the handler lives through the whole conversation, the configuration snapshot it was started with is kept
+        self.section_choices = self.build_section_choices(settings.configuration)
         self.statistics_markup = ReplyKeyboardMarkup(row_width=2)
         for text in self.STATISTICS_CHOICES.values():
             self.statistics_markup.add(InlineKeyboardButton(text=text))
 
         self.section_markup = ReplyKeyboardMarkup(row_width=2)
-        for text in self.SECTION_CHOICES.values():
+        for text in self.section_choices.values():
             self.section_markup.add(InlineKeyboardButton(text=text))
 
+    @staticmethod
+    @derived_index
+    def build_section_choices(configuration: Configuration) -> dict[str, str]:
+        """Returns the sections' buttons texts per section id"""
+        return {section_id: f'\U0001f5c2 - {section.name}' for section_id, section in configuration.sections.items()}
+
     def _choose_section(self, message: Message) -> None:
-        if message.text not in self.SECTION_CHOICES.values():
+        if message.text not in self.section_choices.values():
             tele.bot.send_message(
                 self.sender_id,
                 text='\U00002b07\U0000fe0f - выберите направление',
@@ -54,7 +94,7 @@ class StatisticsHandler:
         else:
             # TODO: this crunch can be fixed when the custom Message with `meta` parameter will be implemented
             target_section = None
-            for section, section_message in self.SECTION_CHOICES.items():
+            for section, section_message in self.section_choices.items():
                 if section_message == message.text:
                     target_section = section
 
@@ -109,9 +149,15 @@ class StatisticsHandler:
             tele.bot.send_message(self.sender_id, '\U00002b07\U0000fe0f - выберите действие.')
             tele.bot.register_next_step_handler(message, self._choose_statistics_type)
 
+    def _get_periods_for_statistics_type(self, statistics_type: str) -> list[str]:
+        periods = self.PERIOD_PER_STATISTICS_CHOICES[statistics_type]
+        if statistics_type == 'leader' and not leader_history_is_configured():
+            periods = [period for period in periods if period not in self.LEADER_HISTORY_PERIODS]
+        return periods
+
     def _get_period_markup_for_statistics_type(self, statistics_type: str) -> ReplyKeyboardMarkup:
         markup = ReplyKeyboardMarkup(row_width=2)
-        for period in self.PERIOD_PER_STATISTICS_CHOICES[statistics_type]:
+        for period in self._get_periods_for_statistics_type(statistics_type):
             markup.add(InlineKeyboardButton(text=self.PERIOD_CHOICES[period]))
 
         return markup
@@ -119,11 +165,18 @@ class StatisticsHandler:
     def _get_general_values_period_handler(self, message: Message, section_id: str) -> None:
         if message.text == self.PERIOD_CHOICES['day']:
             self.send_general_values_day(section_id=section_id)
-        # elif message.text == self.PERIOD_CHOICES['week']:
-        #     self.send_general_values_week(section_id=section_id)
+        elif message.text == self.PERIOD_CHOICES['week']:
+            self.send_general_values_period('week', section_id=section_id)
+        elif message.text == self.PERIOD_CHOICES['month']:
+            self.send_general_values_period('month', section_id=section_id)
+        elif message.text == self.PERIOD_CHOICES['quarter']:
+            self.send_general_values_period('quarter', section_id=section_id)
+        elif message.text == self.PERIOD_CHOICES['custom']:
+            tele.bot.send_message(self.sender_id, '\U0001F5D3 - введите период в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ')
+            tele.bot.register_next_step_handler(message, self._get_custom_period_handler, section_id=section_id)
         else:
             tele.bot.send_message(self.sender_id, '\U0001F5D3 - выберите период.')
-            tele.bot.register_next_step_handler(message, self._get_general_values_period_handler)
+            tele.bot.register_next_step_handler(message, self._get_general_values_period_handler, section_id=section_id)
 
     def _get_budget_fulfillment_values_period_handler(self, message: Message) -> None:
         if message.text == self.PERIOD_CHOICES['month']:
@@ -133,12 +186,32 @@ class StatisticsHandler:
             tele.bot.register_next_step_handler(message, self._get_budget_fulfillment_values_period_handler)
 
     def _get_leader_period_handler(self, message: Message) -> None:
+        periods = self._get_periods_for_statistics_type('leader')
         if message.text == self.PERIOD_CHOICES['day']:
             self.send_leader_day()
+        elif message.text == self.PERIOD_CHOICES['week'] and 'week' in periods:
+            self.send_leaderboard('week')
+        elif message.text == self.PERIOD_CHOICES['month'] and 'month' in periods:
+            self.send_leaderboard('month')
+        elif message.text == self.PERIOD_CHOICES['custom'] and 'custom' in periods:
+            tele.bot.send_message(self.sender_id, '\U0001F5D3 - введите период в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ')
+            tele.bot.register_next_step_handler(message, self._get_leader_custom_period_handler)
         else:
             tele.bot.send_message(self.sender_id, '\U0001F5D3 - выберите период.')
             tele.bot.register_next_step_handler(message, self._get_leader_period_handler)
 
+    def _get_leader_custom_period_handler(self, message: Message) -> None:
+        period = self.parse_custom_period(message.text)
+        if period is None:
+            tele.bot.send_message(
+                self.sender_id,
+                f'\U0001F5D3 - введите период с {settings.configuration.start_date:%d.%m.%Y} по сегодня '
+                f'в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ.',
+            )
+            tele.bot.register_next_step_handler(message, self._get_leader_custom_period_handler)
+        else:
+            self.send_leaderboard('custom', *period)
+
     def _get_key_values_period_handler(self, message: Message) -> None:
         if message.text == self.PERIOD_CHOICES['accumulative']:
             self.send_key_values_accumulative()
@@ -146,6 +219,13 @@ class StatisticsHandler:
             tele.bot.send_message(self.sender_id, '\U0001F5D3 - выберите период.')
             tele.bot.register_next_step_handler(message, self._get_key_values_period_handler)
 
+    @staticmethod
+    def build_staleness_note() -> str:
+        """Builds a note about outdated data if any stale values were served since the last `staleness.reset()`"""
+        if staleness.as_of is None:
+            return ''
+        return f'\n\n\U000026a0 - данные по состоянию на {staleness.as_of:%H:%M}'
+
     @staticmethod
     def build_result_message_key_values_accumulative(data: dict[str, dict[str, tuple[str, str, str]]]):
         messages_batch = ['\U0001F511 - ДАННЫЕ ПО КЛЮЧЕВЫМ ПОКАЗАТЕЛЯМ\n']
@@ -160,25 +240,81 @@ class StatisticsHandler:
 
     def send_key_values_accumulative(self) -> None:
         tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
+        staleness.reset()
 
         key_values_data = get_key_values()
         result_message = self.build_result_message_key_values_accumulative(key_values_data)
+        result_message += self.build_staleness_note()
 
         tele.bot.send_message(self.sender_id, result_message, reply_markup=tele.main_markup)
 
+    @classmethod
+    def build_result_message_leaderboard(cls, leaderboard: list[tuple[str, float]], period: str) -> str:
+        """The leaders of the period and the ranking: the candidates with the same points share the place"""
+
+        period_name = cls.LEADERBOARD_PERIOD_NAMES[period]
+        if not leaderboard:
+            return f'\U0001F9E2 - красавчиков {period_name} нет.'
+
+        leaders = [full_name for full_name, points in leaderboard if points == leaderboard[0][1]]
+        messages_batch = [f'\U0001F451 - красавчики {period_name}:\n{", ".join(leaders)}\n', '\U0001F3C6 - рейтинг:']
+
+        place, previous_points = 0, None
+        for position, (full_name, points) in enumerate(leaderboard, start=1):
+            if points != previous_points:
+                place, previous_points = position, points
+            messages_batch.append(f'{place}. {full_name}: {format_number(points)}')
+
+        return '\n'.join(messages_batch)
+
+    def send_leaderboard(self, period: str, first_day: Optional[date] = None, last_day: Optional[date] = None) -> None:
+        """Sends the leaderboard of the current day, week or month, or of the `custom` period from/to the days"""
+
+        if period != 'custom':
+            first_day, last_day = get_period_days(period)
+
+        tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
+        staleness.reset()
+
+        try:
+            leaderboard = get_leaderboard(first_day, last_day)
+        except LeaderHistoryNotConfiguredError:
+            # the configuration has been reloaded since the period was chosen
+            tele.bot.send_message(
+                self.sender_id,
+                '\U0001F5D3 - рейтинг доступен только за день: баллы по дням не ведутся.',
+                reply_markup=tele.main_markup,
+            )
+            return
+        except SheetsValuesUnavailableError:
+            logger.exception(
+                'The leaderboard could not be read.',
+                extra={'period': period, 'first_day': first_day, 'last_day': last_day},
+            )
+            tele.bot.send_message(self.sender_id, self.VALUES_UNAVAILABLE_MESSAGE, reply_markup=tele.main_markup)
+            return
+
+        message_text = self.build_result_message_leaderboard(leaderboard, period)
+        message_text += self.build_staleness_note()
+
+        tele.bot.send_message(self.sender_id, message_text, reply_markup=tele.main_markup)
+
     def send_leader_day(self) -> None:
         tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
-        leaders_for_today = get_leader()
+        staleness.reset()
 
+        leaders_for_today = get_leader()
         if leaders_for_today:
             message_text = f'\U0001F451 - красавчики дня:\n{", ".join(leaders_for_today)}'
         else:
             message_text = '\U0001F9E2 - красавчиков дня нет.'
+        message_text += self.build_staleness_note()
 
         tele.bot.send_message(self.sender_id, message_text, reply_markup=tele.main_markup)
 
     def send_month_funds_fulfillment_values(self) -> None:
         tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
+        staleness.reset()
 
         requested_by_admin = user_has_admin_permission(self.sender_id)
         funds_data = get_funds_statistics(full=True if requested_by_admin else False)
@@ -188,20 +324,13 @@ class StatisticsHandler:
             actual, planned = fund_data
             message_text.append(f'{fund_name}:')
             message_text.append(f'[факт] {actual} : {planned} [план]\n')
+        message_text.append(self.build_staleness_note())
 
         tele.bot.send_message(self.sender_id, '\n'.join(message_text), reply_markup=tele.main_markup)
 
-    # TODO: implement weekly statistics functionality
-    def send_general_values_week(self, section_id=None) -> None:
-        tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
-
-        messages_batch = ['\U0001F4C6 - СТАТИСТИКА ЗА НЕДЕЛЮ\n\n']
-
-        ...
-
     @staticmethod
-    def build_result_message_general_values_day(data: dict[str, Any]) -> str:
-        messages_batch = ['\U0001F4C5 - СТАТИСТИКА ЗА ДЕНЬ']
+    def build_result_message_general_values(data: dict[str, Any], title: str) -> str:
+        messages_batch = [title]
 
         for section_name, section_data in data.items():
             section_messages = [f'\n\n{section_name.upper()}\n']
@@ -211,6 +340,16 @@ class StatisticsHandler:
                 name, value = statistic_item
                 section_messages.append(f'{name.capitalize()}: {value}')
 
+            if section_data.get('average'):
+                section_messages.append('\n\U00002b07\U0000fe0f - В среднем за день\n')
+                for name, value in section_data['average']:
+                    section_messages.append(f'{name.capitalize()}: {value}')
+
+            if section_data.get('delta'):
+                section_messages.append('\n\U00002b07\U0000fe0f - За последний день\n')
+                for name, value in section_data['delta']:
+                    section_messages.append(f'{name.capitalize()}: {value}')
+
             section_messages.append('\n\U00002b07\U0000fe0f - По сотрудникам')
             for users_statistics in section_data['per_employee']:
                 section_messages.append(f'\n{users_statistics["full_name"]}')
@@ -222,13 +361,92 @@ class StatisticsHandler:
 
         return '\n'.join(messages_batch)
 
+    @classmethod
+    def build_result_message_general_values_day(cls, data: dict[str, Any]) -> str:
+        return cls.build_result_message_general_values(data, title='\U0001F4C5 - СТАТИСТИКА ЗА ДЕНЬ')
+
+    @classmethod
+    def build_result_message_general_values_period(
+            cls,
+            data: dict[str, Any],
+            period: str,
+            first_day: date,
+            last_day: date,
+    ) -> str:
+        title = f'{cls.PERIOD_TITLES[period]} ({first_day:%d.%m.%Y} - {last_day:%d.%m.%Y})'
+        return cls.build_result_message_general_values(data, title=title)
+
+    @staticmethod
+    def parse_custom_period(text: str) -> Optional[tuple[date, date]]:
+        """
+        Parses the period entered by the user: '01.07.2021 - 30.09.2021'.
+        Returns None if the text is not a period or the period is out of the days with statistics.
+        """
+
+        match = CUSTOM_PERIOD_PATTERN.match(text or '')
+        if not match:
+            return None
+
+        try:
+            first_day, last_day = (datetime.strptime(day, '%d.%m.%Y').date() for day in match.groups())
+        except ValueError:
+            return None
+
+        if not settings.configuration.start_date <= first_day <= last_day <= date.today():
+            return None
+        return first_day, last_day
+
+    def _get_custom_period_handler(self, message: Message, section_id: str) -> None:
+        period = self.parse_custom_period(message.text)
+        if period is None:
+            tele.bot.send_message(
+                self.sender_id,
+                f'\U0001F5D3 - введите период с {settings.configuration.start_date:%d.%m.%Y} по сегодня '
+                f'в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ.',
+            )
+            tele.bot.register_next_step_handler(message, self._get_custom_period_handler, section_id=section_id)
+        else:
+            self.send_general_values_period('custom', *period, section_id=section_id)
+
+    def send_general_values_period(
+            self,
+            period: str,
+            first_day: Optional[date] = None,
+            last_day: Optional[date] = None,
+            section_id: Optional[str] = None,
+    ) -> None:
+        """Sends the statistics of the current week, month or quarter, or of the `custom` period from/to the days"""
+
+        if period != 'custom':
+            first_day, last_day = get_period_days(period)
+
+        tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
+        staleness.reset()
+
+        try:
+            data = get_statistic_for_period(first_day, last_day, filter_by_section_id=section_id)
+        except SheetsValuesUnavailableError:
+            logger.exception(
+                'The period statistics could not be read.',
+                extra={'period': period, 'first_day': first_day, 'last_day': last_day, 'section_id': section_id},
+            )
+            tele.bot.send_message(self.sender_id, self.VALUES_UNAVAILABLE_MESSAGE, reply_markup=tele.main_markup)
+            return
+
+        result_message = self.build_result_message_general_values_period(data, period, first_day, last_day)
+        result_message += self.build_staleness_note()
+
+        tele.bot.send_message(self.sender_id, result_message, reply_markup=tele.main_markup)
+
     def send_general_values_day(self, section_id=None) -> None:
         """TODO"""
 
         tele.bot.send_message(self.sender_id, '\U0001f552 - cобираю данные, подождите.')
+        staleness.reset()
 
         data = get_statistic_for_today(filter_by_section_id=section_id)
         result_message = self.build_result_message_general_values_day(data=data)
+        result_message += self.build_staleness_note()
 
         tele.bot.send_message(self.sender_id, result_message, reply_markup=tele.main_markup)
 
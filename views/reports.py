@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from settings import settings
+from sheets.cache import staleness
+from sheets.handlers import disbonuses, other, statistics
+from sheets.planner import FetchPlan
+from views.handlers.kpi import KPIHandler
+from views.handlers.statistics import StatisticsHandler
+
+
+@dataclass(frozen=True)
+class FundValues:
+    __slots__ = ('name', 'actual', 'planned', 'admin_only')
+
+    name: str
+    actual: str
+    planned: str
+    admin_only: bool
+
+
+@dataclass(frozen=True)
+class DayReport:
+    """
+    The data of the evening report, read once and shared by all the recipients.
+    Every part is read in one fetch plan: one request per spreadsheet, the spreadsheets are read concurrently.
+    """
+
+    general_values: Mapping[str, Any]
+    key_values: Mapping[str, Any]
+    # all the funds, the ones for the admins only are filtered out for the other recipients
+    funds: tuple[FundValues, ...]
+    # the candidates with the most points of the day
+    leaders: tuple[str, ...]
+    bonus_values: Mapping[int, str]
+    # the note about the outdated data the report is built of, empty if all of it is fresh
+    staleness_note: str
+
+
+def build_day_report() -> DayReport:
+    """Reads all the parts of the evening report at once"""
+
+    staleness.reset()
+    plan = FetchPlan()
+    statistics.declare_statistic_for_today(plan)
+    statistics.declare_key_values(plan)
+    other.declare_funds_statistics(plan, full=True)
+    other.declare_leader(plan)
+    disbonuses.declare_actual_bonus_values(plan)
+    plan.execute()
+
+    admin_only_funds = {fund.name for fund in settings.configuration.funds if fund.admin_only}
+    return DayReport(
+        general_values=MappingProxyType(statistics.get_statistic_for_today(plan=plan)),
+        key_values=MappingProxyType(statistics.get_key_values(plan=plan)),
+        funds=tuple(
+            FundValues(name=name, actual=actual, planned=planned, admin_only=name in admin_only_funds)
+            for name, (actual, planned) in other.get_funds_statistics(full=True, plan=plan).items()
+        ),
+        leaders=tuple(other.get_leader(plan=plan)),
+        bonus_values=MappingProxyType(disbonuses.get_actual_bonus_values(plan=plan)),
+        staleness_note=StatisticsHandler.build_staleness_note(),
+    )
+
+
+def render_funds(funds: tuple[FundValues, ...]) -> str:
+    messages_batch = ['\U0001F4CA - ДАННЫЕ ПО ФОНДАМ\n']
+    for fund in funds:
+        messages_batch.append(f'{fund.name}:')
+        messages_batch.append(f'\t\t\tфакт: {fund.actual}')
+        messages_batch.append(f'\t\t\tплан: {fund.planned}\n')
+
+    return '\n'.join(messages_batch)
+
+
+def render_leaders(leaders: tuple[str, ...]) -> str:
+    if not leaders:
+        return '\U0001F9E2 - сегодня красавчиков нет.'
+    return f'\U0001F451 - красавчики сегодня:\n{", ".join(leaders)}'
+
+
+def render_day_report(report: DayReport, for_admins: bool) -> tuple[str, ...]:
+    """Builds the messages of the report for the admins or for the other recipients"""
+
+    funds = report.funds if for_admins else tuple(fund for fund in report.funds if not fund.admin_only)
+    return (
+        StatisticsHandler.build_result_message_general_values_day(data=report.general_values) + report.staleness_note,
+        StatisticsHandler.build_result_message_key_values_accumulative(data=report.key_values),
+        render_funds(funds),
+        KPIHandler.format_result_message_bonuses(report.bonus_values),
+        render_leaders(report.leaders),
+    )